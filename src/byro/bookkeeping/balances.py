@@ -0,0 +1,77 @@
+from collections import namedtuple
+from decimal import Decimal
+from typing import List
+
+from django.db.models import Sum
+from django.utils.timezone import now
+
+from byro.bookkeeping.models import Account, Booking, ClosedPeriod
+
+AccountBalance = namedtuple(
+    "AccountBalance", ("account", "debit", "credit", "net", "unbalanced")
+)
+AccountBalance.__doc__ = """The balance of one account: the sums of its
+``debit`` and ``credit`` bookings, the ``net`` balance (see
+``Account.balances``) and the number of ``unbalanced`` transactions that touch
+it."""
+
+CENTS = Decimal("0.01")
+
+
+def get_trial_balance(as_of=None) -> List[AccountBalance]:
+    """Returns one AccountBalance per account, for all transactions with a
+    value date up to ``as_of`` (default: now).  The ``unbalanced`` count
+    includes all unbalanced transactions, whatever their value date, like
+    ``Account.unbalanced_transactions``.
+
+    The sums start from the snapshots of the newest closed period up to
+    ``as_of``.  The bookings after it are summed with one query, grouped by
+    their account, instead of one query (or two) per account."""
+    as_of = as_of or now()
+    bookings = Booking.objects.order_by().filter(transaction__value_datetime__lte=as_of)
+    sums = {}
+    period = ClosedPeriod.objects.latest_before(as_of)
+    if period:
+        bookings = bookings.filter(transaction__value_datetime__gt=period.end)
+        for snapshot in period.account_snapshots.all():
+            sums[snapshot.account_id] = [snapshot.debit, snapshot.credit]
+    rows = bookings.values("debit_account", "credit_account").annotate(
+        total=Sum("amount")
+    )
+
+    for row in rows:
+        if row["debit_account"]:
+            account_sums = sums.setdefault(row["debit_account"], [0, 0])
+            account_sums[0] += row["total"]
+        else:
+            account_sums = sums.setdefault(row["credit_account"], [0, 0])
+            account_sums[1] += row["total"]
+
+    # Few transactions are unbalanced (and they are indexed), so they are
+    # counted per account, not per side, from their distinct accounts
+    unbalanced = {}
+    for transaction_id, debit_account, credit_account in (
+        Booking.objects.order_by()
+        .filter(transaction__is_balanced=False)
+        .values_list("transaction", "debit_account", "credit_account")
+        .distinct()
+    ):
+        unbalanced.setdefault(debit_account or credit_account, set()).add(
+            transaction_id
+        )
+
+    result = []
+    for account in Account.objects.order_by("pk"):
+        debit, credit = sums.get(account.pk, (0, 0))
+        debit = Decimal(debit).quantize(CENTS)
+        credit = Decimal(credit).quantize(CENTS)
+        result.append(
+            AccountBalance(
+                account,
+                debit,
+                credit,
+                account.net_balance(debit, credit),
+                len(unbalanced.get(account.pk, ())),
+            )
+        )
+    return result
@@ -0,0 +1,71 @@
+from datetime import date, datetime, time
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import make_aware
+
+from byro.bookkeeping.models import ClosedPeriod
+
+
+def _parse(value, fmt):
+    try:
+        return datetime.strptime(value, fmt).date()
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}, expected {fmt}")
+
+
+class Command(BaseCommand):
+    help = "Close a finished period of the ledger, storing the balances of all accounts and members (or verify the closed periods)"
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument("--year", type=int, help="Close this fiscal year")
+        group.add_argument("--month", help="Close this month (YYYY-MM)")
+        group.add_argument(
+            "--end", help="Close the period ending on this day (YYYY-MM-DD)"
+        )
+        group.add_argument(
+            "--check",
+            action="store_true",
+            help="Recompute the balances of all closed periods from the bookings and compare them. Exits with an error if any differ.",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            return self.check_periods()
+
+        if options["year"]:
+            last_day = date(options["year"], 12, 31)
+        elif options["month"]:
+            last_day = (
+                _parse(options["month"], "%Y-%m")
+                + relativedelta(months=1)
+                - relativedelta(days=1)
+            )
+        else:
+            last_day = _parse(options["end"], "%Y-%m-%d")
+
+        try:
+            period = ClosedPeriod.close(
+                make_aware(datetime.combine(last_day, time.max)),
+                "internal: manage.py close_period",
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f"Closed the period ending {last_day}: "
+            f"{period.account_snapshots.count()} accounts, "
+            f"{period.member_snapshots.count()} members."
+        )
+
+    def check_periods(self):
+        mismatches = 0
+        for period in ClosedPeriod.objects.order_by("end"):
+            for difference in period.verify():
+                mismatches += 1
+                self.stderr.write(f"{period}: {difference}")
+        if mismatches:
+            raise CommandError(
+                f"{mismatches} closing balances do not match the bookings"
+            )
+        self.stdout.write("All closing balances match the bookings.")
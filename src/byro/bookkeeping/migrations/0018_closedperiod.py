@@ -0,0 +1,109 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:52
+
+import byro.common.models.log
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookkeeping", "0017_auto_20200818_2002"),
+        ("members", "0015_membershipdues"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClosedPeriod",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("end", models.DateTimeField(unique=True)),
+                ("closed_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "ordering": ("-end",),
+            },
+            bases=(models.Model, byro.common.models.log.LogTargetMixin),
+        ),
+        migrations.CreateModel(
+            name="AccountSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("debit", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("credit", models.DecimalField(decimal_places=2, max_digits=12)),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="snapshots",
+                        to="bookkeeping.account",
+                    ),
+                ),
+                (
+                    "period",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="account_snapshots",
+                        to="bookkeeping.closedperiod",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("period", "account")},
+            },
+        ),
+        migrations.CreateModel(
+            name="MemberSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fee_debit", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("fee_credit", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("donations", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("last_fee_transaction", models.DateTimeField(null=True)),
+                (
+                    "member",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="balance_snapshots",
+                        to="members.member",
+                    ),
+                ),
+                (
+                    "period",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="member_snapshots",
+                        to="bookkeeping.closedperiod",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("period", "member")},
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:55
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import Exact
+
+
+def compute_totals(apps, schema_editor):
+    Booking = apps.get_model("bookkeeping", "Booking")
+    Transaction = apps.get_model("bookkeeping", "Transaction")
+
+    def total(account):
+        return Coalesce(
+            models.Subquery(
+                Booking.objects.filter(
+                    transaction=models.OuterRef("pk"), **{f"{account}__isnull": False}
+                )
+                .order_by()
+                .values("transaction")
+                .annotate(total=models.Sum("amount"))
+                .values("total")
+            ),
+            models.Value(Decimal("0.00")),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+
+    Transaction.objects.update(
+        debit_total=total("debit_account"),
+        credit_total=total("credit_account"),
+        is_balanced=Exact(total("debit_account"), total("credit_account")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookkeeping", "0018_closedperiod"),
+        ("documents", "0004_auto_20181013_1611"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="credit_total",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0.00"), max_digits=10
+            ),
+        ),
+        migrations.AddField(
+            model_name="transaction",
+            name="debit_total",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0.00"), max_digits=10
+            ),
+        ),
+        migrations.AddField(
+            model_name="transaction",
+            name="is_balanced",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(compute_totals, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                condition=models.Q(("is_balanced", False)),
+                fields=["value_datetime"],
+                name="transaction_unbalanced",
+            ),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+def check_bookings(apps, schema_editor):
+    """Refuse to add the constraint while bookings violate it: which of the
+    two accounts is wrong (or which is missing) cannot be guessed."""
+    Booking = apps.get_model("bookkeeping", "Booking")
+    invalid = list(
+        Booking.objects.filter(
+            models.Q(debit_account__isnull=False, credit_account__isnull=False)
+            | models.Q(debit_account=None, credit_account=None)
+        )
+        .order_by("pk")
+        .values_list("pk", "transaction_id")
+    )
+    if invalid:
+        raise Exception(
+            "Migration error: every booking must have either a debit or a credit "
+            "account. Fix these bookings (booking id, transaction id) and run the "
+            "migration again: {}".format(
+                ", ".join("{} ({})".format(pk, t) for pk, t in invalid)
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookkeeping", "0019_transaction_totals"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="booking",
+            constraint=models.CheckConstraint(
+                condition=models.Q(
+                    models.Q(
+                        ("credit_account", None), ("debit_account__isnull", False)
+                    ),
+                    models.Q(
+                        ("credit_account__isnull", False), ("debit_account", None)
+                    ),
+                    _connector="OR",
+                ),
+                name="booking_debit_xor_credit",
+            ),
+        ),
+    ]
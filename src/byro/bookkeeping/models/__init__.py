@@ -1,4 +1,5 @@
 from .account import Account, AccountCategory, AccountTag
+from .period import AccountSnapshot, ClosedPeriod, MemberSnapshot
 from .real_transaction import RealTransactionSource
 from .transaction import Booking, DocumentTransactionLink, Transaction
 
@@ -6,6 +7,9 @@ __all__ = (
     "Account",
     "AccountTag",
     "AccountCategory",
+    "AccountSnapshot",
+    "ClosedPeriod",
+    "MemberSnapshot",
     "RealTransactionSource",
     "Transaction",
     "Booking",
@@ -81,30 +81,55 @@ class Account(Auditable, models.Model, LogTargetMixin):
     def unbalanced_transactions(self):
         from byro.bookkeeping.models import Transaction
 
-        return Transaction.objects.unbalanced_transactions().filter(
-            Q(bookings__debit_account=self) | Q(bookings__credit_account=self)
+        return (
+            Transaction.objects.unbalanced_transactions()
+            .filter(Q(bookings__debit_account=self) | Q(bookings__credit_account=self))
+            .distinct()
         )
 
     def _filter_by_date(self, qs, start, end):
         if start:
-            qs = qs.filter(value_datetime__gte=start)
+            qs = qs.filter(transaction__value_datetime__gte=start)
         if end:
-            qs = qs.filter(value_datetime__lte=end)
+            qs = qs.filter(transaction__value_datetime__lte=end)
         return qs
 
     def balances(self, start=None, end=None):
-        end = end or now()
-        qs = self._filter_by_date(self.transactions, start, end)
+        from byro.bookkeeping.models import ClosedPeriod
 
-        result = qs.with_balances().aggregate(
+        end = end or now()
+        qs = self._filter_by_date(self.bookings, start, end)
+        opening = {"debit": 0, "credit": 0}
+        if not start:
+            # Start from the closing balance of the newest closed period
+            period = ClosedPeriod.objects.latest_before(end)
+            if period:
+                qs = qs.filter(transaction__value_datetime__gt=period.end)
+                snapshot = self.snapshots.filter(period=period).first()
+                if snapshot:
+                    opening = snapshot.totals()
+
+        result = qs.aggregate(
             debit=models.functions.Coalesce(
-                models.Sum("balances_debit"), 0, output_field=models.DecimalField()
+                models.Sum("amount", filter=Q(debit_account=self)),
+                0,
+                output_field=models.DecimalField(),
             ),
             credit=models.functions.Coalesce(
-                models.Sum("balances_credit"), 0, output_field=models.DecimalField()
+                models.Sum("amount", filter=Q(credit_account=self)),
+                0,
+                output_field=models.DecimalField(),
             ),
         )
 
+        result["debit"] += opening["debit"]
+        result["credit"] += opening["credit"]
+        result["net"] = self.net_balance(result["debit"], result["credit"])
+        result = {k: Decimal(v).quantize(Decimal("0.01")) for k, v in result.items()}
+
+        return result
+
+    def net_balance(self, debit, credit):
         # ASSET, EXPENSE:  Debit increases balance, credit decreases it
         # INCOME, LIABILITY, EQUITY:  Debit decreases balance, credit increases it
 
@@ -113,13 +138,8 @@ class Account(Auditable, models.Model, LogTargetMixin):
             AccountCategory.INCOME,
             AccountCategory.EQUITY,
         ):
-            result["net"] = result["credit"] - result["debit"]
-        else:
-            result["net"] = result["debit"] - result["credit"]
-
-        result = {k: Decimal(v).quantize(Decimal("0.01")) for k, v in result.items()}
-
-        return result
+            return credit - debit
+        return debit - credit
 
     def get_absolute_url(self):
         return reverse("office:finance.accounts.detail", kwargs={"pk": self.pk})
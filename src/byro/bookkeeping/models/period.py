@@ -0,0 +1,279 @@
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from byro.common.models import LogTargetMixin
+
+ZERO = Decimal("0.00")
+
+
+class ClosedPeriodManager(models.Manager):
+    def latest_before(self, when=None):
+        """The newest period that ended at or before ``when`` (default: now),
+        or None."""
+        return self.filter(end__lte=when or now()).order_by("-end").first()
+
+    def check_open(self, *value_datetimes):
+        """Raise ValueError if any of ``value_datetimes`` is on or before the
+        end of the newest closed period, where no bookings may be written."""
+        if not value_datetimes:
+            return
+        period = self.filter(end__gte=min(value_datetimes)).order_by("-end").first()
+        if period:
+            raise ValueError(
+                f"The ledger is closed up to {period.end}, no bookings can be written there."
+            )
+
+
+class ClosedPeriod(models.Model, LogTargetMixin):
+    """A finished period (e.g. a fiscal year or a month) of the ledger, with
+    immutable closing balances of all accounts (``AccountSnapshot``) and
+    members (``MemberSnapshot``) as of its ``end``.
+
+    Balances are then computed from the newest snapshot before their end
+    date plus the bookings after it, instead of from the whole history.
+    The bookings of a closed period must not change any more: ``Booking.save``
+    and ``delete``, changes of ``Transaction.value_datetime`` into or out of
+    it, ``Transaction.delete`` and the bulk APIs of ``Transaction`` refuse to
+    write them, and
+    ``ClosedPeriod.verify()`` recomputes the snapshots to find writes that
+    bypassed these checks.
+    Periods are created with ``ClosedPeriod.close(end)``.
+    """
+
+    LOG_TARGET_BASE = "byro.bookkeeping.period"
+
+    end = models.DateTimeField(unique=True)
+    closed_at = models.DateTimeField(default=now)
+
+    objects = ClosedPeriodManager()
+
+    class Meta:
+        ordering = ("-end",)
+
+    def __str__(self):
+        return f"Period ending {self.end.isoformat()}"
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise TypeError("Closed periods cannot be modified.")
+        return super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise TypeError("Closed periods cannot be deleted.")
+
+    @classmethod
+    def close(cls, end, user_or_context, user=None) -> "ClosedPeriod":
+        """Close the period from the end of the previous period up to and
+        including ``end``, which must be in the past."""
+        with transaction.atomic():
+            # Serialize concurrent closes
+            previous = cls.objects.select_for_update().order_by("-end").first()
+            if end > now():
+                raise ValueError("Only finished periods can be closed.")
+            if previous and end <= previous.end:
+                raise ValueError(
+                    f"The period must end after the last closed period ({previous.end})."
+                )
+
+            accounts = account_totals(end, since=previous.end if previous else None)
+            members = member_totals(end, since=previous.end if previous else None)
+            if previous:
+                for snapshot in previous.account_snapshots.all():
+                    _add(accounts, snapshot.account_id, snapshot.totals())
+                for snapshot in previous.member_snapshots.all():
+                    _add(members, snapshot.member_id, snapshot.totals())
+
+            period = cls.objects.create(end=end)
+            AccountSnapshot.objects.bulk_create(
+                AccountSnapshot(period=period, account_id=account_id, **totals)
+                for account_id, totals in accounts.items()
+            )
+            MemberSnapshot.objects.bulk_create(
+                MemberSnapshot(period=period, member_id=member_id, **totals)
+                for member_id, totals in members.items()
+            )
+            period.log(
+                user_or_context,
+                ".closed",
+                user=user,
+                end=end,
+                accounts=len(accounts),
+                members=len(members),
+            )
+        return period
+
+    def verify(self) -> list:
+        """Recompute the snapshots of this period from the bookings and
+        return a list of differences (empty if they all match)."""
+        differences = []
+        for name, snapshots, key, compute in (
+            ("account", self.account_snapshots.all(), "account_id", account_totals),
+            ("member", self.member_snapshots.all(), "member_id", member_totals),
+        ):
+            booked = compute(self.end)
+            for snapshot in snapshots:
+                pk = getattr(snapshot, key)
+                totals = booked.pop(pk, None)
+                if totals != snapshot.totals():
+                    differences.append(
+                        f"{name} {pk}: stored {snapshot.totals()}, booked {totals}"
+                    )
+            for pk, totals in booked.items():
+                differences.append(f"{name} {pk}: not stored, booked {totals}")
+        return differences
+
+
+class AccountSnapshot(models.Model):
+    """The sums of all debit and credit bookings of an account up to the end
+    of a closed period."""
+
+    period = models.ForeignKey(
+        to=ClosedPeriod, related_name="account_snapshots", on_delete=models.PROTECT
+    )
+    account = models.ForeignKey(
+        to="bookkeeping.Account", related_name="snapshots", on_delete=models.PROTECT
+    )
+    debit = models.DecimalField(max_digits=12, decimal_places=2)
+    credit = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        unique_together = (("period", "account"),)
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise TypeError("Snapshots cannot be modified.")
+        return super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise TypeError("Snapshots cannot be deleted.")
+
+    def totals(self) -> dict:
+        return {"debit": self.debit, "credit": self.credit}
+
+
+class MemberSnapshot(models.Model):
+    """The sums of a member's bookings on the fees receivable and donations
+    accounts up to the end of a closed period."""
+
+    period = models.ForeignKey(
+        to=ClosedPeriod, related_name="member_snapshots", on_delete=models.PROTECT
+    )
+    member = models.ForeignKey(
+        to="members.Member",
+        related_name="balance_snapshots",
+        on_delete=models.PROTECT,
+    )
+    fee_debit = models.DecimalField(max_digits=12, decimal_places=2)
+    fee_credit = models.DecimalField(max_digits=12, decimal_places=2)
+    donations = models.DecimalField(max_digits=12, decimal_places=2)
+    last_fee_transaction = models.DateTimeField(null=True)
+
+    class Meta:
+        unique_together = (("period", "member"),)
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise TypeError("Snapshots cannot be modified.")
+        return super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise TypeError("Snapshots cannot be deleted.")
+
+    def totals(self) -> dict:
+        return {
+            "fee_debit": self.fee_debit,
+            "fee_credit": self.fee_credit,
+            "donations": self.donations,
+            "last_fee_transaction": self.last_fee_transaction,
+        }
+
+    @classmethod
+    def opening(cls, member, when=None):
+        """Returns the end of the newest period closed at or before ``when``
+        and the member's snapshot of it (None if the member had no bookings
+        by then), or ``(None, None)`` if there is no such period."""
+        period = ClosedPeriod.objects.latest_before(when)
+        if period is None:
+            return None, None
+        return period.end, cls.objects.filter(period=period, member=member).first()
+
+
+def _add(totals, pk, values):
+    if pk not in totals:
+        totals[pk] = values
+        return
+    for key, value in values.items():
+        if key == "last_fee_transaction":
+            if value and (totals[pk][key] is None or value > totals[pk][key]):
+                totals[pk][key] = value
+        else:
+            totals[pk][key] += value
+
+
+def _booking_range(end, since):
+    from byro.bookkeeping.models import Booking
+
+    qs = Booking.objects.order_by().filter(transaction__value_datetime__lte=end)
+    if since:
+        qs = qs.filter(transaction__value_datetime__gt=since)
+    return qs
+
+
+def account_totals(end, since=None) -> dict:
+    """The sums of the debit and credit bookings per account id with a value
+    date after ``since`` (if given) and up to ``end``, in one query."""
+    totals = {}
+    rows = (
+        _booking_range(end, since)
+        .values("debit_account", "credit_account")
+        .annotate(total=models.Sum("amount"))
+    )
+    for row in rows:
+        if row["debit_account"]:
+            values = {"debit": row["total"], "credit": ZERO}
+        else:
+            values = {"debit": ZERO, "credit": row["total"]}
+        _add(totals, row["debit_account"] or row["credit_account"], values)
+    return totals
+
+
+def member_totals(end, since=None) -> dict:
+    """The sums of the fee and donation bookings per member id with a value
+    date after ``since`` (if given) and up to ``end``, in one query."""
+    from byro.bookkeeping.special_accounts import SpecialAccounts
+
+    fees_receivable_account = SpecialAccounts.fees_receivable
+    donations_account = SpecialAccounts.donations
+    fee_q = Q(debit_account=fees_receivable_account) | Q(
+        credit_account=fees_receivable_account
+    )
+    donation_q = Q(credit_account=donations_account)
+    rows = (
+        _booking_range(end, since)
+        .filter(fee_q | donation_q, member__isnull=False)
+        .values("member")
+        .annotate(
+            fee_debit=models.Sum(
+                "amount", filter=Q(debit_account=fees_receivable_account)
+            ),
+            fee_credit=models.Sum(
+                "amount", filter=Q(credit_account=fees_receivable_account)
+            ),
+            donations=models.Sum("amount", filter=donation_q),
+            last_fee_transaction=models.Max(
+                "transaction__value_datetime", filter=fee_q
+            ),
+        )
+    )
+    return {
+        row["member"]: {
+            "fee_debit": row["fee_debit"] or ZERO,
+            "fee_credit": row["fee_credit"] or ZERO,
+            "donations": row["donations"] or ZERO,
+            "last_fee_transaction": row["last_fee_transaction"],
+        }
+        for row in rows
+    }
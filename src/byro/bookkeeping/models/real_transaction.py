@@ -22,15 +22,39 @@ class RealTransactionSource(Auditable, models.Model, LogTargetMixin):
         max_length=SourceState.max_length,
     )
 
-    @transaction.atomic
-    def process(self):
+    def process(self, chunk_size=500, progress=None):
         """Collects responses to the signal `process_csv_upload`. Raises an
         exception if multiple results were found, and re-raises received
         Exceptions.
 
+        The imported transactions are then processed ``chunk_size`` at a time,
+        each chunk in its own transaction.  After each chunk, ``progress`` is
+        called with the number of transactions processed so far and their
+        total.
+
         Returns a list of one or more Transaction objects if no
         Exception was raised.
         """
+        with transaction.atomic():
+            response = self._import()
+        transactions = list(
+            Transaction.objects.filter(bookings__source=self).distinct()
+        )
+        for start in range(0, len(transactions), chunk_size):
+            with transaction.atomic():
+                for t in transactions[start : start + chunk_size]:
+                    try:
+                        t.process_transaction()
+                    except Exception as e:
+                        print(e)  # FIXME
+            if progress:
+                progress(min(start + chunk_size, len(transactions)), len(transactions))
+
+        self.state = SourceState.PROCESSED
+        self.save()
+        return response
+
+    def _import(self):
         self.state = SourceState.PROCESSING
         self.save()
         from byro.bookkeeping.signals import process_csv_upload
@@ -54,15 +78,6 @@ class RealTransactionSource(Auditable, models.Model, LogTargetMixin):
             self.state = SourceState.FAILED
             self.save()
             raise response
-
-        for t in Transaction.objects.filter(bookings__source=self):
-            try:
-                t.process_transaction()
-            except Exception as e:
-                print(e)  # FIXME
-
-        self.state = SourceState.PROCESSED
-        self.save()
         return response
 
     @property
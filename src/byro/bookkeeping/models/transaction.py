@@ -1,42 +1,139 @@
 from collections import Counter
+from decimal import Decimal
 
 from django.contrib.auth import get_user_model
 from django.db import models, transaction
 from django.db.models import Prefetch
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import Exact
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 
+from byro.bookkeeping.signals import bookings_created
 from byro.common.models import LogTargetMixin, log_call
 from byro.documents.models import Document
 
+from .period import ClosedPeriod
 
-class TransactionQuerySet(models.QuerySet):
-    def with_balances(self):
-        qs = self.annotate(
-            balances_debit=models.Sum(
-                models.Case(
-                    models.When(
-                        ~models.Q(bookings__debit_account=None), then="bookings__amount"
-                    ),
-                    default=0,
-                    output_field=models.DecimalField(max_digits=8, decimal_places=2),
+BALANCE_FIELDS = ("debit_total", "credit_total", "is_balanced")
+
+
+def _booking_totals(transaction):
+    """The debit and credit totals of ``transaction`` (a transaction or an
+    ``OuterRef``), as expressions for annotations and updates."""
+    totals = {}
+    for name, account in (("debit", "debit_account"), ("credit", "credit_account")):
+        totals[name] = Coalesce(
+            models.Subquery(
+                Booking.objects.filter(
+                    transaction=transaction, **{f"{account}__isnull": False}
                 )
+                .order_by()
+                .values("transaction")
+                .annotate(total=models.Sum("amount"))
+                .values("total")
             ),
-            balances_credit=models.Sum(
-                models.Case(
-                    models.When(
-                        ~models.Q(bookings__credit_account=None),
-                        then="bookings__amount",
+            models.Value(Decimal("0.00")),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+    return totals["debit"], totals["credit"]
+
+
+class TransactionQuerySet(models.QuerySet):
+    def with_balances(self):
+        """Annotate ``balances_debit`` and ``balances_credit`` (the stored
+        ``debit_total`` and ``credit_total``)."""
+        return self.annotate(
+            balances_debit=models.F("debit_total"),
+            balances_credit=models.F("credit_total"),
+        )
+
+    def unbalanced_transactions(self):
+        return self.with_balances().filter(is_balanced=False)
+
+    def reverse_all(self, user_or_context, user=None, value_datetime=None, memo=None):
+        """Reverse all transactions of this queryset, like
+        ``Transaction.reverse()``, but with one bulk insert for the reversals,
+        one for their counter-bookings and one batch of log entries: a
+        ``.created`` entry (with the bookings) for each reversal and a
+        ``.reversed`` entry for each original transaction.  Sends
+        ``bookings_created`` for the counter-bookings.
+
+        Returns the reversals, with their bookings in ``cached_bookings``.
+        Raises ValueError if a reversal would be dated in a closed period.
+        """
+        from byro.common.models import log_batch
+
+        originals = list(
+            self.prefetch_related(
+                Prefetch(
+                    "bookings",
+                    queryset=Booking.objects.select_related(
+                        "debit_account", "credit_account"
                     ),
-                    default=0,
-                    output_field=models.DecimalField(max_digits=8, decimal_places=2),
+                    to_attr="cached_bookings",
                 )
-            ),
+            ).order_by("pk")
         )
-        return qs
+        if not originals:
+            return []
+        ClosedPeriod.objects.db_manager(self.db).check_open(
+            *(value_datetime or t.value_datetime for t in originals)
+        )
+        with log_batch(using=self.db):
+            reversals = Transaction.objects.using(self.db).bulk_create(
+                Transaction(
+                    value_datetime=value_datetime or t.value_datetime,
+                    reverses=t,
+                    memo=str(memo) if memo is not None else None,
+                    debit_total=t.credit_total,
+                    credit_total=t.debit_total,
+                    is_balanced=t.is_balanced,
+                )
+                for t in originals
+            )
+            for original, reversal in zip(originals, reversals):
+                reversal.cached_bookings = [
+                    Booking(
+                        transaction=reversal,
+                        amount=b.amount,
+                        member_id=b.member_id,
+                        debit_account=b.credit_account,
+                        credit_account=b.debit_account,
+                    )
+                    for b in original.cached_bookings
+                ]
+            bookings = Booking.objects.using(self.db).bulk_create(
+                b for reversal in reversals for b in reversal.cached_bookings
+            )
+            bookings_created.send(sender=Transaction, bookings=bookings, using=self.db)
 
-    def unbalanced_transactions(self):
-        return self.with_balances().exclude(balances_debit=models.F("balances_credit"))
+            for original, reversal in zip(originals, reversals):
+                reversal.log(
+                    user_or_context,
+                    ".created",
+                    user=user,
+                    value_datetime=reversal.value_datetime,
+                    reverses=original,
+                    memo=reversal.memo,
+                    bookings=reversal.cached_bookings,
+                )
+                original.log(
+                    user_or_context, ".reversed", user=user, reversed_by=reversal
+                )
+        return reversals
+
+    def update_balances(self):
+        """Recompute the stored totals of the transactions from their
+        bookings, in one query, e.g. after bookings were changed in bulk."""
+        debit, credit = _booking_totals(models.OuterRef("pk"))
+        return self.update(
+            debit_total=debit,
+            credit_total=credit,
+            is_balanced=Exact(debit, credit),
+        )
 
 
 class TransactionManager(models.Manager):
@@ -49,10 +146,96 @@ class TransactionManager(models.Manager):
     def unbalanced_transactions(self):
         return self.get_queryset().unbalanced_transactions()
 
+    def update_balances(self):
+        return self.get_queryset().update_balances()
+
     @log_call(".created")
     def create(self, *args, **kwargs):
         return super().create(*args, **kwargs)
 
+    def create_balanced(self, bookings, user_or_context, user=None, **fields):
+        """Create a balanced transaction with ``fields`` and its ``bookings``
+        (a list of dictionaries of Booking fields), see
+        ``bulk_create_balanced``."""
+        return self.bulk_create_balanced(
+            [dict(fields, bookings=bookings)], user_or_context, user=user
+        )[0]
+
+    def bulk_create_balanced(self, transactions, user_or_context, user=None):
+        """Create many balanced transactions with one insert for the
+        transactions and one for their bookings, and one log entry per
+        transaction.  Sends ``bookings_created`` instead of the post_save
+        signals of the bookings.
+
+        :param transactions: dictionaries of Transaction fields, with a list
+          of dictionaries of Booking fields under ``bookings``. Each booking
+          needs an ``amount`` and either a debit or a credit account.
+        :returns: the transactions, with their bookings in ``cached_bookings``.
+        :raises ValueError: if a transaction is not balanced, has multiple
+          debits and multiple credits, or is dated in a closed period.
+        """
+        from byro.common.models import log_batch
+
+        objects = []
+        for fields in transactions:
+            fields = dict(fields)
+            bookings = [Booking(**booking) for booking in fields.pop("bookings")]
+            total = _check_bookings(bookings)
+            t = Transaction(**fields, debit_total=total, credit_total=total)
+            for booking in bookings:
+                booking.transaction = t
+            t.cached_bookings = bookings
+            objects.append(t)
+        ClosedPeriod.objects.db_manager(self.db).check_open(
+            *(t.value_datetime for t in objects)
+        )
+
+        with log_batch(using=self.db):
+            self.bulk_create(objects)
+            bookings = Booking.objects.using(self.db).bulk_create(
+                booking for t in objects for booking in t.cached_bookings
+            )
+            bookings_created.send(sender=Transaction, bookings=bookings, using=self.db)
+            for t in objects:
+                t.log(
+                    user_or_context,
+                    ".created",
+                    user=user,
+                    value_datetime=t.value_datetime,
+                    booking_datetime=t.booking_datetime,
+                    memo=t.memo,
+                    bookings=t.cached_bookings,
+                )
+        return objects
+
+
+def _check_bookings(bookings) -> Decimal:
+    """Check that the bookings of one transaction are balanced and don't have
+    multiple debits and multiple credits, and return their total."""
+    if not bookings:
+        raise ValueError("A transaction needs bookings.")
+    amount_field = Booking._meta.get_field("amount")
+    totals = {"debit": Decimal("0.00"), "credit": Decimal("0.00")}
+    counts = Counter()
+    for booking in bookings:
+        if bool(booking.debit_account_id) == bool(booking.credit_account_id):
+            raise ValueError(
+                "Must be either credit or debit transaction, not both or neither!"
+            )
+        booking.amount = amount_field.to_python(booking.amount)
+        side = "debit" if booking.debit_account_id else "credit"
+        totals[side] += booking.amount
+        counts[side] += 1
+    if counts["debit"] > 1 and counts["credit"] > 1:
+        raise ValueError(
+            "A transaction can have either multiple debits or multiple credits, not both."
+        )
+    if totals["debit"] != totals["credit"]:
+        raise ValueError(
+            f"The transaction is not balanced (debit {totals['debit']}, credit {totals['credit']})."
+        )
+    return totals["debit"]
+
 
 class Transaction(models.Model, LogTargetMixin):
     objects = TransactionManager()
@@ -79,8 +262,74 @@ class Transaction(models.Model, LogTargetMixin):
 
     data = models.JSONField(null=True)
 
+    # Sums of the debit and credit bookings, maintained by the Booking
+    # receivers below (or set directly when bookings are created in bulk)
+    debit_total = models.DecimalField(
+        max_digits=10, decimal_places=2, default=Decimal("0.00")
+    )
+    credit_total = models.DecimalField(
+        max_digits=10, decimal_places=2, default=Decimal("0.00")
+    )
+    is_balanced = models.BooleanField(default=True)
+
     documents = models.ManyToManyField(Document, through="DocumentTransactionLink")
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["value_datetime"],
+                condition=models.Q(is_balanced=False),
+                name="transaction_unbalanced",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self._check_value_datetime_change()
+            if kwargs.get("update_fields") is None:
+                # Don't overwrite the totals with stale values of this instance
+                kwargs["update_fields"] = [
+                    field.name
+                    for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in BALANCE_FIELDS
+                ]
+        result = super().save(*args, **kwargs)
+        self._saved_value_datetime = self.value_datetime
+        return result
+
+    def _check_value_datetime_change(self):
+        """Refuse to move the bookings of this transaction into or out of a
+        closed period."""
+        previous = self._saved_value_datetime
+        if previous is None:
+            # Deferred when the instance was loaded
+            previous = (
+                Transaction.objects.filter(pk=self.pk)
+                .values_list("value_datetime", flat=True)
+                .first()
+            )
+        if previous != self.value_datetime:
+            ClosedPeriod.objects.check_open(
+                self.value_datetime, *([previous] if previous else [])
+            )
+
+    def delete(self, *args, **kwargs):
+        ClosedPeriod.objects.check_open(self.value_datetime)
+        return super().delete(*args, **kwargs)
+
+    def update_balances(self):
+        """Recompute the stored totals from the bookings."""
+        totals = self.bookings.aggregate(
+            debit_total=models.Sum("amount", filter=~models.Q(debit_account=None)),
+            credit_total=models.Sum("amount", filter=~models.Q(credit_account=None)),
+        )
+        self.debit_total = totals["debit_total"] or Decimal("0.00")
+        self.credit_total = totals["credit_total"] or Decimal("0.00")
+        self.is_balanced = self.debit_total == self.credit_total
+        Transaction.objects.filter(pk=self.pk).update(
+            **{name: getattr(self, name) for name in BALANCE_FIELDS}
+        )
+
     @log_call(".debit.created", log_on="self")
     def debit(self, account, *args, **kwargs):
         if self.credits.count() > 1 and self.debits.count() > 0:
@@ -152,11 +401,7 @@ class Transaction(models.Model, LogTargetMixin):
 
     @property
     def balances(self):
-        balances = {
-            "debit": self.debits.aggregate(total=models.Sum("amount"))["total"] or 0,
-            "credit": self.credits.aggregate(total=models.Sum("amount"))["total"] or 0,
-        }
-        return balances
+        return {"debit": self.debit_total, "credit": self.credit_total}
 
     @property
     def is_read_only(self):
@@ -164,14 +409,6 @@ class Transaction(models.Model, LogTargetMixin):
         # Future proof: For now, don't modify balanced transactions
         return self.is_balanced
 
-    @property
-    def is_balanced(self):
-        if hasattr(self, "balances_debit"):
-            return self.balances_debit == self.balances_credit
-        else:
-            balances = self.balances
-            return balances["debit"] == balances["credit"]
-
     def find_memo(self):
         if self.memo:
             return self.memo
@@ -180,6 +417,7 @@ class Transaction(models.Model, LogTargetMixin):
             for booking in self.cached_bookings:
                 if booking.memo:
                     return booking.memo
+            return None
 
         booking = self.bookings.exclude(memo=None).first()
         if booking:
@@ -241,29 +479,12 @@ class DocumentTransactionLink(models.Model):
 
 class BookingsQuerySet(models.QuerySet):
     def with_transaction_balances(self):
-        qs = self.annotate(
-            transaction_balances_debit=models.Sum(
-                models.Case(
-                    models.When(
-                        ~models.Q(transaction__bookings__debit_account=None),
-                        then="transaction__bookings__amount",
-                    ),
-                    default=0,
-                    output_field=models.DecimalField(max_digits=8, decimal_places=2),
-                )
-            ),
-            transaction_balances_credit=models.Sum(
-                models.Case(
-                    models.When(
-                        ~models.Q(transaction__bookings__credit_account=None),
-                        then="transaction__bookings__amount",
-                    ),
-                    default=0,
-                    output_field=models.DecimalField(max_digits=8, decimal_places=2),
-                )
-            ),
+        """Annotate the stored totals of the bookings' transactions as
+        ``transaction_balances_debit`` and ``transaction_balances_credit``."""
+        return self.annotate(
+            transaction_balances_debit=models.F("transaction__debit_total"),
+            transaction_balances_credit=models.F("transaction__credit_total"),
         )
-        return qs
 
     def with_transaction_data(self):
         qs = self.with_transaction_balances()
@@ -325,6 +546,15 @@ class Booking(models.Model):
         null=True,
     )
 
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(debit_account__isnull=False, credit_account=None)
+                | models.Q(debit_account=None, credit_account__isnull=False),
+                name="booking_debit_xor_credit",
+            ),
+        ]
+
     def __str__(self):
         return "{booking_type} {account} {amount} {memo}".format(
             booking_type="debit" if self.debit_account else "credit",
@@ -338,8 +568,13 @@ class Booking(models.Model):
             raise Exception("Must be either credit or debit transaction, not both!")
         if not self.debit_account_id and not self.credit_account_id:
             raise Exception("Must be either credit or debit transaction, not neither!")
+        ClosedPeriod.objects.check_open(self.transaction.value_datetime)
         return super().save(*args, **kwargs)
 
+    def delete(self, *args, **kwargs):
+        ClosedPeriod.objects.check_open(self.transaction.value_datetime)
+        return super().delete(*args, **kwargs)
+
     def find_memo(self):
         if self.memo:
             return self.memo
@@ -359,3 +594,22 @@ class Booking(models.Model):
             elif self.credit_account:
                 return self.transaction.debits
         return None
+
+
+@receiver(post_init, sender=Transaction)
+def transaction_post_init(sender, instance, **kwargs):
+    # The stored value date, to check changes of it in save(). Avoid loading
+    # deferred fields.
+    instance._saved_value_datetime = instance.__dict__.get("value_datetime")
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def booking_update_transaction_balances(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if Booking.transaction.is_cached(instance):
+        # Also update the instance the booking was created with
+        instance.transaction.update_balances()
+    else:
+        Transaction.objects.filter(pk=instance.transaction_id).update_balances()
@@ -20,3 +20,13 @@ one or more Transactions in response.
 If the RealTransactionSource has already been processed, no Transactions
 should be created, unless you are very sure what you are doing.
 """
+
+bookings_created = django.dispatch.Signal()
+"""
+This signal is sent by the bulk APIs of Transaction, which write bookings
+with bulk inserts and thus without post_save signals. It provides the
+Transaction model as sender and the new Booking objects as ``bookings``.
+
+Receivers update the data they derive from bookings. They are called in the
+database transaction that wrote the bookings.
+"""
@@ -1,43 +1,76 @@
 from contextlib import suppress
+from functools import partial
 
 import django.db.utils
 from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
+from django.dispatch import receiver
 from django.utils.functional import classproperty
 from django.utils.translation import gettext_lazy as _
 
 from .models import Account, AccountCategory, AccountTag
 
+# Special accounts resolved by SpecialAccounts.special_account(), by tag name.
+# The cache is per process. Entries are only stored once the lookup is
+# committed (so that rolled back accounts are never cached), and the whole
+# cache is dropped whenever an account or account tag changes.
+_cache = {}
+_generation = 0
+
+
+def _store(generation, tag, account):
+    if generation == _generation:
+        _cache[tag] = account
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+@receiver(post_save, sender=AccountTag)
+@receiver(post_delete, sender=AccountTag)
+@receiver(m2m_changed, sender=Account.tags.through)
+@receiver(post_migrate)
+def invalidate_special_accounts(**kwargs):
+    global _generation
+    _generation += 1
+    _cache.clear()
+
 
 class SpecialAccounts:
     @classmethod
     def special_account(cls, tag, category, name=None):
-        tag, _ignore = AccountTag.objects.get_or_create(name=str(tag).lower())
+        tag = str(tag).lower()
+        account = _cache.get(tag)
+        if account is None:
+            generation = _generation
+            account = cls._lookup(tag, category, name)
+            transaction.on_commit(partial(_store, generation, tag, account))
+        return account
+
+    @classmethod
+    def _lookup(cls, tag, category, name):
         accounts = list(
-            Account.objects.filter(account_category=category, tags=tag).all()
+            Account.objects.filter(account_category=category, tags__name=tag)
         )
         if len(accounts) > 1:
             raise Account.MultipleObjectsReturned()
         if accounts:
-            account = accounts[0]
-        else:
-            # Old mechanism: Return an account that is named as the special one would.
-            #  But also tag it.
-            account = Account.objects.filter(
-                account_category=category, name=str(name)
-            ).first()
-            if not account:
-                account = Account.objects.create(
-                    account_category=category, name=str(name)
+            return accounts[0]
+        # Old mechanism: Return an account that is named as the special one would.
+        account = Account.objects.filter(
+            account_category=category, name=str(name)
+        ).first()
+        if account:
+            return account
+
+        account = Account.objects.create(account_category=category, name=str(name))
+        with suppress(django.db.utils.ProgrammingError):
+            with transaction.atomic():
+                account.log(
+                    None,
+                    "byro.bookkeeping.account.created",
+                    source="Automatic creation of special account",
                 )
-                with suppress(django.db.utils.ProgrammingError):
-                    with transaction.atomic():
-                        account.log(
-                            None,
-                            "byro.bookkeeping.account.created",
-                            source="Automatic creation of special account",
-                        )
-            account.tags.add(tag)
-            account.save()
+        account.tags.add(AccountTag.objects.get_or_create(name=tag)[0])
         return account
 
     @classproperty
@@ -6,6 +6,13 @@ from django.db.models.signals import post_save
 class CommonConfig(AppConfig):
     name = "byro.common"
 
+    def ready(self):
+        from .utils import get_installed_software
+
+        # Computed before any worker processes are forked (or threads
+        # started), so that they inherit it
+        get_installed_software()
+
 
 def user_save_receiver(sender, instance, created, **kwargs):
     if created:
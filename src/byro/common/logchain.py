@@ -0,0 +1,217 @@
+"""Verification and export of the log chain (see ``LogEntry``).
+
+The entries are read in chain order, by following their ``auth_prev`` links.
+Candidates are read ahead in chunks ordered by primary key, which is the
+order in which entries are appended to the chain.  Entries out of that order
+(the migration that introduced the chain linked the existing entries by
+their datetime) are looked up by their link.  The data MACs and hashes of
+each chunk can be recomputed in a pool of worker processes (see
+``get_worker_pool``).
+"""
+
+from collections import deque
+from operator import attrgetter
+from time import perf_counter
+
+from django.db.models import F
+
+from byro.common.models import LogEntry
+from byro.common.utils import get_worker_pool
+
+# Entries from before the log chain was introduced have random hashes and
+# no authentication data.
+UNAUTHENTICATED_PREFIX = "random:"
+
+
+class LogChainError(Exception):
+    """The log chain forks, or ``entry`` is not part of it."""
+
+    def __init__(self, entry, reason):
+        super().__init__(reason)
+        self.entry = entry
+        self.reason = reason
+
+
+def _predecessor(entry):
+    """The hash of the previous entry, None for the first one of the chain."""
+    return None if entry.auth_prev_id == entry.auth_hash else entry.auth_prev_id
+
+
+def _follow(link, reverse):
+    """The entries that ``link`` (a hash) points to."""
+    queryset = LogEntry.objects.select_related("content_type").order_by("pk")
+    if reverse:
+        return queryset.filter(auth_hash=link)
+    if link is None:
+        return queryset.filter(auth_prev_id=F("auth_hash"))
+    return queryset.filter(auth_prev_id=link).exclude(auth_hash=link)
+
+
+def iter_chain(since=None, chunk_size=1000, reverse=False):
+    """Yield lists of up to ``chunk_size`` log entries in chain order, after
+    the entry with the ``since`` hash, newest first if ``reverse`` is set.
+
+    Reads at most about two chunks ahead, with keyset pagination.  Raises
+    ``LogEntry.DoesNotExist`` for an unknown ``since`` hash, and
+    ``LogChainError`` if two entries are linked to the same one, or if an
+    entry (other than one from before the log chain) is not on the chain.
+    """
+    queryset = LogEntry.objects.select_related("content_type").order_by(
+        "-pk" if reverse else "pk"
+    )
+    if since is not None:
+        queryset = queryset.filter(pk__gt=LogEntry.objects.get(auth_hash=since).pk)
+    if reverse:
+        # Candidates by their own hash, to be looked up by the next entry
+        key, link = attrgetter("auth_hash"), _predecessor
+        end = LogEntry.objects.get_chain_end()
+        if end is None:
+            return
+        wanted = end.auth_hash
+        if wanted == since:
+            return
+    else:
+        # Candidates by their predecessor, to be looked up by the previous entry
+        key, link = _predecessor, attrgetter("auth_hash")
+        wanted = since
+    page_lookup = "pk__lt" if reverse else "pk__gt"
+
+    candidates = {}
+    followed = set()
+    last_pk = None
+    exhausted = False
+    chunk = []
+    while True:
+        entry = candidates.pop(wanted, None)
+        if entry is None and not exhausted and len(candidates) < chunk_size:
+            page = queryset
+            if last_pk is not None:
+                page = page.filter(**{page_lookup: last_pk})
+            page = list(page[:chunk_size])
+            exhausted = len(page) < chunk_size
+            if page:
+                last_pk = page[-1].pk
+            for candidate in page:
+                if candidate.pk in followed:
+                    continue
+                if key(candidate) in candidates:
+                    raise LogChainError(candidate, "The log chain forks here")
+                candidates[key(candidate)] = candidate
+            continue
+        if entry is None:
+            found = list(_follow(wanted, reverse)[:2])
+            if len(found) > 1:
+                raise LogChainError(found[1], "The log chain forks here")
+            if not found:
+                break
+            entry = found[0]
+            followed.add(entry.pk)
+        chunk.append(entry)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+        wanted = link(entry)
+        if reverse and wanted in (None, since):
+            break
+    if chunk:
+        yield chunk
+
+    stray = [
+        candidate
+        for candidate in candidates.values()
+        if not candidate.auth_hash.startswith(UNAUTHENTICATED_PREFIX)
+    ]
+    if not stray and not exhausted:
+        rest = queryset.exclude(pk__in=followed).exclude(
+            auth_hash__startswith=UNAUTHENTICATED_PREFIX
+        )
+        if last_pk is not None:
+            rest = rest.filter(**{page_lookup: last_pk})
+        stray = list(rest[:1])
+    if stray:
+        raise LogChainError(stray[0], "Not part of the log chain")
+
+
+def _verify_chunk(entries):
+    """Return the pks of the entries whose MAC or hash doesn't match."""
+    failed = []
+    for entry in entries:
+        if entry.auth_hash.startswith(UNAUTHENTICATED_PREFIX):
+            continue
+        try:
+            valid = entry.verify()
+        except (KeyError, TypeError, ValueError):
+            valid = False
+        if not valid:
+            failed.append(entry.pk)
+    return failed
+
+
+def verify_logchain(since=None, processes=1, chunk_size=1000) -> dict:
+    """Verify the log chain, or only the entries after the entry with the
+    ``since`` hash.
+
+    Returns a dictionary with the number of ``entries`` read, the number of
+    ``unauthenticated`` entries from before the log chain, the ``last`` hash
+    read, the ``duration`` in seconds and the ``error`` (a dictionary with
+    ``pk``, ``hash`` and ``reason``) of the first broken entry, or None if
+    the chain is intact.
+    """
+    started = perf_counter()
+    result = {"entries": 0, "unauthenticated": 0, "last": since, "error": None}
+
+    pool = get_worker_pool(processes)
+    pending = deque()
+    try:
+        try:
+            for chunk in iter_chain(since=since, chunk_size=chunk_size):
+                _check_links(chunk, result)
+                if pool:
+                    pending.append(pool.apply_async(_verify_chunk, (chunk,)))
+                else:
+                    _collect(_verify_chunk(chunk), result)
+                while pending and (len(pending) > 2 * processes or result["error"]):
+                    _collect(pending.popleft().get(), result)
+                if result["error"]:
+                    break
+        except LogChainError as e:
+            _set_error(result, e.entry, e.reason)
+        while pending:
+            _collect(pending.popleft().get(), result)
+    finally:
+        if pool:
+            pool.terminate()
+
+    if result["error"] is None:
+        end = LogEntry.objects.get_chain_end()
+        if end and end.auth_hash != result["last"]:
+            _set_error(result, end, "The chain end is not the last entry")
+
+    result["duration"] = perf_counter() - started
+    return result
+
+
+def _set_error(result, entry, reason):
+    if result["error"] is None or entry.pk < result["error"]["pk"]:
+        result["error"] = {"pk": entry.pk, "hash": entry.auth_hash, "reason": reason}
+
+
+def _check_links(chunk, result):
+    for entry in chunk:
+        expected = result["last"] or entry.auth_hash
+        if entry.auth_prev_id != expected:
+            _set_error(result, entry, "Not linked to the previous entry")
+            return
+        result["entries"] += 1
+        if entry.auth_hash.startswith(UNAUTHENTICATED_PREFIX):
+            result["unauthenticated"] += 1
+        result["last"] = entry.auth_hash
+
+
+def _collect(failed, result):
+    if failed:
+        _set_error(
+            result,
+            LogEntry.objects.get(pk=failed[0]),
+            "Authentication data does not match",
+        )
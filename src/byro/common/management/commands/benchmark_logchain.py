@@ -0,0 +1,56 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from byro.common import utils
+from byro.common.models import LogEntry, log_batch
+
+
+class Command(BaseCommand):
+    help = "Compare writing log entries one by one and in a batch. Nothing is kept."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-n",
+            "--count",
+            default=1000,
+            type=int,
+            help="Number of log entries written with each method",
+        )
+
+    def _write(self, count, stamp_per_entry=False):
+        for i in range(count):
+            if stamp_per_entry:
+                # Computed again when the entry is written
+                utils._installed_software = None
+            LogEntry.objects.create(
+                object_id=i,
+                action_type="byro.common.benchmark",
+                data={"source": "benchmark_logchain", "i": i},
+            )
+
+    def _measure(self, count, batch, stamp_per_entry=False):
+        with transaction.atomic():
+            started = perf_counter()
+            if batch:
+                with log_batch():
+                    self._write(count, stamp_per_entry)
+            else:
+                self._write(count, stamp_per_entry)
+            duration = perf_counter() - started
+            transaction.set_rollback(True)
+        return duration or 1e-9
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        # The software stamp used to be computed for every entry
+        duration = self._measure(count, batch=False, stamp_per_entry=True)
+        self.stdout.write(
+            f"single, stamp per entry: {count} entries in {duration:.2f}s ({count / duration:.0f} entries/s)"
+        )
+        for name, batch in (("single", False), ("batched", True)):
+            duration = self._measure(count, batch)
+            self.stdout.write(
+                f"{name}: {count} entries in {duration:.2f}s ({count / duration:.0f} entries/s)"
+            )
@@ -2,8 +2,9 @@ import re
 import sys
 
 import canonicaljson
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
+from byro.common.logchain import LogChainError, iter_chain
 from byro.common.models.log import LogEntry
 
 
@@ -25,6 +26,25 @@ class Command(BaseCommand):
             type=str,
             help="action_types for which to exclude the log 'data' member (Regex)",
         )
+        parser.add_argument(
+            "--format",
+            default="json",
+            choices=("json", "ndjson"),
+            help="'json': a pretty-printed array, newest entry first. 'ndjson': one "
+            "compact JSON object per line, oldest entry first",
+        )
+        parser.add_argument(
+            "--since",
+            default=None,
+            type=str,
+            help="Only export the entries after the entry with this hash",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            default=1000,
+            type=int,
+            help="Number of log entries read per query",
+        )
 
     def handle(self, *args, **options):
         include_re = re.compile(options["data_include_actions"])
@@ -33,36 +53,64 @@ class Command(BaseCommand):
             if options["data_exclude_actions"]
             else None
         )
+        ndjson = options["format"] == "ndjson"
+
+        if (
+            options["since"]
+            and not LogEntry.objects.filter(auth_hash=options["since"]).exists()
+        ):
+            raise CommandError(
+                "There is no log entry with the hash {}".format(options["since"])
+            )
 
         outstream = sys.stdout
 
-        outstream.write("[")
+        if not ndjson:
+            outstream.write("[")
         is_first = True
-        last = None
-        current = LogEntry.objects.get_chain_end()
+        try:
+            for chunk in iter_chain(
+                since=options["since"],
+                chunk_size=options["chunk_size"],
+                reverse=not ndjson,
+            ):
+                lines = []
+                for current in chunk:
+                    data = {
+                        "hash": current.auth_hash,
+                        "entry": current.get_authenticated_dict(),
+                    }
 
-        while current and current != last:
-            data = {
-                "hash": current.auth_hash,
-                "entry": current.get_authenticated_dict(),
-            }
+                    if include_re.search(current.action_type) and (
+                        exclude_re is None or not exclude_re.search(current.action_type)
+                    ):
+                        data["data"] = current.data
 
-            if include_re.search(current.action_type) and (
-                exclude_re is None or not exclude_re.search(current.action_type)
-            ):
-                data["data"] = current.data
+                    if ndjson:
+                        lines.append(
+                            canonicaljson.encode_canonical_json(data).decode("utf-8")
+                        )
+                        lines.append("\n")
+                        continue
 
-            data_pretty = canonicaljson.encode_pretty_printed_json(data).decode("utf-8")
+                    data_pretty = canonicaljson.encode_pretty_printed_json(data).decode(
+                        "utf-8"
+                    )
 
-            if not is_first:
-                outstream.write(",\n    ")
-            else:
-                outstream.write("\n    ")
+                    if not is_first:
+                        lines.append(",\n    ")
+                    else:
+                        lines.append("\n    ")
 
-            outstream.write("\n    ".join(data_pretty.split("\n")))
+                    lines.append("\n    ".join(data_pretty.split("\n")))
 
-            is_first = False
-            last = current
-            current = current.auth_prev
+                    is_first = False
+                outstream.write("".join(lines))
+        except LogChainError as e:
+            raise CommandError(
+                f"Log chain broken at entry #{e.entry.pk} ({e.entry.auth_hash}): "
+                f"{e.reason}"
+            )
 
-        outstream.write("\n]\n")
+        if not ndjson:
+            outstream.write("\n]\n")
@@ -0,0 +1,72 @@
+import os.path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from byro.common.logchain import verify_logchain
+from byro.common.models import LogEntry
+
+
+class Command(BaseCommand):
+    help = "Verify the links and authentication data of the log-chain"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-p",
+            "--processes",
+            default=1,
+            type=int,
+            help="Number of worker processes recomputing the hashes",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            default=1000,
+            type=int,
+            help="Number of log entries read per query",
+        )
+        parser.add_argument(
+            "--since",
+            default=None,
+            type=str,
+            help="Only verify the entries after the entry with this hash",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=None,
+            type=str,
+            help="File with the hash of the last verified entry. If it exists, only "
+            "newer entries are verified, and it is updated after a successful run",
+        )
+
+    def handle(self, *args, **options):
+        since = options["since"]
+        checkpoint = options["checkpoint"]
+        if checkpoint and not since and os.path.exists(checkpoint):
+            with open(checkpoint) as fp:
+                since = fp.read().strip() or None
+
+        try:
+            result = verify_logchain(
+                since=since,
+                processes=options["processes"],
+                chunk_size=options["chunk_size"],
+            )
+        except LogEntry.DoesNotExist:
+            raise CommandError(f"There is no log entry with the hash {since}")
+
+        duration = result["duration"] or 1e-9
+        self.stdout.write(
+            "Verified {entries} entries ({unauthenticated} from before the log chain) "
+            "in {duration:.2f}s ({per_second:.0f} entries/s).".format(
+                per_second=result["entries"] / duration, **result
+            )
+        )
+        if result["error"]:
+            raise CommandError(
+                "Log chain broken at entry #{pk} ({hash}): {reason}".format(
+                    **result["error"]
+                )
+            )
+        if checkpoint and result["last"]:
+            with open(checkpoint, "w") as fp:
+                fp.write(result["last"] + "\n")
+        self.stdout.write(f"Log chain intact up to {result['last']}")
@@ -3,10 +3,21 @@ from django.shortcuts import redirect, reverse
 from django.urls import resolve
 from django.utils import translation
 
-from byro.common.models.configuration import Configuration
+from byro.common.models.configuration import Configuration, configuration_snapshot
 from byro.common.signals import unauthenticated_urls
 
 
+class ConfigurationMiddleware:
+    """Load the configuration at most once per request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with configuration_snapshot():
+            return self.get_response(request)
+
+
 class SettingsMiddleware:
     ALLOWED_URLS = ("settings.registration", "settings.initial", "settings.plugins")
 
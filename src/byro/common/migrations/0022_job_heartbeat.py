@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:27
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("common", "0021_logchainhead"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="heartbeat",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
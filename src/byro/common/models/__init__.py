@@ -1,4 +1,22 @@
 from .configuration import Configuration
-from .log import LogEntry, LogTargetMixin, log_call
+from .job import Job, JobState
+from .log import (
+    LogChainHead,
+    LogEntry,
+    LogTargetMixin,
+    log_batch,
+    log_call,
+    resolve_log_objects,
+)
 
-__all__ = ["Configuration", "LogEntry", "LogTargetMixin", "log_call"]
+__all__ = [
+    "Configuration",
+    "Job",
+    "JobState",
+    "LogChainHead",
+    "LogEntry",
+    "LogTargetMixin",
+    "log_batch",
+    "log_call",
+    "resolve_log_objects",
+]
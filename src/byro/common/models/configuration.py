@@ -1,3 +1,6 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from django.conf.global_settings import LANGUAGES
 from django.db import models
 from django.urls import reverse
@@ -7,6 +10,20 @@ from solo.models import SingletonModel
 from byro.common.models.choices import Choices
 from byro.common.models.log import LogTargetMixin
 
+_snapshot = ContextVar("byro_configuration_snapshot", default=None)
+
+
+@contextmanager
+def configuration_snapshot():
+    """Load every configuration at most once within this block (a request, a
+    task or a command), and share the instance between all get_solo() calls.
+    Saving a configuration drops it from the snapshot."""
+    token = _snapshot.set({})
+    try:
+        yield
+    finally:
+        _snapshot.reset(token)
+
 
 class ByroConfiguration(LogTargetMixin, SingletonModel):
     """Use this class to build a configuration set that will automatically show
@@ -15,6 +32,29 @@ class ByroConfiguration(LogTargetMixin, SingletonModel):
     class Meta:
         abstract = True
 
+    @classmethod
+    def get_solo(cls):
+        snapshot = _snapshot.get()
+        if snapshot is None:
+            return super().get_solo()
+        if cls not in snapshot:
+            snapshot[cls] = super().get_solo()
+        return snapshot[cls]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._drop_from_snapshot()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self._drop_from_snapshot()
+        return result
+
+    def _drop_from_snapshot(self):
+        snapshot = _snapshot.get()
+        if snapshot is not None:
+            snapshot.pop(type(self), None)
+
 
 class MemberViewLevel(Choices):
     NO = "no"
@@ -0,0 +1,200 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections, connection, models, transaction
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from django.utils.timezone import now
+
+from byro.common.models.choices import Choices
+from byro.common.models.configuration import configuration_snapshot
+from byro.common.signals import periodic_task
+
+logger = logging.getLogger(__name__)
+
+# Jobs that are queued or running without any progress for this long are
+# considered lost, e.g. because the process running their thread ended.
+ABANDONED_TIMEOUT = timedelta(hours=1)
+
+
+class JobState(Choices):
+    QUEUED = "queued"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+
+
+class Job(models.Model):
+    """A long-running operation (like a large import) that runs in the
+    background, in a Celery worker if a broker is configured and in a thread
+    of the current process otherwise.
+
+    :param runner: Dotted path of the function that does the work. It is
+      called with the job, can report progress with ``job.progress()``, and
+      its return value is stored in ``result``.  A ``ValidationError`` (or any
+      other exception) marks the job as failed, with its messages in
+      ``errors``.
+    :param data: Parameters for the runner.
+    :param upload: An uploaded file for the runner. It is deleted once the
+      job is done.
+
+    ``heartbeat`` is updated with every change of the job.  Jobs that stay
+    queued or running without a heartbeat for ``ABANDONED_TIMEOUT`` are
+    marked as failed by the periodic task (see ``fail_abandoned``).
+    """
+
+    runner = models.CharField(max_length=200)
+    state = models.CharField(
+        default=JobState.QUEUED,
+        choices=JobState.choices,
+        max_length=JobState.max_length,
+    )
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+    data = models.JSONField(default=dict)
+    upload = models.FileField(upload_to="jobs/", null=True, blank=True)
+    result = models.JSONField(null=True)
+    errors = models.JSONField(default=list)
+    total = models.PositiveIntegerField(null=True)
+    processed = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True)
+    finished = models.DateTimeField(null=True)
+    heartbeat = models.DateTimeField(default=now)
+
+    class Meta:
+        ordering = ("-created",)
+
+    def __str__(self):
+        return f"Job #{self.pk} ({self.runner}, {self.state})"
+
+    def get_absolute_url(self):
+        return reverse("office:jobs.detail", kwargs={"pk": self.pk})
+
+    @property
+    def log_context(self):
+        """The ``user_or_context`` for log entries written by the job."""
+        return self if self.user else f"internal: job {self.pk}"
+
+    @property
+    def is_done(self):
+        return self.state in (JobState.FINISHED, JobState.FAILED)
+
+    @property
+    def duration(self):
+        if not self.started:
+            return None
+        return ((self.finished or now()) - self.started).total_seconds()
+
+    def get_status(self) -> dict:
+        return {
+            "state": self.state,
+            "processed": self.processed,
+            "total": self.total,
+            "errors": self.errors,
+            "result": self.result,
+            "created": self.created.isoformat(),
+            "started": self.started.isoformat() if self.started else None,
+            "finished": self.finished.isoformat() if self.finished else None,
+            "duration": self.duration,
+        }
+
+    def start(self):
+        """Queue the job as soon as the current transaction is committed."""
+        transaction.on_commit(self._dispatch)
+
+    def _dispatch(self):
+        if settings.HAS_CELERY:
+            from byro.common.tasks import run_job
+
+            run_job.delay(self.pk)
+        else:
+            threading.Thread(
+                target=_run_in_thread, args=(self.pk,), daemon=True
+            ).start()
+
+    def run(self):
+        """Run the job in the current process."""
+        if self.is_done:
+            # e.g. failed as abandoned while it was waiting in the queue
+            return
+        self._update(state=JobState.RUNNING, started=now())
+        try:
+            with configuration_snapshot():
+                result = import_string(self.runner)(self)
+        except Exception as e:
+            if not isinstance(e, ValidationError):
+                logger.exception("Job %s failed", self.pk)
+            self._update(
+                state=JobState.FAILED,
+                finished=now(),
+                errors=self.errors
+                + [
+                    str(message)
+                    for message in (
+                        e.messages if isinstance(e, ValidationError) else [e]
+                    )
+                ],
+            )
+        else:
+            self._update(state=JobState.FINISHED, finished=now(), result=result)
+        finally:
+            self._delete_upload()
+
+    def progress(self, processed, total=None):
+        if total is None:
+            self._update(processed=processed)
+        else:
+            self._update(processed=processed, total=total)
+
+    def _update(self, **fields):
+        fields["heartbeat"] = now()
+        for key, value in fields.items():
+            setattr(self, key, value)
+        Job.objects.filter(pk=self.pk).update(**fields)
+
+    def _delete_upload(self):
+        # Uploads (like member lists) must not stay in the media directory
+        if self.upload:
+            self.upload.delete(save=False)
+            Job.objects.filter(pk=self.pk).update(upload=None)
+
+    @classmethod
+    def fail_abandoned(cls, timeout=ABANDONED_TIMEOUT) -> int:
+        """Mark the jobs that are queued or running without a heartbeat for
+        ``timeout`` as failed, and delete their uploads."""
+        abandoned = list(
+            cls.objects.filter(
+                state__in=(JobState.QUEUED, JobState.RUNNING),
+                heartbeat__lt=now() - timeout,
+            )
+        )
+        for job in abandoned:
+            job._update(
+                state=JobState.FAILED,
+                finished=now(),
+                errors=job.errors + ["The job was abandoned."],
+            )
+            job._delete_upload()
+        return len(abandoned)
+
+
+@receiver(periodic_task)
+def fail_abandoned_jobs(sender, **kwargs):
+    Job.fail_abandoned()
+
+
+def _run_in_thread(pk):
+    close_old_connections()
+    try:
+        Job.objects.get(pk=pk).run()
+    finally:
+        connection.close()
@@ -2,7 +2,9 @@ import base64
 import datetime
 import decimal
 import uuid
-from functools import wraps
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+from functools import partial, wraps
 
 import canonicaljson
 import nacl.hash
@@ -10,7 +12,7 @@ import nacl.utils
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
 from django.db.models import F, Q
 from django.db.models.signals import pre_delete, pre_save
 from django.dispatch import receiver
@@ -32,14 +34,120 @@ class ContentObjectManager(models.Manager):
         return super().filter(*args, **kwargs)
 
 
+_batch = ContextVar("byro_log_batch", default=None)
+
+
+def _savepoint_marker():
+    pass
+
+
+class LogBatch:
+    """The entries collected by ``log_batch()``, see there."""
+
+    def __init__(self, using):
+        self.using = using
+        self.entries = []
+        self.head = None
+        self.savepoints = 0
+
+    def add(self, entry):
+        if self.head is None:
+            self.head = LogChainHead.lock()
+        entry.auth_prev_id = (
+            self.entries[-1][0].auth_hash if self.entries else self.head.entry_id
+        )
+        entry._prepare_entry()
+        marker = None
+        if len(connections[self.using].savepoint_ids) > self.savepoints:
+            # Django drops the on_commit callbacks of a savepoint that is
+            # rolled back, which ties the entry to the savepoint
+            marker = partial(_savepoint_marker)
+            transaction.on_commit(marker, using=self.using)
+        self.entries.append((entry, marker))
+        return entry
+
+    def flush(self, batch_size=500):
+        pending = {id(func) for _, func, _ in connections[self.using].run_on_commit}
+        entries = [
+            entry
+            for entry, marker in self.entries
+            if marker is None or id(marker) in pending
+        ]
+        self.entries = []
+        if not entries:
+            return
+        auth_prev = self.head.entry_id
+        for entry in entries:
+            # Relink the entries that followed one that was rolled back
+            if entry.auth_prev_id != auth_prev:
+                entry.auth_prev_id = auth_prev
+                entry._compute_logchain()
+            auth_prev = entry.auth_hash
+        LogEntry.objects.using(self.using).bulk_create(entries, batch_size=batch_size)
+        self.head.entry_id = auth_prev
+        self.head.save(update_fields=["entry"])
+
+
+@contextmanager
+def log_batch(using=DEFAULT_DB_ALIAS):
+    """Collect the log entries created within this block, and write them with
+    one bulk insert at its end.
+
+    The entries are linked and hashed in order, exactly like single entries,
+    but only get their pk when the block is left.  The block runs in a
+    transaction, and the log chain stays locked from the first entry until it
+    is committed.  Nested blocks are part of the outermost one.  Entries
+    created within a savepoint (a nested ``transaction.atomic()``) that is
+    rolled back are dropped.
+    """
+    if _batch.get() is not None or not LogChainHead.is_installed(using):
+        with transaction.atomic(using=using):
+            yield
+        return
+    batch = LogBatch(using)
+    token = _batch.set(batch)
+    try:
+        with transaction.atomic(using=using):
+            batch.savepoints = len(connections[using].savepoint_ids)
+            yield
+            batch.flush()
+    finally:
+        _batch.reset(token)
+
+
 class LogEntryManager(ContentObjectManager):
     """Manager that is linking the log chain on .create()"""
 
     def create(self, *args, **kwargs):
-        kwargs["auth_prev"] = self.get_chain_end()
-        return super().create(*args, **kwargs)
+        batch = _batch.get()
+        if batch is not None and batch.using == self.db:
+            kwargs.pop("auth_prev", None)
+            return batch.add(self.model(*args, **kwargs))
+        if not LogChainHead.is_installed(self.db):
+            kwargs["auth_prev"] = self.find_chain_end()
+            return super().create(*args, **kwargs)
+        with transaction.atomic(using=self.db):
+            head = LogChainHead.lock()
+            kwargs.pop("auth_prev", None)
+            kwargs["auth_prev_id"] = head.entry_id
+            entry = super().create(*args, **kwargs)
+            head.entry_id = entry.auth_hash
+            head.save(update_fields=["entry"])
+        return entry
 
     def get_chain_end(self):
+        head = (
+            LogChainHead.objects.select_related("entry").filter(pk=1).first()
+            if LogChainHead.is_installed(self.db)
+            else None
+        )
+        if head is None:
+            return self.find_chain_end()
+        return head.entry
+
+    def find_chain_end(self):
+        """Find the end of the chain by walking the ``auth_next`` relation of
+        all entries, without relying on ``LogChainHead``."""
         return self.filter(Q(auth_next=None) | Q(auth_prev_id=F("auth_hash"))).first()
 
 
@@ -115,18 +223,21 @@ class LogEntry(models.Model):
             if getattr(self, "pk", None):
                 raise TypeError("Logs cannot be modified.")
 
-            if not self.data:
-                self.data = {}
+            self._prepare_entry()
 
-            if self.user:
-                self.data.setdefault("source", str(self.user))
+        return super().save(*args, **kwargs)
 
-            if not self.data.get("source"):
-                raise ValueError("Need to provide at least user or data['source']")
+    def _prepare_entry(self):
+        if not self.data:
+            self.data = {}
 
-            self._compute_logchain()
+        if self.user:
+            self.data.setdefault("source", str(self.user))
 
-        return super().save(*args, **kwargs)
+        if not self.data.get("source"):
+            raise ValueError("Need to provide at least user or data['source']")
+
+        self._compute_logchain()
 
     def _compute_logchain(self):
         hashed_data_dict = dict(self.data)
@@ -240,6 +351,49 @@ def log_entry_pre_delete(sender, instance, *args, **kwargs):
         raise TypeError("Logs cannot be deleted.")
 
 
+class LogChainHead(models.Model):
+    """The end of the log chain, stored in a single row.
+
+    Appending to the chain locks the row with ``SELECT FOR UPDATE`` until
+    the new entry is committed, so that concurrent writers can't both link
+    to the same entry and fork the chain.  It also saves looking up the
+    entry without successor on every append.
+    """
+
+    entry = models.ForeignKey(
+        LogEntry,
+        on_delete=models.DO_NOTHING,
+        related_name="+",
+        to_field="auth_hash",
+        null=True,
+    )
+
+    _installed = set()
+
+    @classmethod
+    def is_installed(cls, using) -> bool:
+        """Whether the table exists yet.  Older data migrations write log
+        entries before it is created."""
+        if using not in cls._installed:
+            if cls._meta.db_table not in connections[using].introspection.table_names():
+                return False
+            cls._installed.add(using)
+        return True
+
+    @classmethod
+    def lock(cls) -> "LogChainHead":
+        """Return the locked head row, creating it if necessary.  Needs to be
+        called in a transaction."""
+        head = cls.objects.select_for_update().filter(pk=1).first()
+        if head is None:
+            end = LogEntry.objects.find_chain_end()
+            cls.objects.get_or_create(
+                pk=1, defaults={"entry_id": end.auth_hash if end else None}
+            )
+            head = cls.objects.select_for_update().get(pk=1)
+        return head
+
+
 def flatten_objects(inobj, key_was=None):
     if isinstance(inobj, dict):
         return {k: flatten_objects(v, key_was=k) for k, v in inobj.items()}
@@ -267,6 +421,61 @@ def flatten_objects(inobj, key_was=None):
             return str(inobj)
 
 
+class ObjectReference(dict):
+    """A reference written by ``flatten_objects``, with the referenced object
+    (or None, if it no longer exists) loaded by ``resolve_log_objects``."""
+
+    content_object = None
+
+
+def _collect_references(data, references):
+    if isinstance(data, dict):
+        items = list(data.items())
+    elif isinstance(data, list):
+        items = list(enumerate(data))
+    else:
+        return
+    for key, value in items:
+        if isinstance(value, dict) and {"object", "ref", "value"} <= value.keys():
+            value = data[key] = ObjectReference(value)
+            references.append(value)
+        _collect_references(value, references)
+
+
+def resolve_log_objects(entries):
+    """Load the objects referenced in the data of the given log entries, with
+    one query per content type, and replace the references with
+    ``ObjectReference`` instances that carry them.  Only the entries in
+    memory are changed, they are meant for rendering a page of the log."""
+    references = []
+    for entry in entries:
+        _collect_references(entry.data, references)
+
+    by_type = {}
+    for reference in references:
+        with suppress(TypeError, ValueError):
+            app_label, model, pk = reference["ref"]
+            by_type.setdefault((app_label, model), []).append((reference, pk))
+
+    for (app_label, model), type_references in by_type.items():
+        try:
+            model_class = ContentType.objects.get_by_natural_key(
+                app_label, model
+            ).model_class()
+        except ContentType.DoesNotExist:
+            continue
+        if model_class is None:
+            continue
+        objects = {
+            str(obj.pk): obj
+            for obj in model_class._base_manager.filter(
+                pk__in={pk for _reference, pk in type_references}
+            )
+        }
+        for reference, pk in type_references:
+            reference.content_object = objects.get(str(pk))
+
+
 class LogTargetMixin:
     LOG_TARGET_BASE = None
 
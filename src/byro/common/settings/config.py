@@ -41,6 +41,10 @@ CONFIG = {
         "email": {"default": "", "env": os.getenv("BYRO_LOGGING_EMAIL")},
         "email_level": {"default": "", "env": os.getenv("BYRO_LOGGING_EMAIL_LEVEL")},
     },
+    "celery": {
+        "broker": {"default": "", "env": os.getenv("BYRO_CELERY_BROKER")},
+        "backend": {"default": "", "env": os.getenv("BYRO_CELERY_BACKEND")},
+    },
     "locale": {
         "language_code": {"default": "en", "env": os.getenv("BYRO_LANGUAGE_CODE")},
         "time_zone": {"default": "UTC", "env": os.getenv("BYRO_TIME_ZONE")},
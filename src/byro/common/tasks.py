@@ -0,0 +1,8 @@
+from byro.celery_app import app
+
+
+@app.task
+def run_job(pk):
+    from byro.common.models.job import Job
+
+    Job.objects.get(pk=pk).run()
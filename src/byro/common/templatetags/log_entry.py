@@ -8,15 +8,32 @@ from django.urls import reverse
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
 
+from byro.common.models.log import ObjectReference
 from byro.common.signals import log_formatters
 from byro.documents.models import get_document_category_names
 
 FORMATTER_REGISTRY = {}
+# action_type -> whether there is a log_entry/<action_type>.html template
+ACTION_TEMPLATES = {}
+
+
+def get_action_template(action_type):
+    """Return the template for log entries of this type, or None.  Missing
+    templates are remembered, so that they are only looked up once."""
+    if ACTION_TEMPLATES.get(action_type) is False:
+        return None
+    try:
+        template = get_template(f"log_entry/{action_type}.html")
+    except TemplateDoesNotExist:
+        ACTION_TEMPLATES[action_type] = False
+        return None
+    ACTION_TEMPLATES[action_type] = True
+    return template
 
 
 def default_formatter(entry):
-    with suppress(TemplateDoesNotExist):
-        tmpl = get_template(f"log_entry/{entry.action_type}.html")
+    tmpl = get_action_template(entry.action_type)
+    if tmpl:
         return tmpl.render({"log_entry": entry})
 
     data = dict(entry.data or {})
@@ -79,9 +96,12 @@ def format_log_object(obj, key=None):
     with suppress(Exception):
         if "object" in obj and "ref" in obj and "value" in obj:
             with suppress(Exception):
-                content_object = ContentType.objects.get(
-                    app_label=obj["ref"][0], model=obj["ref"][1]
-                ).get_object_for_this_type(pk=obj["ref"][2])
+                if isinstance(obj, ObjectReference):
+                    content_object = obj.content_object
+                else:
+                    content_object = ContentType.objects.get(
+                        app_label=obj["ref"][0], model=obj["ref"][1]
+                    ).get_object_for_this_type(pk=obj["ref"][2])
 
                 if obj["value"] == str(content_object):
                     url = content_object.get_absolute_url()
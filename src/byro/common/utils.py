@@ -1,8 +1,10 @@
+import multiprocessing
 import subprocess
 import sys
 from contextlib import suppress
 
 from django.apps import apps
+from django.db import connections
 
 
 def get_plugins():
@@ -42,7 +44,7 @@ def get_version():
     return ""
 
 
-def get_installed_software():
+def compute_installed_software():
     retval = [f"byro {get_version()}"]
     for plugin in get_plugins():
         retval.append(
@@ -51,3 +53,31 @@ def get_installed_software():
             ).strip()
         )
     return retval
+
+
+_installed_software = None
+
+
+def get_installed_software():
+    """The byro version and the installed plugins, as stamped into every log
+    entry.  Computed once per process (it may run ``git describe``), when the
+    apps are ready."""
+    global _installed_software
+    if _installed_software is None:
+        _installed_software = tuple(compute_installed_software())
+    return _installed_software
+
+
+def get_worker_pool(processes):
+    """A ``multiprocessing`` pool of ``processes`` workers for read-only
+    database work, or None if ``processes`` is less than 2 or the platform
+    cannot fork.
+
+    The workers are always forked (also where spawning is the default, as on
+    macOS and with Python 3.14), because they rely on inheriting the set up
+    Django of the calling process. The database connections are closed first,
+    the workers open their own."""
+    if processes < 2 or "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    connections.close_all()
+    return multiprocessing.get_context("fork").Pool(processes)
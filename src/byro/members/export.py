@@ -0,0 +1,69 @@
+"""Export of member data fields (see ``Member.get_fields``) for many members.
+
+Calling ``Field.getter`` for every member and field costs queries for the
+computed fields, the profiles and the current membership.  The export plans
+one queryset for the selected fields instead: computed fields are annotated,
+profiles are joined and memberships are prefetched, so that exporting all
+members takes a fixed number of queries per chunk of members.
+"""
+
+from functools import partial
+
+from django.db.models import Prefetch
+
+from byro.members.models import Membership
+
+# Field ids that are backed by a MemberQuerySet annotation
+ANNOTATED_FIELDS = {
+    "_internal_balance": "with_balance",
+    "_internal_active": "with_is_active",
+    "_internal_last_transaction": "with_last_fee_transaction",
+}
+MEMBERSHIP_PATH = "memberships.last()."
+
+
+def _membership_getter(name, member):
+    memberships = member.export_memberships
+    return getattr(memberships[-1], name, None) if memberships else None
+
+
+def plan_member_export(queryset, fields):
+    """Return the planned ``queryset`` and the ``(field_id, getter)`` pairs to
+    read the ``fields`` of its members."""
+    getters = []
+    profiles = set()
+    memberships = False
+    for field in fields:
+        if field.field_id in ANNOTATED_FIELDS:
+            queryset = getattr(queryset, ANNOTATED_FIELDS[field.field_id])()
+            getter = field.getter
+        elif field.path.startswith(MEMBERSHIP_PATH):
+            memberships = True
+            name = field.path[len(MEMBERSHIP_PATH) :]
+            getter = partial(_membership_getter, name)
+        else:
+            first = field.path.split(".")[0]
+            if first.startswith("profile_"):
+                profiles.add(first)
+            getter = field.getter
+        getters.append((field.field_id, getter))
+
+    if profiles:
+        queryset = queryset.select_related(*sorted(profiles))
+    if memberships:
+        queryset = queryset.prefetch_related(
+            Prefetch(
+                "memberships",
+                queryset=Membership.objects.order_by("pk"),
+                to_attr="export_memberships",
+            )
+        )
+    return queryset, getters
+
+
+def iter_member_rows(queryset, fields, chunk_size=500):
+    """Yield one dictionary of field values per member of ``queryset``,
+    reading the members ``chunk_size`` at a time."""
+    queryset, getters = plan_member_export(queryset, fields)
+    for member in queryset.iterator(chunk_size=chunk_size):
+        yield {field_id: getter(member) for field_id, getter in getters}
@@ -0,0 +1,425 @@
+"""Bulk import of member data fields (see ``Member.get_fields``) from rows of
+strings, e.g. the lines of a CSV file.
+
+An import has two steps.  ``plan_member_import`` parses and validates all
+rows and matches them with the existing members (by internal ID or by
+membership number, in one query), without writing anything.  The resulting
+``MemberImportPlan`` lists the planned changes, which can be shown as a
+dry-run report, and writes them with ``apply()``: members, profiles,
+memberships and initial balances are written with bulk inserts and updates,
+chunk by chunk, followed by the ``post_save`` signals (which bulk writes
+don't send) and the log entries of the chunk.  The office runs imports as
+background jobs, which commit every chunk on its own.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+import dateparser
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from byro.bookkeeping.models import Transaction
+from byro.bookkeeping.special_accounts import SpecialAccounts
+from byro.common.models import log_batch
+from byro.members.models import Member, Membership, MembershipDuesSchedule
+
+MEMBERSHIP_PATH = "memberships.last()."
+INITIAL_BALANCE_MEMO = "Initial Balance created by CSV Import"
+
+
+class MemberImportRow:
+    """The planned changes for one input row.
+
+    ``values`` maps the target (``None`` for the member itself, or the name
+    of a profile accessor like ``profile_sepa``) to the model field values
+    to set.  ``changes`` lists ``(field name, old value, new value)`` for the
+    report."""
+
+    def __init__(self, line, member=None):
+        self.line = line
+        self.member = member
+        self.is_new = member is None
+        self.values = {}
+        self.membership = {}
+        self.initial_balance = None
+        self.changes = []
+
+    def set_value(self, field, target, model_field, value):
+        if self.is_new:
+            old_value = None
+        else:
+            # Read profiles from the select_related() cache: accessing a
+            # missing profile would create it
+            instance = self.member
+            if target is not None:
+                instance = Member._meta.get_field(target).get_cached_value(
+                    instance, None
+                )
+            old_value = getattr(instance, model_field.attname, None)
+            if old_value == value or (old_value is None and value == ""):
+                return
+        self.values.setdefault(target, {})[model_field.attname] = value
+        self.changes.append((field.name, old_value, value))
+
+
+class MemberImportPlan:
+    def __init__(self):
+        self.rows = []
+        self.errors = []
+
+    @property
+    def created(self):
+        return [row for row in self.rows if row.is_new]
+
+    @property
+    def updated(self):
+        return [row for row in self.rows if not row.is_new and row.changes]
+
+    @property
+    def unchanged(self):
+        return [row for row in self.rows if not row.is_new and not row.changes]
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    def apply(self, user_or_context, chunk_size=500, progress=None) -> dict:
+        """Write the planned changes, ``chunk_size`` rows at a time, each chunk
+        in its own transaction.  After each chunk, ``progress`` is called with
+        the number of rows written so far.
+
+        Returns the number of members ``created`` and ``updated``."""
+        if self.errors:
+            raise ValueError("Cannot apply a member import with errors")
+        rows = self.created + self.updated
+        for start in range(0, len(rows), chunk_size):
+            with log_batch():
+                _apply_chunk(rows[start : start + chunk_size], user_or_context)
+            if progress:
+                progress(min(start + chunk_size, len(rows)))
+        return {"created": len(self.created), "updated": len(self.updated)}
+
+
+def _resolve_field(field):
+    """Return the target (see ``MemberImportRow.values``) and the model field
+    that a member data field is stored in."""
+    if field.path.startswith(MEMBERSHIP_PATH):
+        return "membership", Membership._meta.get_field(
+            field.path[len(MEMBERSHIP_PATH) :]
+        )
+    if "." not in field.path:
+        return None, Member._meta.get_field(field.path)
+    accessor, name = field.path.split(".", 1)
+    profile_class = Member._meta.get_field(accessor).related_model
+    return accessor, profile_class._meta.get_field(name)
+
+
+def _to_python(model_field, value):
+    if value == "" and not model_field.empty_strings_allowed:
+        return None
+    return model_field.to_python(value)
+
+
+def _parse_datetime(value):
+    result = dateparser.parse(value, languages=[settings.LANGUAGE_CODE, "en"])
+    if result is None:
+        raise ValidationError(_("Couldn't parse the date '{}'").format(value))
+    if timezone.is_naive(result):
+        result = timezone.make_aware(result)
+    return result
+
+
+def _map_columns(columns, fields, plan):
+    mapping = {}
+    for column in columns:
+        if not column.strip():
+            continue
+        for field in fields.values():
+            if str(field.name).strip() == column.strip():
+                mapping[column] = field
+                break
+        else:
+            plan.add_error(
+                None,
+                _("Couldn't map input column '{}' to field").format(column.strip()),
+            )
+    return mapping
+
+
+def _parse_row(indict, mapping, decimal_comma):
+    """Return the member reference (internal ID and number), the parsed values
+    of one row as ``(field, target, model field, value)``, and the initial
+    balance as ``(amount, timestamp)``."""
+    internal_id = number = None
+    values = []
+    initial_balance = initial_balance_timestamp = None
+    for column, field in mapping.items():
+        value = indict.get(column)
+        if value is None:
+            continue
+        if field.field_id == "_internal_id":
+            if value.strip():
+                try:
+                    internal_id = int(value)
+                except ValueError:
+                    raise ValidationError(
+                        _("Invalid internal ID '{}'").format(value)
+                    ) from None
+        elif field.field_id == "_internal_balance":
+            if value.strip():
+                if decimal_comma:
+                    value = value.replace(".", "").replace(",", ".")
+                try:
+                    initial_balance = Decimal(value)
+                except InvalidOperation:
+                    raise ValidationError(
+                        _("Invalid amount '{}'").format(value)
+                    ) from None
+        elif field.field_id == "_internal_last_transaction":
+            if value.strip():
+                initial_balance_timestamp = _parse_datetime(value)
+        elif field.read_only:
+            continue
+        else:
+            target, model_field = _resolve_field(field)
+            if target == "membership":
+                if not value:
+                    continue
+                if model_field.name in ("start", "end"):
+                    value = _parse_datetime(value)
+            value = _to_python(model_field, value)
+            if field.field_id == "member__number" and value:
+                number = value
+            values.append((field, target, model_field, value))
+
+    return internal_id, number, values, (initial_balance, initial_balance_timestamp)
+
+
+def plan_member_import(rows, fields=None, decimal_comma=False) -> MemberImportPlan:
+    """Parse and validate ``rows`` (dictionaries of column name to string value,
+    with the field names as column names) and plan the changes, without
+    writing anything.
+
+    Rows are matched with existing members by internal ID, and otherwise by
+    membership number.  Unmatched rows create new members, including their
+    current membership and initial balance, if given.  Computed fields and
+    memberships of existing members are not changed."""
+    fields = fields or Member.get_fields()
+    plan = MemberImportPlan()
+    mapping = None
+    parsed = []
+    for line, indict in enumerate(rows, start=2):
+        if mapping is None:
+            mapping = _map_columns(indict.keys(), fields, plan)
+            if plan.errors:
+                return plan
+        try:
+            parsed.append((line, *_parse_row(indict, mapping, decimal_comma)))
+        except ValidationError as e:
+            plan.add_error(line, " ".join(e.messages))
+
+    internal_ids = {internal_id for _line, internal_id, *_rest in parsed}
+    numbers = {number for _line, _i, number, *_rest in parsed}
+    internal_ids.discard(None)
+    numbers.discard(None)
+    profiles = {
+        target
+        for _line, _i, _n, values, _b in parsed
+        for _field, target, _model_field, _value in values
+        if target not in (None, "membership")
+    }
+    by_pk, by_number = {}, {}
+    if internal_ids or numbers:
+        for member in Member.all_objects.filter(
+            models.Q(pk__in=internal_ids) | models.Q(number__in=numbers)
+        ).select_related(*sorted(profiles)):
+            by_pk[member.pk] = member
+            if member.number:
+                by_number.setdefault(member.number, []).append(member)
+
+    for line, internal_id, number, values, (amount, timestamp) in parsed:
+        member = by_pk.get(internal_id)
+        if member is None and number is not None:
+            candidates = by_number.get(number, [])
+            if len(candidates) > 1:
+                plan.add_error(
+                    line,
+                    _("Membership number '{}' is used by more than one member").format(
+                        number
+                    ),
+                )
+                continue
+            member = candidates[0] if candidates else None
+
+        row = MemberImportRow(line, member)
+        if row.is_new and (amount or timestamp):
+            if not timestamp:
+                plan.add_error(
+                    line,
+                    _(
+                        "Either both or none columns has to be given: '{}' and '{}'"
+                    ).format(
+                        fields["_internal_balance"].name,
+                        fields["_internal_last_transaction"].name,
+                    ),
+                )
+                continue
+            if amount:
+                row.initial_balance = (amount, timestamp)
+                row.changes.append((fields["_internal_balance"].name, None, amount))
+        for field, target, model_field, value in values:
+            if target == "membership":
+                if row.is_new:
+                    row.membership[model_field.attname] = value
+                    row.changes.append((field.name, None, value))
+            else:
+                row.set_value(field, target, model_field, value)
+        missing = [
+            str(f.verbose_name)
+            for f in Membership._meta.concrete_fields
+            if row.membership
+            and f.attname not in row.membership
+            and not (f.null or f.has_default() or f.primary_key or f.name == "member")
+        ]
+        if missing:
+            plan.add_error(
+                line,
+                _("The membership is missing a value for: {}").format(
+                    ", ".join(missing)
+                ),
+            )
+            continue
+        plan.rows.append(row)
+    return plan
+
+
+def _send_post_save(instances, created):
+    """Send the ``post_save`` signals that bulk inserts and updates skip, for
+    the receivers of byro and its plugins."""
+    for instance in instances:
+        post_save.send(
+            sender=type(instance),
+            instance=instance,
+            created=created,
+            update_fields=None,
+            raw=False,
+            using=instance._state.db,
+        )
+
+
+def _apply_chunk(rows, user_or_context):
+    new_rows = [row for row in rows if row.is_new]
+    for row in new_rows:
+        row.member = Member(**row.values.get(None, {}))
+    Member.objects.bulk_create([row.member for row in new_rows])
+    _send_post_save([row.member for row in new_rows], created=True)
+
+    updated, update_fields = [], set()
+    for row in rows:
+        if not row.is_new and None in row.values:
+            for key, value in row.values[None].items():
+                setattr(row.member, key, value)
+            updated.append(row.member)
+            update_fields |= set(row.values[None])
+    if updated:
+        Member.objects.bulk_update(updated, sorted(update_fields))
+        _send_post_save(updated, created=False)
+
+    _apply_profiles(rows)
+
+    memberships = Membership.objects.bulk_create(
+        Membership(member=row.member, **row.membership)
+        for row in new_rows
+        if row.membership
+    )
+    _send_post_save(memberships, created=True)
+    MembershipDuesSchedule.refresh(
+        Membership.objects.filter(pk__in=[m.pk for m in memberships])
+    )
+
+    balance_rows = [row for row in new_rows if row.initial_balance]
+    _create_initial_balances(balance_rows, user_or_context)
+
+    for row in rows:
+        row.member.log(user_or_context, ".created" if row.is_new else ".updated")
+    if balance_rows:
+        balances = dict(
+            Member.objects.with_balance()
+            .filter(pk__in=[row.member.pk for row in balance_rows])
+            .values_list("pk", "annotated_balance")
+        )
+        for row in balance_rows:
+            row.member.log(
+                user_or_context,
+                ".finance.initial_balance",
+                balance=balances[row.member.pk],
+            )
+
+
+def _apply_profiles(rows):
+    profile_targets = {
+        target
+        for row in rows
+        for target in row.values
+        if target not in (None, "membership")
+    }
+    for accessor in sorted(profile_targets):
+        relation = Member._meta.get_field(accessor)
+        profile_class = relation.related_model
+        created, updated, update_fields = [], [], set()
+        for row in rows:
+            values = row.values.get(accessor)
+            if not values:
+                continue
+            profile = (
+                None if row.is_new else relation.get_cached_value(row.member, None)
+            )
+            if profile is None:
+                created.append(profile_class(member=row.member, **values))
+            else:
+                for key, value in values.items():
+                    setattr(profile, key, value)
+                updated.append(profile)
+                update_fields |= set(values)
+        profile_class.objects.bulk_create(created)
+        _send_post_save(created, created=True)
+        if updated:
+            profile_class.objects.bulk_update(updated, sorted(update_fields))
+            _send_post_save(updated, created=False)
+
+
+def _create_initial_balances(rows, user_or_context):
+    """Book the initial balances of new members against the opening balance
+    account, like ``Member.adjust_balance``."""
+    if not rows:
+        return
+    _now = timezone.now()
+    fees_receivable = SpecialAccounts.fees_receivable
+    opening_balance = SpecialAccounts.opening_balance
+
+    transactions = []
+    for row in rows:
+        amount = row.initial_balance[0]
+        member_account, other_account = "credit_account", "debit_account"
+        if amount < 0:
+            amount = -amount
+            member_account, other_account = other_account, member_account
+        transactions.append(
+            {
+                "value_datetime": row.initial_balance[1],
+                "booking_datetime": _now,
+                "memo": INITIAL_BALANCE_MEMO,
+                "bookings": [
+                    {"amount": amount, other_account: opening_balance},
+                    {
+                        "amount": amount,
+                        "member": row.member,
+                        member_account: fees_receivable,
+                    },
+                ],
+            }
+        )
+    Transaction.objects.bulk_create_balanced(transactions, user_or_context)
@@ -0,0 +1,248 @@
+"""Reconciliation of membership fee liabilities ("dues") with the ledger.
+
+For every member, the dues that should exist are derived from the
+memberships (``Membership.get_dues``) and compared with the due bookings in
+the ledger (credits on the fees account that have not been reversed):
+
+* dues that are missing from the ledger are created,
+* dues within the membership ranges that do not match an expected date and
+  amount are reversed (the membership amount changed),
+* dues outside of all membership ranges are reversed (stray liabilities).
+
+Dues dated in a closed period (see ``ClosedPeriod``) are final: they are
+neither created nor reversed any more.
+
+The expected dues are materialized in ``MembershipDuesSchedule`` and
+``MembershipDue``, so the comparison is done for many members at once with
+a fixed number of queries, and all changes are written with bulk inserts.
+"""
+
+from datetime import datetime, time
+from time import perf_counter
+
+from django.db import transaction
+from django.db.models import Exists, Max, Min, OuterRef
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.timezone import now
+from django.utils.translation import gettext_lazy as _
+
+from byro.bookkeeping.models import Booking, ClosedPeriod, Transaction
+from byro.bookkeeping.special_accounts import SpecialAccounts
+from byro.common.models import Configuration, log_batch
+from byro.common.utils import get_worker_pool
+
+CONTEXT_MISSING = "internal: update_liabilites, add missing liabilities"
+CONTEXT_WRONG = "internal: update_liabilites, membership amount changed"
+CONTEXT_STRAY = "internal: update_liabilites, reverse stray liabilities"
+
+
+def _as_datetime(date):
+    """Return the value a date is stored as (or compared as) in a
+    DateTimeField: midnight in the default timezone."""
+    return timezone.make_aware(
+        datetime.combine(date, time()), timezone.get_default_timezone()
+    )
+
+
+def compute_liability_changes(members, _now=None, refresh=True) -> dict:
+    """Compute the dues diff for all members in the ``members`` queryset.
+
+    The expected dues come from the materialized dues schedules (refreshed
+    first, unless ``refresh`` is False; then only reads the database), and
+    are compared with the due bookings by anti-joins in SQL.
+
+    Returns a dictionary with the number of ``members`` and the lists of
+    ``missing`` dues as ``(member_id, date, amount)`` and of ``wrong`` and
+    ``stray`` due transaction ids.  The result only contains plain values,
+    so it can be passed between processes.
+    """
+    from byro.members.models import Membership, MembershipDue, MembershipDuesSchedule
+
+    _now = _now or now()
+    _from = Configuration.get_solo().accounting_start
+
+    if refresh:
+        MembershipDuesSchedule.refresh(
+            Membership.objects.filter(member__in=members), _now=_now
+        )
+
+    dues_qs = Booking.objects.filter(
+        credit_account=SpecialAccounts.fees,
+        transaction__reversed_by__isnull=True,
+    ).annotate(
+        # Dues are booked at midnight in the default timezone (_as_datetime),
+        # independent of the timezone activated for the current user
+        value_date=TruncDate(
+            "transaction__value_datetime", tzinfo=timezone.get_default_timezone()
+        )
+    )
+    if _from is not None:
+        dues_qs = dues_qs.filter(transaction__value_datetime__gte=_from)
+    closed = ClosedPeriod.objects.order_by("-end").first()
+    if closed is not None:
+        dues_qs = dues_qs.filter(transaction__value_datetime__gt=closed.end)
+
+    has_schedule = Exists(
+        MembershipDuesSchedule.objects.filter(member=OuterRef("member"))
+    )
+    in_schedule_range = Exists(
+        MembershipDuesSchedule.objects.filter(
+            member=OuterRef("member"),
+            start__lte=OuterRef("value_date"),
+            end__gte=OuterRef("value_date"),
+        )
+    )
+    is_scheduled = Exists(
+        MembershipDue.objects.filter(
+            member=OuterRef("member"),
+            date=OuterRef("value_date"),
+            amount=OuterRef("amount"),
+        )
+    )
+    is_booked = Exists(
+        dues_qs.filter(
+            member=OuterRef("member"),
+            value_date=OuterRef("date"),
+            amount=OuterRef("amount"),
+        )
+    )
+
+    member_dues = dues_qs.filter(member__in=members).order_by("pk")
+    wrong = member_dues.filter(in_schedule_range | ~has_schedule).exclude(is_scheduled)
+    stray = member_dues.filter(has_schedule).exclude(in_schedule_range)
+    scheduled = MembershipDue.objects.filter(member__in=members)
+    if closed is not None:
+        scheduled = scheduled.filter(
+            date__gt=timezone.localdate(closed.end, timezone.get_default_timezone())
+        )
+    missing = (
+        scheduled.exclude(is_booked)
+        .values_list("member_id", "date", "amount")
+        .order_by("member_id", "date", "amount")
+        .distinct()
+    )
+
+    return {
+        "members": members.count(),
+        "missing": list(missing),
+        "wrong": list(wrong.values_list("transaction_id", flat=True)),
+        "stray": list(stray.values_list("transaction_id", flat=True)),
+    }
+
+
+@log_batch()
+def apply_liability_changes(changes, _now=None) -> dict:
+    """Write the changes computed by ``compute_liability_changes``, in one
+    transaction.
+
+    Due transactions, their bookings and their log entries (one per
+    transaction) are created with bulk inserts.
+    """
+    _now = _now or now()
+    fees_account = SpecialAccounts.fees
+    fees_receivable_account = SpecialAccounts.fees_receivable
+
+    dues = Transaction.objects.bulk_create_balanced(
+        (
+            {
+                "value_datetime": _as_datetime(date),
+                "booking_datetime": _now,
+                "memo": str(_("Membership due")),
+                "bookings": [
+                    {
+                        "credit_account": fees_account,
+                        "amount": amount,
+                        "member_id": member_id,
+                    },
+                    {
+                        "debit_account": fees_receivable_account,
+                        "amount": amount,
+                        "member_id": member_id,
+                    },
+                ],
+            }
+            for member_id, date, amount in changes["missing"]
+        ),
+        CONTEXT_MISSING,
+    )
+
+    reversed_wrong = Transaction.objects.filter(pk__in=changes["wrong"]).reverse_all(
+        CONTEXT_WRONG,
+        memo=_("Due amount canceled because of change in membership amount"),
+    )
+    reversed_stray = Transaction.objects.filter(pk__in=changes["stray"]).reverse_all(
+        CONTEXT_STRAY, memo=_("Due amount outside of membership canceled")
+    )
+
+    return {
+        "members": changes["members"],
+        "created": len(dues),
+        "reversed": len(reversed_wrong) + len(reversed_stray),
+    }
+
+
+def _compute_pk_range(args):
+    from byro.members.models import Member
+
+    start, end, _now = args
+    return compute_liability_changes(
+        Member.objects.filter(pk__gte=start, pk__lt=end), _now=_now, refresh=False
+    )
+
+
+def update_all_liabilities(processes=1, chunk_size=500, progress=None) -> dict:
+    """Reconcile the liabilities of all members, ``chunk_size`` member ids at
+    a time.
+
+    With ``processes`` > 1 the dues diff for the member id ranges is
+    computed in a pool of forked worker processes (see
+    ``get_worker_pool``; on platforms that cannot fork it is computed in the
+    calling process), which only read the database.  The dues schedules are
+    refreshed, and the changes are written, by the calling process, one
+    database transaction per range, so that writes (and the log chain) stay
+    serialized.  ``progress`` is called with the number of
+    ranges done and their total after each range.
+
+    Returns a dictionary with the number of ``members`` processed, the number
+    of dues ``created`` and ``reversed``, and the ``duration`` in seconds.
+    """
+    from byro.members.models import Member, Membership, MembershipDuesSchedule
+
+    _now = now()
+    started = perf_counter()
+    result = {"members": 0, "created": 0, "reversed": 0}
+
+    bounds = Member.objects.aggregate(first=Min("pk"), last=Max("pk"))
+    if bounds["first"] is not None:
+        pk_ranges = [
+            (start, start + chunk_size, _now)
+            for start in range(bounds["first"], bounds["last"] + 1, chunk_size)
+        ]
+        for start, end, _ignore in pk_ranges:
+            with transaction.atomic():
+                MembershipDuesSchedule.refresh(
+                    Membership.objects.filter(
+                        member__pk__gte=start, member__pk__lt=end
+                    ),
+                    _now=_now,
+                )
+        pool = get_worker_pool(processes)
+        if pool:
+            with pool:
+                changes = pool.imap_unordered(_compute_pk_range, pk_ranges)
+                _apply_all(changes, result, _now, len(pk_ranges), progress)
+        else:
+            changes = map(_compute_pk_range, pk_ranges)
+            _apply_all(changes, result, _now, len(pk_ranges), progress)
+
+    result["duration"] = perf_counter() - started
+    return result
+
+
+def _apply_all(all_changes, result, _now, total, progress):
+    for done, changes in enumerate(all_changes, start=1):
+        for key, value in apply_liability_changes(changes, _now=_now).items():
+            result[key] += value
+        if progress:
+            progress(done, total)
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now
+
+from byro.members.models import Member, MemberLedgerSummary
+
+SUMMARY_FIELDS = ("fee_balance", "donation_balance", "last_fee_transaction")
+
+
+class Command(BaseCommand):
+    help = "Rebuild (or verify) the per-member ledger summaries from the bookings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only compare the stored summaries with the ledger, do not write. Exits with an error if any differ.",
+        )
+
+    def handle(self, *args, **options):
+        _now = now()
+        member_ids = list(
+            Member.all_objects.all().order_by("pk").values_list("pk", flat=True)
+        )
+
+        if not options["check"]:
+            MemberLedgerSummary.rebuild(member_ids, _now=_now)
+            self.stdout.write(
+                f"Rebuilt the ledger summaries of {len(member_ids)} members."
+            )
+            return
+
+        summaries = {s.member_id: s for s in MemberLedgerSummary.objects.all()}
+        values = MemberLedgerSummary.compute_many(member_ids, _now=_now)
+        mismatches = 0
+        for member_id in member_ids:
+            summary = summaries.get(member_id)
+            # A missing row must not hide any bookings, an outdated row must
+            # not differ from the ledger
+            stored = summary or MemberLedgerSummary(member_id=member_id)
+            differences = {
+                key: (getattr(stored, key), values[member_id][key])
+                for key in SUMMARY_FIELDS
+                if getattr(stored, key) != values[member_id][key]
+            }
+            if differences:
+                mismatches += 1
+                state = "missing" if summary is None else "stored"
+                self.stderr.write(f"Member {member_id} ({state}): {differences}")
+
+        if mismatches:
+            raise CommandError(f"{mismatches} ledger summaries do not match the ledger")
+        self.stdout.write("All ledger summaries match the ledger.")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from byro.members.liabilities import update_all_liabilities
+
+
+class Command(BaseCommand):
+    help = "Create missing and reverse wrong membership fee liabilities for all members"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-p",
+            "--processes",
+            default=1,
+            type=int,
+            help="Number of worker processes computing the liabilities",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            default=500,
+            type=int,
+            help="Number of member IDs reconciled per database transaction",
+        )
+
+    def handle(self, *args, **options):
+        result = update_all_liabilities(
+            processes=options["processes"], chunk_size=options["chunk_size"]
+        )
+        duration = result["duration"] or 1e-9
+        self.stdout.write(
+            "Reconciled {members} members in {duration:.2f}s ({members_per_second:.0f} members/s): "
+            "{created} dues created, {reversed} dues reversed ({dues_per_second:.0f} dues/s).".format(
+                members_per_second=result["members"] / duration,
+                dues_per_second=(result["created"] + result["reversed"]) / duration,
+                **result,
+            )
+        )
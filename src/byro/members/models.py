@@ -1,18 +1,25 @@
+import copy
+import json
 from collections import OrderedDict
 from decimal import Decimal
-from functools import reduce
 
 from dateutil.relativedelta import relativedelta
+from django.contrib.contenttypes.models import ContentType
 from django.db import models, transaction
 from django.db.models import Q
 from django.db.models.fields.related import OneToOneRel
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
 from django.urls import reverse
 from django.utils.functional import classproperty
 from django.utils.safestring import mark_safe
 from django.utils.timezone import now
+from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
 
-from byro.bookkeeping.models import Booking, Transaction
+from byro.bookkeeping.models import Booking, ClosedPeriod, MemberSnapshot, Transaction
+from byro.bookkeeping.signals import bookings_created
 from byro.bookkeeping.special_accounts import SpecialAccounts
 from byro.common.models import Configuration, LogEntry, LogTargetMixin
 from byro.common.models.auditable import Auditable
@@ -51,8 +58,38 @@ class Field:
         for k, v in kwargs.items():
             setattr(self, k, v)
 
+    def copy(self):
+        result = copy.copy(self)
+        result.registration_form = dict(self.registration_form)
+        return result
+
+    @property
+    def path(self):
+        return self._path
+
+    @path.setter
+    def path(self, path):
+        self._path = path
+        self._steps, self._prop = self._compile_path(path)
+
     @staticmethod
-    def _follow_path(start, path):
+    def _compile_path(path):
+        """Split a python.dot.path into the steps up to its penultimate item,
+        as ``(name, call)`` pairs, and the name of the last descriptor."""
+        path = path.split(".")
+        steps = tuple((p.rsplit("(")[0], p.endswith("()")) for p in path[:-1])
+        return steps, path[-1]
+
+    @staticmethod
+    def _walk(target, steps):
+        for name, call in steps:
+            target = getattr(target, name, None)
+            if call and target is not None:
+                target = target()
+        return target
+
+    @classmethod
+    def _follow_path(cls, start, path):
         """Follow a python.dot.path until its penultimate item, then return the
         current object and the name of the last descriptor. Allows 'func()'
         syntax to call a method along the way without arguments.
@@ -62,29 +99,28 @@ class Field:
             _follow_path(m, 'profile_foo.bar')  ->  m.profile_foo, 'bar'
             _follow_path(m, 'memberships.last().start')  ->  m.memberships.last(), 'start'
         """
-        target = start
-        path = path.split(".")
-        for p in path[:-1]:
-            target = getattr(target, p.rsplit("(")[0], None)
-            if p.endswith("()") and target is not None:
-                target = target()
-        return target, path[-1]
+        steps, prop = cls._compile_path(path)
+        return cls._walk(start, steps), prop
 
     def getter(self, member):
-        target, prop = self._follow_path(member, self.path)
-        return getattr(target, prop, None)
+        return getattr(self._walk(member, self._steps), self._prop, None)
 
     def setter(self, member, value):
         if self.read_only:
             raise NotImplementedError(f"Writing to {self.path} is not supported")
-        target, prop = self._follow_path(member, self.path)
+        target = self._walk(member, self._steps)
         if target is None:
             raise AttributeError(f"Encountered 'None' while following {self.path}")
-        setattr(target, prop, value)
+        setattr(target, self._prop, value)
         if callable(getattr(target, "save", None)):
             target.save()
 
 
+# Member.get_fields() results by language, for the registration form and
+# profile models they were built with
+_fields_cache = {}
+
+
 class MemberTypes:
     MEMBER = "member"
     EXTERNAL = "external"
@@ -110,6 +146,87 @@ class MemberQuerySet(models.QuerySet):
             .distinct()
         )
 
+    def with_balance(self):
+        """Annotate ``annotated_balance``, which is what ``Member.balance``
+        would return, computed for all members in one grouped subquery."""
+        fees_receivable_account = SpecialAccounts.fees_receivable
+        bookings = Booking.objects.filter(
+            Q(debit_account=fees_receivable_account)
+            | Q(credit_account=fees_receivable_account),
+            member=models.OuterRef("pk"),
+            transaction__value_datetime__lte=now(),
+        )
+        opening = models.Value(Decimal("0.00"))
+        period = ClosedPeriod.objects.latest_before()
+        if period:
+            bookings = bookings.filter(transaction__value_datetime__gt=period.end)
+            opening = Coalesce(
+                models.Subquery(
+                    MemberSnapshot.objects.filter(
+                        period=period, member=models.OuterRef("pk")
+                    ).values(balance=models.F("fee_credit") - models.F("fee_debit"))
+                ),
+                opening,
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            )
+        balances = (
+            bookings.order_by()
+            .values("member")
+            .annotate(
+                balance=models.Sum(
+                    models.Case(
+                        models.When(
+                            credit_account=fees_receivable_account, then="amount"
+                        ),
+                        default=-models.F("amount"),
+                        output_field=models.DecimalField(
+                            max_digits=8, decimal_places=2
+                        ),
+                    )
+                )
+            )
+            .values("balance")
+        )
+        return self.annotate(
+            annotated_balance=Coalesce(
+                models.Subquery(balances),
+                models.Value(Decimal("0.00")),
+                output_field=models.DecimalField(max_digits=8, decimal_places=2),
+            )
+            + opening
+        )
+
+    def with_is_active(self):
+        """Annotate ``annotated_is_active``, which is what ``Member.is_active``
+        would return."""
+        today = now().date()
+        return self.annotate(
+            annotated_is_active=models.Exists(
+                Membership.objects.filter(
+                    Q(end__isnull=True) | Q(end__gte=today),
+                    member=models.OuterRef("pk"),
+                    start__lte=today,
+                )
+            )
+        )
+
+    def with_last_fee_transaction(self):
+        """Annotate ``annotated_last_fee_transaction``, which is what
+        ``Member.last_membership_fee_transaction_timestamp`` would return."""
+        fees_receivable_account = SpecialAccounts.fees_receivable
+        return self.annotate(
+            annotated_last_fee_transaction=models.Subquery(
+                Booking.objects.filter(
+                    Q(debit_account=fees_receivable_account)
+                    | Q(credit_account=fees_receivable_account),
+                    member=models.OuterRef("pk"),
+                    transaction__value_datetime__lte=now(),
+                )
+                .order_by("-transaction__value_datetime")
+                .values("transaction__value_datetime")[:1]
+            )
+        )
+
 
 class MemberManager(models.Manager):
     def get_queryset(self):
@@ -120,6 +237,15 @@ class MemberManager(models.Manager):
     def with_active_membership(self):
         return self.get_queryset().with_active_membership()
 
+    def with_balance(self):
+        return self.get_queryset().with_balance()
+
+    def with_is_active(self):
+        return self.get_queryset().with_is_active()
+
+    def with_last_fee_transaction(self):
+        return self.get_queryset().with_last_fee_transaction()
+
 
 class AllMemberManager(models.Manager):
     pass
@@ -213,6 +339,29 @@ class Member(Auditable, models.Model, LogTargetMixin):
 
     @classmethod
     def get_fields(cls):
+        """Return all member data fields by their id.
+
+        The fields are built once per language (their names are translated
+        when they are built) and reused as long as the registration form
+        configuration and the installed profile models stay the same.  The
+        returned fields are copies."""
+        reg_form = Configuration.get_solo().registration_form or []
+        key = (
+            cls,
+            json.dumps(reg_form, sort_keys=True, default=str),
+            tuple(cls.profile_classes),
+        )
+        language = get_language()
+        cached_key, fields = _fields_cache.get(language, (None, None))
+        if cached_key != key:
+            fields = cls._build_fields(reg_form)
+            _fields_cache[language] = (key, fields)
+        return OrderedDict(
+            (field_id, field.copy()) for field_id, field in fields.items()
+        )
+
+    @classmethod
+    def _build_fields(cls, reg_form):
         result = []
 
         result.append(
@@ -256,7 +405,6 @@ class Member(Auditable, models.Model, LogTargetMixin):
             )
         )
 
-        reg_form = Configuration.get_solo().registration_form or []
         form_config = {entry["name"]: entry for entry in reg_form}
 
         profile_map = {
@@ -312,29 +460,47 @@ class Member(Auditable, models.Model, LogTargetMixin):
         _now = now()
         fees_receivable_account = SpecialAccounts.fees_receivable
         qs = Booking.objects.filter(member=self)
+        liability = asset = Decimal("0.00")
         debits = qs.filter(
             debit_account=fees_receivable_account,
             transaction__value_datetime__lte=liability_cutoff or _now,
         )
         if liability_start:
             debits = debits.filter(transaction__value_datetime__gte=liability_start)
+        else:
+            closed_end, snapshot = MemberSnapshot.opening(self, liability_cutoff)
+            if closed_end:
+                debits = debits.filter(transaction__value_datetime__gt=closed_end)
+                liability = snapshot.fee_debit if snapshot else liability
         credits = qs.filter(
             credit_account=fees_receivable_account,
             transaction__value_datetime__lte=asset_cutoff or _now,
         )
         if asset_start:
             credits = credits.filter(transaction__value_datetime__gte=asset_start)
-        liability = debits.aggregate(liability=models.Sum("amount"))[
+        else:
+            closed_end, snapshot = MemberSnapshot.opening(self, asset_cutoff)
+            if closed_end:
+                credits = credits.filter(transaction__value_datetime__gt=closed_end)
+                asset = snapshot.fee_credit if snapshot else asset
+        liability += debits.aggregate(liability=models.Sum("amount"))[
             "liability"
         ] or Decimal("0.00")
-        asset = credits.aggregate(asset=models.Sum("amount"))["asset"] or Decimal(
+        asset += credits.aggregate(asset=models.Sum("amount"))["asset"] or Decimal(
             "0.00"
         )
         return asset - liability
 
     @property
     def balance(self) -> Decimal:
-        return self._calc_balance()
+        if hasattr(self, "annotated_balance"):
+            # Was annotated with MemberQuerySet.with_balance()
+            return self.annotated_balance
+        return self.ledger.fee_balance
+
+    @property
+    def ledger(self) -> "MemberLedgerSummary":
+        return MemberLedgerSummary.for_member(self)
 
     def _calc_last_membership_fee_transaction_timestamp(self):
         _now = now()
@@ -351,7 +517,10 @@ class Member(Auditable, models.Model, LogTargetMixin):
 
     @property
     def last_membership_fee_transaction_timestamp(self):
-        return self._calc_last_membership_fee_transaction_timestamp()
+        if hasattr(self, "annotated_last_fee_transaction"):
+            # Was annotated with MemberQuerySet.with_last_fee_transaction()
+            return self.annotated_last_fee_transaction
+        return self.ledger.last_fee_transaction
 
     def create_balance(self, start, end, commit=True, create_if_zero=True):
         if self.balances.exists():
@@ -394,9 +563,7 @@ class Member(Auditable, models.Model, LogTargetMixin):
 
     @property
     def donation_balance(self) -> Decimal:
-        return self.donations.aggregate(donations=models.Sum("amount"))[
-            "donations"
-        ] or Decimal("0.00")
+        return self.ledger.donation_balance
 
     @property
     def donations(self):
@@ -416,6 +583,9 @@ class Member(Auditable, models.Model, LogTargetMixin):
 
     @property
     def is_active(self):
+        if hasattr(self, "annotated_is_active"):
+            # Was annotated with MemberQuerySet.with_is_active()
+            return self.annotated_is_active
         if not self.memberships.count():
             return False
         for membership in self.memberships.all():
@@ -459,112 +629,13 @@ class Member(Auditable, models.Model, LogTargetMixin):
 
     @transaction.atomic
     def update_liabilites(self):
-        src_account = SpecialAccounts.fees
-        dst_account = SpecialAccounts.fees_receivable
-
-        config = Configuration.get_solo()
-
-        # Step 1: Identify all dates and amounts that should be due at those dates
-        #  (in python, store as a list; hits database once to get list of memberships)
-        # Step 2: Find all due amounts within the data ranges, ignore reversed liabilities
-        #  (hits database)
-        # Step 3: Compare due date and amounts with list from step 1
-        #  (in Python)
-        # Step 4: Cancel all liabilities that didn't match in step 3
-        #  (hits database, once per mismatch)
-        # Step 5: Add all missing liabilities
-        #  (hits database, once per new due)
-        # Step 6: Find and cancel all liabilities outside of membership dates, replaces remove_future_liabilites_on_leave()
-        #  (hits database, once for search, once per stray liability)
-
-        dues = set()
-        membership_ranges = []
-        _now = now()
-        _from = config.accounting_start
-
-        # Step 1
-        for membership in self.memberships.all():
-            if not membership.amount:
-                continue
-            membership_range, membership_dues = membership.get_dues(
-                _now=_now, _from=_from
-            )
-            membership_ranges.append(membership_range)
-            dues |= membership_dues
-
-        # Step 2
-        dues_qs = Booking.objects.filter(
-            member=self,
-            credit_account=src_account,
-            transaction__reversed_by__isnull=True,
-        )
-        if _from is not None:
-            dues_qs = dues_qs.filter(transaction__value_datetime__gte=_from)
-        if membership_ranges:
-            date_range_q = reduce(
-                lambda a, b: a | b,
-                [
-                    models.Q(transaction__value_datetime__gte=start)
-                    & models.Q(transaction__value_datetime__lte=end)
-                    for start, end in membership_ranges
-                ],
-            )
-            dues_qs = dues_qs.filter(date_range_q)
-        dues_in_db = {  # Must be a dictionary instead of set, to retrieve b later on
-            (b.transaction.value_datetime.date(), b.amount): b for b in dues_qs.all()
-        }
-
-        # Step 3
-        dues_in_db_as_set = set(dues_in_db.keys())
-        wrong_dues_in_db = dues_in_db_as_set - dues
-        missing_dues = dues - dues_in_db_as_set
-
-        # Step 4
-        for wrong_due in sorted(wrong_dues_in_db):
-            booking = dues_in_db[wrong_due]
-            booking.transaction.reverse(
-                memo=_("Due amount canceled because of change in membership amount"),
-                user_or_context="internal: update_liabilites, membership amount changed",
-            )
-
-        # Step 5:
-        for date, amount in sorted(missing_dues):
-            t = Transaction.objects.create(
-                value_datetime=date,
-                booking_datetime=_now,
-                memo=_("Membership due"),
-                user_or_context="internal: update_liabilites, add missing liabilities",
-            )
-            t.credit(
-                account=src_account,
-                amount=amount,
-                member=self,
-                user_or_context="internal: update_liabilites, add missing liabilities",
-            )
-            t.debit(
-                account=dst_account,
-                amount=amount,
-                member=self,
-                user_or_context="internal: update_liabilites, add missing liabilities",
-            )
-            t.save()
+        from byro.members.liabilities import (
+            apply_liability_changes,
+            compute_liability_changes,
+        )
 
-        # Step 6:
-        stray_liabilities_qs = Booking.objects.filter(
-            member=self,
-            credit_account=src_account,
-            transaction__reversed_by__isnull=True,
-        )
-        if _from is not None:
-            stray_liabilities_qs = stray_liabilities_qs.filter(transaction__value_datetime__gte=_from)
-        if membership_ranges:
-            stray_liabilities_qs = stray_liabilities_qs.exclude(date_range_q)
-        stray_liabilities_qs = stray_liabilities_qs.prefetch_related("transaction")
-        for stray_liability in stray_liabilities_qs.all():
-            stray_liability.transaction.reverse(
-                memo=_("Due amount outside of membership canceled"),
-                user_or_context="internal: update_liabilites, reverse stray liabilities",
-            )
+        changes = compute_liability_changes(Member.all_objects.filter(pk=self.pk))
+        apply_liability_changes(changes)
 
     @transaction.atomic
     def adjust_balance(self, user_or_context, memo, amount, from_, to_, value_datetime):
@@ -639,9 +710,15 @@ class Member(Auditable, models.Model, LogTargetMixin):
         return mark_safe('<i class="fa fa-user"></i> ')
 
     def log_entries(self):
-        own_entries = [e.pk for e in super().log_entries()]
-        ms_entries = [e.pk for m in self.memberships.all() for e in m.log_entries()]
-        return LogEntry.objects.filter(pk__in=own_entries + ms_entries)
+        """The log entries of the member and of its memberships, selected in
+        one query using the (content_type, object_id) index."""
+        return LogEntry.objects.filter(
+            Q(content_type=ContentType.objects.get_for_model(Member), object_id=self.pk)
+            | Q(
+                content_type=ContentType.objects.get_for_model(Membership),
+                object_id__in=self.memberships.values("pk"),
+            )
+        )
 
 
 class FeeIntervals:
@@ -670,9 +747,29 @@ class MembershipType(Auditable, models.Model):
     )
 
 
+class MembershipQuerySet(models.QuerySet):
+    """Drops the dues schedules of memberships whose dues change by bulk
+    writes, which don't send the signals the schedules rely on."""
+
+    def update(self, **kwargs):
+        if set(kwargs) & set(DUES_SCHEDULE_FIELDS):
+            MembershipDuesSchedule.objects.filter(
+                membership__in=self.values("pk")
+            ).delete()
+        return super().update(**kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if set(fields) & set(DUES_SCHEDULE_FIELDS):
+            MembershipDuesSchedule.objects.filter(membership__in=objs).delete()
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+
 class Membership(Auditable, models.Model, LogTargetMixin):
     LOG_TARGET_BASE = "byro.members.membership"
 
+    objects = MembershipQuerySet.as_manager()
+
     member = models.ForeignKey(
         to="members.Member", on_delete=models.CASCADE, related_name="memberships"
     )
@@ -695,9 +792,8 @@ class Membership(Auditable, models.Model, LogTargetMixin):
     def get_absolute_url(self):
         return reverse("office:members.data", kwargs={"pk": self.member.pk})
 
-    def get_dues(self, _now=None, _from=None):
+    def get_dues_range(self, _now=None, _from=None):
         _now = _now or now()
-        dues = set()
         end = self.end
         start = self.start
         if _from is not None and start < _from:
@@ -709,6 +805,11 @@ class Membership(Auditable, models.Model, LogTargetMixin):
                 ValueError
             ):  # membership.start.day is not a valid date in our month, we'll use the last date instead
                 end = (_now + relativedelta(day=1, months=1, days=-1)).date()
+        return start, end
+
+    def get_dues(self, _now=None, _from=None):
+        dues = set()
+        start, end = self.get_dues_range(_now=_now, _from=_from)
         date = start
         while date <= end:
             dues.add((date, self.amount))
@@ -716,6 +817,120 @@ class Membership(Auditable, models.Model, LogTargetMixin):
         return (start, end), dues
 
 
+class MembershipDuesSchedule(models.Model):
+    """Materialized ``Membership.get_dues()``: the date range of a membership
+    in which fees are due, with one ``MembershipDue`` per due date.
+
+    Schedules are dropped when the start, end, amount or interval of their
+    membership or the accounting start changes, and are (re)generated by
+    ``refresh()``, which also extends the schedules of open-ended memberships
+    as time passes.
+    """
+
+    membership = models.OneToOneField(
+        to="members.Membership",
+        related_name="dues_schedule",
+        on_delete=models.CASCADE,
+    )
+    member = models.ForeignKey(
+        to="members.Member", related_name="+", on_delete=models.CASCADE
+    )
+    start = models.DateField()
+    end = models.DateField()
+
+    @classmethod
+    def refresh(cls, memberships, _now=None):
+        """Generate missing and outdated schedules for the ``memberships``
+        queryset."""
+        _now = _now or now()
+        _from = Configuration.get_solo().accounting_start
+
+        outdated = []
+        for membership in (
+            memberships.exclude(amount=0)
+            .filter(Q(dues_schedule__isnull=True) | Q(end__isnull=True))
+            .select_related("dues_schedule")
+        ):
+            schedule = getattr(membership, "dues_schedule", None)
+            dues_range = membership.get_dues_range(_now=_now, _from=_from)
+            if schedule is None or (schedule.start, schedule.end) != dues_range:
+                outdated.append(membership)
+        if not outdated:
+            return
+
+        cls.objects.filter(membership__in=outdated).delete()
+        dues = []
+        for membership in outdated:
+            (start, end), membership_dues = membership.get_dues(_now=_now, _from=_from)
+            schedule = cls(
+                membership=membership,
+                member_id=membership.member_id,
+                start=start,
+                end=end,
+            )
+            dues += [
+                MembershipDue(
+                    schedule=schedule,
+                    member_id=membership.member_id,
+                    date=date,
+                    amount=amount,
+                )
+                for date, amount in membership_dues
+            ]
+            membership.dues_schedule = schedule
+        cls.objects.bulk_create(m.dues_schedule for m in outdated)
+        MembershipDue.objects.bulk_create(dues)
+
+
+class MembershipDue(models.Model):
+    schedule = models.ForeignKey(
+        to="members.MembershipDuesSchedule",
+        related_name="dues",
+        on_delete=models.CASCADE,
+    )
+    member = models.ForeignKey(
+        to="members.Member", related_name="+", on_delete=models.CASCADE
+    )
+    date = models.DateField()
+    amount = models.DecimalField(max_digits=8, decimal_places=2)
+
+    class Meta:
+        unique_together = (("schedule", "date"),)
+        indexes = [models.Index(fields=["member", "date"])]
+
+
+DUES_SCHEDULE_FIELDS = ("start", "end", "amount", "interval")
+
+
+@receiver(post_init, sender=Membership)
+def dues_schedule_membership_post_init(sender, instance, **kwargs):
+    instance._dues_schedule_values = tuple(
+        instance.__dict__.get(field) for field in DUES_SCHEDULE_FIELDS
+    )
+
+
+@receiver(post_save, sender=Membership)
+def dues_schedule_membership_post_save(sender, instance, created, **kwargs):
+    values = tuple(getattr(instance, field) for field in DUES_SCHEDULE_FIELDS)
+    if not created and values != getattr(instance, "_dues_schedule_values", None):
+        MembershipDuesSchedule.objects.filter(membership=instance).delete()
+    instance._dues_schedule_values = values
+
+
+@receiver(post_init, sender=Configuration)
+def dues_schedule_configuration_post_init(sender, instance, **kwargs):
+    instance._dues_schedule_accounting_start = instance.__dict__.get("accounting_start")
+
+
+@receiver(post_save, sender=Configuration)
+def dues_schedule_configuration_post_save(sender, instance, **kwargs):
+    if instance.accounting_start != getattr(
+        instance, "_dues_schedule_accounting_start", None
+    ):
+        MembershipDuesSchedule.objects.all().delete()
+    instance._dues_schedule_accounting_start = instance.accounting_start
+
+
 SPECIAL_NAMES = {Member: "member", Membership: "membership"}
 
 SPECIAL_ORDER = [
@@ -763,3 +978,247 @@ class MemberBalance(models.Model):
         default="unpaid",
         max_length=7,
     )
+
+
+class MemberLedgerSummary(models.Model):
+    """Denormalized per-member summary of the ledger, so that reading
+    ``Member.balance``, ``Member.donation_balance`` or
+    ``Member.last_membership_fee_transaction_timestamp`` does not aggregate the
+    whole booking history.
+
+    The row is a read-only cache: it is only written by the signal receivers
+    below, in the same database transaction as the booking change (bookings
+    written in bulk send ``bookings_created``), and by ``manage.py
+    rebuild_ledger_summary``, which rebuilds or verifies all rows. Bookings
+    with a value date after ``computed_at`` are not contained yet,
+    ``valid_until`` is the first of their value dates. Reading a missing row,
+    or one whose ``valid_until`` has passed, aggregates the ledger without
+    storing the result.
+    """
+
+    member = models.OneToOneField(
+        to="members.Member", related_name="ledger_summary", on_delete=models.CASCADE
+    )
+    fee_balance = models.DecimalField(
+        max_digits=10, decimal_places=2, default=Decimal("0.00")
+    )
+    donation_balance = models.DecimalField(
+        max_digits=10, decimal_places=2, default=Decimal("0.00")
+    )
+    last_fee_transaction = models.DateTimeField(null=True)
+    computed_at = models.DateTimeField()
+    valid_until = models.DateTimeField(null=True)
+
+    def is_current(self, _now=None) -> bool:
+        _now = _now or now()
+        return self.computed_at <= _now and (
+            self.valid_until is None or _now < self.valid_until
+        )
+
+    @classmethod
+    def compute(cls, member, _now=None) -> dict:
+        """Aggregate the summary values for one member (instance or pk) from
+        the newest closed period's snapshot and the ledger after it."""
+        member_id = getattr(member, "pk", member)
+        return cls.compute_many([member_id], _now=_now)[member_id]
+
+    @classmethod
+    def compute_many(cls, members, _now=None) -> dict:
+        """Like ``compute()``, for many ``members`` (instances or pks) at once
+        with one grouped query, by member id."""
+        _now = _now or now()
+        member_ids = {getattr(member, "pk", member) for member in members}
+        fees_receivable_account = SpecialAccounts.fees_receivable
+        donations_account = SpecialAccounts.donations
+        fee_q = Q(debit_account=fees_receivable_account) | Q(
+            credit_account=fees_receivable_account
+        )
+        donation_q = Q(credit_account=donations_account)
+        past_q = Q(transaction__value_datetime__lte=_now)
+        # Bookings up to the end of the newest closed period are in its snapshot
+        open_q = past_q
+        snapshots = {}
+        period = ClosedPeriod.objects.latest_before(_now)
+        if period:
+            open_q &= Q(transaction__value_datetime__gt=period.end)
+            snapshots = {
+                snapshot.member_id: snapshot
+                for snapshot in MemberSnapshot.objects.filter(
+                    period=period, member__in=member_ids
+                )
+            }
+        rows = (
+            Booking.objects.order_by()
+            .filter(fee_q | donation_q, member__in=member_ids)
+            .values("member")
+            .annotate(
+                fee_credit=models.Sum(
+                    "amount",
+                    filter=open_q & Q(credit_account=fees_receivable_account),
+                ),
+                fee_debit=models.Sum(
+                    "amount",
+                    filter=open_q & Q(debit_account=fees_receivable_account),
+                ),
+                donations=models.Sum("amount", filter=open_q & donation_q),
+                last_fee_transaction=models.Max(
+                    "transaction__value_datetime", filter=open_q & fee_q
+                ),
+                valid_until=models.Min("transaction__value_datetime", filter=~past_q),
+            )
+        )
+        rows = {row["member"]: row for row in rows}
+
+        result = {}
+        for member_id in member_ids:
+            row = rows.get(member_id, {})
+            fee_credit = row.get("fee_credit") or Decimal("0.00")
+            fee_debit = row.get("fee_debit") or Decimal("0.00")
+            donations = row.get("donations") or Decimal("0.00")
+            last_fee_transaction = row.get("last_fee_transaction")
+            snapshot = snapshots.get(member_id)
+            if snapshot:
+                fee_credit += snapshot.fee_credit
+                fee_debit += snapshot.fee_debit
+                donations += snapshot.donations
+                last_fee_transaction = (
+                    last_fee_transaction or snapshot.last_fee_transaction
+                )
+            result[member_id] = {
+                "fee_balance": fee_credit - fee_debit,
+                "donation_balance": donations,
+                "last_fee_transaction": last_fee_transaction,
+                "computed_at": _now,
+                "valid_until": row.get("valid_until"),
+            }
+        return result
+
+    @classmethod
+    def refresh(cls, member, _now=None) -> "MemberLedgerSummary":
+        summary, _ignore = cls.objects.update_or_create(
+            member_id=getattr(member, "pk", member),
+            defaults=cls.compute(member, _now=_now),
+        )
+        return summary
+
+    @classmethod
+    def for_member(cls, member, _now=None) -> "MemberLedgerSummary":
+        """The stored summary of ``member`` if it is current, otherwise an
+        unsaved one computed from the ledger.  Reading never writes."""
+        _now = _now or now()
+        summary = cls.objects.filter(member=member).first()
+        if summary is None or not summary.is_current(_now):
+            summary = cls(
+                member_id=getattr(member, "pk", member),
+                **cls.compute(member, _now=_now),
+            )
+        return summary
+
+    @classmethod
+    def rebuild(cls, members, _now=None):
+        """Recompute and store the summaries of ``members`` (instances or
+        pks), e.g. after bookings were written in bulk without signals, with
+        a fixed number of queries."""
+        values = cls.compute_many(members, _now=_now)
+        with transaction.atomic():
+            cls.objects.filter(member__in=values).delete()
+            cls.objects.bulk_create(
+                cls(member_id=member_id, **summary)
+                for member_id, summary in values.items()
+            )
+
+    @classmethod
+    def apply_booking(cls, booking):
+        """Incrementally add a newly created booking to its member's summary.
+
+        Missing and outdated summaries are recomputed instead.
+        """
+        fees_receivable_account = SpecialAccounts.fees_receivable
+        donations_account = SpecialAccounts.donations
+        is_fee = fees_receivable_account.pk in (
+            booking.debit_account_id,
+            booking.credit_account_id,
+        )
+        is_donation = booking.credit_account_id == donations_account.pk
+        if not (is_fee or is_donation):
+            return
+
+        with transaction.atomic():
+            summary = (
+                cls.objects.select_for_update().filter(member=booking.member_id).first()
+            )
+            if summary is None or not summary.is_current():
+                cls.refresh(booking.member_id)
+                return
+            # Normalize to the stored value, in case a date was passed in
+            value_datetime = Transaction._meta.get_field(
+                "value_datetime"
+            ).get_prep_value(booking.transaction.value_datetime)
+            if value_datetime > summary.computed_at:
+                if summary.valid_until is None or value_datetime < summary.valid_until:
+                    summary.valid_until = value_datetime
+                    summary.save(update_fields=["valid_until"])
+                return
+
+            if booking.credit_account_id == fees_receivable_account.pk:
+                summary.fee_balance += booking.amount
+            elif booking.debit_account_id == fees_receivable_account.pk:
+                summary.fee_balance -= booking.amount
+            if is_donation:
+                summary.donation_balance += booking.amount
+            if is_fee and (
+                summary.last_fee_transaction is None
+                or value_datetime > summary.last_fee_transaction
+            ):
+                summary.last_fee_transaction = value_datetime
+            summary.save(
+                update_fields=[
+                    "fee_balance",
+                    "donation_balance",
+                    "last_fee_transaction",
+                ]
+            )
+
+
+@receiver(post_save, sender=Booking)
+def ledger_summary_booking_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw or not instance.member_id:
+        return
+    if created:
+        MemberLedgerSummary.apply_booking(instance)
+    else:
+        MemberLedgerSummary.refresh(instance.member_id)
+
+
+@receiver(post_delete, sender=Booking)
+def ledger_summary_booking_post_delete(sender, instance, **kwargs):
+    if instance.member_id:
+        MemberLedgerSummary.refresh(instance.member_id)
+
+
+@receiver(bookings_created, sender=Transaction)
+def ledger_summary_bookings_created(sender, bookings, **kwargs):
+    member_ids = {booking.member_id for booking in bookings if booking.member_id}
+    if member_ids:
+        MemberLedgerSummary.rebuild(member_ids)
+
+
+@receiver(post_init, sender=Transaction)
+def ledger_summary_transaction_post_init(sender, instance, **kwargs):
+    # Avoid loading deferred fields
+    instance._ledger_value_datetime = instance.__dict__.get("value_datetime")
+
+
+@receiver(post_save, sender=Transaction)
+def ledger_summary_transaction_post_save(
+    sender, instance, created, raw=False, **kwargs
+):
+    previous = getattr(instance, "_ledger_value_datetime", None)
+    instance._ledger_value_datetime = instance.value_datetime
+    if raw or created or previous == instance.value_datetime:
+        return
+    member_ids = set(
+        instance.bookings.exclude(member=None).values_list("member_id", flat=True)
+    )
+    for member_id in member_ids:
+        MemberLedgerSummary.refresh(member_id)
@@ -1,35 +1,109 @@
-from typing import Tuple
+import datetime
+from collections import namedtuple
+from decimal import Decimal
+from typing import List
 
 from dateutil.relativedelta import relativedelta
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils.timezone import localdate
 
+from byro.bookkeeping.models import Booking
+from byro.bookkeeping.special_accounts import SpecialAccounts
 from byro.members.models import Membership
 
+MonthStatistics = namedtuple(
+    "MonthStatistics", ("month", "joins", "quits", "members", "fee_income")
+)
+MonthStatistics.__doc__ = """Statistics for one month: ``month`` is its first
+day, ``members`` the number of memberships that started and did not end up to
+and including it, and
+``fee_income`` the net amount booked to the fees account."""
 
-def get_member_statistics_for_month(month, year) -> Tuple[int, int]:
-    joins = Membership.objects.filter(start__month=month, start__year=year).count()
-    quits = Membership.objects.filter(end__month=month, end__year=year).count()
-    return joins, quits
 
+def _as_date(value) -> datetime.date:
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
 
-def get_member_statistics():
-    """Returns a list of tuples of the form ((year, month), joins, quits)."""
-    first_member = Membership.objects.order_by("start").first()
-    if not first_member:
-        return []
 
-    date = first_member.start
-    end_member = Membership.objects.filter(end__isnull=False).order_by("-end").first()
-    if not end_member:
+def _membership_changes():
+    joins = (
+        Membership.objects.order_by()
+        .annotate(month=TruncMonth("start"))
+        .values("month")
+        .annotate(joins=Count("pk"), quits=Value(0))
+    )
+    quits = (
+        Membership.objects.order_by()
+        .filter(end__isnull=False)
+        .annotate(month=TruncMonth("end"))
+        .values("month")
+        .annotate(joins=Value(0), quits=Count("pk"))
+    )
+    result = {}
+    for row in joins.union(quits, all=True):
+        month = result.setdefault(_as_date(row["month"]), [0, 0])
+        month[0] += row["joins"]
+        month[1] += row["quits"]
+    return result
+
+
+def _fee_income():
+    fees = SpecialAccounts.fees
+    rows = (
+        Booking.objects.order_by()
+        .filter(Q(credit_account=fees) | Q(debit_account=fees))
+        .annotate(month=TruncMonth("transaction__value_datetime"))
+        .values("month")
+        .annotate(
+            income=Sum(
+                Case(
+                    When(credit_account=fees, then=F("amount")),
+                    default=-F("amount"),
+                )
+            )
+        )
+    )
+    return {_as_date(row["month"]): row["income"] for row in rows}
+
+
+def get_monthly_statistics() -> List[MonthStatistics]:
+    """Returns one MonthStatistics per month from the first membership start
+    up to the current month (or the last membership end, if that is later).
+
+    Not cached: memberships and bookings are also written in bulk, without
+    signals, and the two grouped queries are cheap."""
+    changes = _membership_changes()
+    if not changes:
         return []
-    end = end_member.end
-    result = []
+    income = _fee_income()
 
-    while date <= end:
+    month = min(changes)
+    last = max(max(changes), localdate().replace(day=1))
+    members = 0
+    result = []
+    while month <= last:
+        joins, quits = changes.get(month, (0, 0))
+        members += joins - quits
         result.append(
-            (
-                (date.year, date.month),
-                *get_member_statistics_for_month(date.month, date.year),
+            MonthStatistics(
+                month, joins, quits, members, income.get(month, Decimal("0.00"))
             )
         )
-        date += relativedelta(months=1)
+        month += relativedelta(months=1)
     return result
+
+
+def get_member_statistics():
+    """Returns a list of tuples of the form ((year, month), joins, quits)."""
+    statistics = get_monthly_statistics()
+    quits = [stat.month for stat in statistics if stat.quits]
+    if not quits:
+        return []
+    last = max(quits)
+    return [
+        ((stat.month.year, stat.month.month), stat.joins, stat.quits)
+        for stat in statistics
+        if stat.month <= last
+    ]
@@ -1,45 +1,71 @@
-from contextlib import suppress
-from datetime import datetime
-
-from django.utils.timezone import now
+"""The member timeline: mails, bookings, memberships, log entries and
+documents of a member, newest first.
+
+Each source yields its entries sorted by date with a fixed number of
+queries, and ``sorted_merge`` merges them.  Sources can be restricted to a
+date range, which is used to serve the timeline a page of months at a time
+(see ``get_timeline_page``).
+"""
+
+import heapq
+import mimetypes
+from datetime import datetime, time
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Max, Prefetch, Q
+from django.utils import timezone
 from more_itertools import peekable
 
-from byro.bookkeeping.models import Booking
+from byro.bookkeeping.models import Booking, Transaction
 from byro.bookkeeping.special_accounts import SpecialAccounts
 
+TIMELINE_PAGE_MONTHS = 1
+
 
 def _date_compare_key(d):
-    # Returns datetime as is, Converts date to datetime at end of day local timezone
+    # Returns datetime as is, Converts date to datetime at end of day in the
+    # default timezone
     if isinstance(d, datetime):
         return d
     else:
-        return now().replace(d.year, d.month, d.day, 23, 59, 59, 999999)
+        return timezone.make_aware(
+            datetime.combine(d, time.max), timezone.get_default_timezone()
+        )
+
+
+def _as_datetime(d):
+    """Midnight of the date ``d`` in the default timezone, as dates are
+    stored in DateTimeFields (see ``byro.members.liabilities``)."""
+    return timezone.make_aware(
+        datetime.combine(d, time.min), timezone.get_default_timezone()
+    )
+
+
+def _date_range(field, start=None, end=None, is_datetime=True):
+    """A filter for ``start`` <= ``field`` < ``end``, either bound may be
+    None.  ``start`` and ``end`` are dates."""
+    convert = _as_datetime if is_datetime else (lambda d: d)
+    query = Q()
+    if start:
+        query &= Q(**{f"{field}__gte": convert(start)})
+    if end:
+        query &= Q(**{f"{field}__lt": convert(end)})
+    return query
 
 
 def sorted_merge(*args):
-    initer = [iter(e) for e in args]
-    nextin = [None] * len(initer)
-
-    for i, e in enumerate(initer):
-        with suppress(StopIteration):
-            nextin[i] = next(e)
-
-    while any(e is not None for e in nextin):
-        available = [i for (i, e) in enumerate(nextin) if e is not None]
-        if len(available) > 1:
-            minindex = max(
-                *available, key=lambda a: _date_compare_key(nextin[a]["date"])
-            )
-        else:
-            minindex = available[0]
-        yield nextin[minindex]
-        nextin[minindex] = None
-        with suppress(StopIteration):
-            nextin[minindex] = next(initer[minindex])
+    """Merge iterables of timeline entries that are sorted newest first."""
+    return heapq.merge(
+        *args, key=lambda entry: _date_compare_key(entry["date"]), reverse=True
+    )
 
 
-def get_mail_timeline(member):
-    for instance in member.emails.filter(sent__isnull=False).order_by("-sent").all():
+def get_mail_timeline(member, start=None, end=None):
+    for instance in (
+        member.emails.filter(sent__isnull=False)
+        .filter(_date_range("sent", start, end))
+        .order_by("-sent")
+    ):
         yield {
             "type": "mail",
             "subtype": "mail-out",
@@ -49,43 +75,52 @@ def get_mail_timeline(member):
         }
 
 
-def get_base_finance_timeline(member):
+def get_base_finance_timeline(member, start=None, end=None):
+    fees_receivable_id = SpecialAccounts.fees_receivable.pk
+    fees_id = SpecialAccounts.fees.pk
     last_transaction_pk = None
     for instance in (
         Booking.objects.with_transaction_data()
+        .prefetch_related(
+            Prefetch(
+                "transaction__reversed_by",
+                queryset=Transaction.objects.order_by("pk"),
+                to_attr="cached_reversed_by",
+            )
+        )
         .filter(member=member, transaction__reverses__isnull=True)
+        .filter(_date_range("transaction__value_datetime", start, end))
         .order_by("-transaction__value_datetime", "-transaction__pk")
     ):
         if instance.transaction.pk == last_transaction_pk:
             continue
         last_transaction_pk = instance.transaction.pk
+        reversed_by = instance.transaction.cached_reversed_by
         base_data = {
             "type": "finance",
             "date": instance.transaction.value_datetime,
             "icon": "money",
             "instance": instance,
-            "deleted": instance.transaction.reversed_by.first(),
+            "deleted": reversed_by[0] if reversed_by else None,
         }
-        b = list(instance.transaction.bookings.all())
-        if any(
-            e.member == member and e.debit_account == SpecialAccounts.fees_receivable
-            for e in b
-        ) and any(
-            e.member == member and e.credit_account == SpecialAccounts.fees for e in b
+        b = [
+            e for e in instance.transaction.cached_bookings if e.member_id == member.pk
+        ]
+        if any(e.debit_account_id == fees_receivable_id for e in b) and any(
+            e.credit_account_id == fees_id for e in b
         ):
             yield dict(subtype="membership-due", value=instance.amount, **base_data)
-        elif any(
-            e.member == member and e.credit_account == SpecialAccounts.fees_receivable
-            for e in b
-        ):
+        elif any(e.credit_account_id == fees_receivable_id for e in b):
             yield dict(subtype="membership-paid", value=instance.amount, **base_data)
         else:
             yield dict(subtype="other-transaction", value=instance.amount, **base_data)
 
 
-def get_misc_finance_timeline(member):
-    for entry in member.log_entries().filter(
-        action_type__startswith="byro.members.finance."
+def get_misc_finance_timeline(member, start=None, end=None):
+    for entry in (
+        member.log_entries()
+        .filter(action_type__startswith="byro.members.finance.")
+        .filter(_date_range("datetime", start, end))
     ):
         base_data = {
             "type": "finance",
@@ -104,15 +139,18 @@ def get_misc_finance_timeline(member):
             yield dict(base_data, subtype="other")
 
 
-def get_finance_timeline(member):
+def get_finance_timeline(member, start=None, end=None):
     return sorted_merge(
-        get_base_finance_timeline(member), get_misc_finance_timeline(member)
+        get_base_finance_timeline(member, start, end),
+        get_misc_finance_timeline(member, start, end),
     )
 
 
-def get_misc_ops_timeline(member):
-    for entry in member.log_entries().exclude(
-        action_type__startswith="byro.members.finance."
+def get_misc_ops_timeline(member, start=None, end=None):
+    for entry in (
+        member.log_entries()
+        .exclude(action_type__startswith="byro.members.finance.")
+        .filter(_date_range("datetime", start, end))
     ):
         base_data = {
             "type": "ops",
@@ -130,31 +168,40 @@ def get_misc_ops_timeline(member):
             yield dict(base_data, subtype="other")
 
 
-def get_ops_timeline(member):
+def _in_range(d, start, end):
+    return (not start or d >= start) and (not end or d < end)
+
+
+def get_ops_timeline(member, start=None, end=None):
     membership_ops = []
     for membership in member.memberships.all():
         base_data = {"type": "ops", "icon": "user", "instance": membership}
-        if membership.start:
+        if membership.start and _in_range(membership.start, start, end):
             membership_ops.append(
                 dict(subtype="membership-begin", date=membership.start, **base_data)
             )
-        if membership.end:
+        if membership.end and _in_range(membership.end, start, end):
             membership_ops.append(
                 dict(subtype="membership-end", date=membership.end, **base_data)
             )
 
     return sorted_merge(
         sorted(membership_ops, reverse=True, key=lambda a: a["date"]),
-        get_misc_ops_timeline(member),
+        get_misc_ops_timeline(member, start, end),
     )
 
 
 def get_file_icon(document):
-    return {"application/pdf": "file-pdf-o"}.get(document.mime_type_guessed, "file-o")
+    # Guessed from the file name: the content is only sniffed when the
+    # document itself is shown
+    mime_type, _encoding = mimetypes.guess_type(document.document.name or "")
+    return {"application/pdf": "file-pdf-o"}.get(mime_type, "file-o")
 
 
-def get_document_timeline(member):
-    for document in member.documents.order_by("-date", "-id").all():
+def get_document_timeline(member, start=None, end=None):
+    for document in member.documents.filter(
+        _date_range("date", start, end, is_datetime=False)
+    ).order_by("-date", "-id"):
         base_data = {
             "type": "document",
             "icon": get_file_icon(document),
@@ -167,6 +214,72 @@ def get_document_timeline(member):
             yield dict(base_data, subtype="misc_document")
 
 
+def get_timeline(member, start=None, end=None):
+    """All timeline entries of ``member`` with ``start`` <= date < ``end``."""
+    return sorted_merge(
+        get_finance_timeline(member, start, end),
+        get_mail_timeline(member, start, end),
+        get_ops_timeline(member, start, end),
+        get_document_timeline(member, start, end),
+    )
+
+
+def get_latest_timeline_date(member, before=None):
+    """The date of the newest timeline entry before ``before``, or None."""
+    dates = [
+        Booking.objects.filter(member=member, transaction__reverses__isnull=True)
+        .filter(_date_range("transaction__value_datetime", end=before))
+        .aggregate(latest=Max("transaction__value_datetime"))["latest"],
+        member.emails.filter(_date_range("sent", end=before)).aggregate(
+            latest=Max("sent")
+        )["latest"],
+        member.log_entries()
+        .filter(_date_range("datetime", end=before))
+        .aggregate(latest=Max("datetime"))["latest"],
+        member.documents.filter(
+            _date_range("date", end=before, is_datetime=False)
+        ).aggregate(latest=Max("date"))["latest"],
+        *member.memberships.aggregate(
+            start=Max(
+                "start", filter=_date_range("start", end=before, is_datetime=False)
+            ),
+            end=Max("end", filter=_date_range("end", end=before, is_datetime=False)),
+        ).values(),
+    ]
+    dates = [d for d in dates if d]
+    if not dates:
+        return None
+    return _as_date(max(dates, key=_date_compare_key))
+
+
+def _as_date(d):
+    if isinstance(d, datetime):
+        return timezone.localtime(d, timezone.get_default_timezone()).date()
+    return d
+
+
+def get_timeline_page(member, before=None, months=TIMELINE_PAGE_MONTHS):
+    """The timeline entries of the newest ``months`` months with entries
+    before ``before`` (a date).  The first page (without ``before``) ends
+    with the current month, and also has all entries after it (like dues
+    that are planned in advance).
+
+    Returns the entries and the ``before`` date of the next (older) page, or
+    None if there are no older entries."""
+    latest = get_latest_timeline_date(member, before)
+    if latest is None:
+        return [], None
+    if before is None:
+        latest = min(
+            latest, timezone.localdate(timezone=timezone.get_default_timezone())
+        )
+    start = latest.replace(day=1) - relativedelta(months=months - 1)
+    entries = list(get_timeline(member, start, before))
+    if get_latest_timeline_date(member, start) is None:
+        return entries, None
+    return entries, start
+
+
 def add_dummy_entries(entries):
     entries = peekable(entries)
     prev_entry = next(entries)
@@ -4,6 +4,7 @@ from .views import (
     accounts,
     dashboard,
     documents,
+    jobs,
     mails,
     members,
     settings,
@@ -39,6 +40,8 @@ urlpatterns = [
     ),
     path("settings", settings.ConfigurationView.as_view(), name="settings.base"),
     path("", dashboard.DashboardView.as_view(), name="dashboard"),
+    path("jobs/<int:pk>/", jobs.JobDetailView.as_view(), name="jobs.detail"),
+    path("jobs/<int:pk>/status", jobs.JobStatusView.as_view(), name="jobs.status"),
     path(
         "members/typeahead",
         members.MemberListTypeaheadView.as_view(),
@@ -76,6 +79,11 @@ urlpatterns = [
                     members.MemberTimelineView.as_view(),
                     name="members.timeline",
                 ),
+                path(
+                    "timeline/page",
+                    members.MemberTimelinePageView.as_view(),
+                    name="members.timeline.page",
+                ),
                 path(
                     "finance",
                     members.MemberFinanceView.as_view(),
@@ -137,6 +145,11 @@ urlpatterns = [
         name="documents.detail",
     ),
     path("accounts/", accounts.AccountListView.as_view(), name="finance.accounts.list"),
+    path(
+        "accounts/trial-balance",
+        accounts.TrialBalanceExportView.as_view(),
+        name="finance.accounts.trial_balance",
+    ),
     path(
         "accounts/add",
         accounts.AccountCreateView.as_view(),
@@ -1,13 +1,19 @@
+import csv
+from contextlib import suppress
+from datetime import datetime, time
+
 from django import forms
 from django.contrib import messages
-from django.db import models
+from django.http import HttpResponse
 from django.shortcuts import redirect
 from django.urls import reverse
-from django.utils.timezone import now
+from django.utils.timezone import make_aware, now
 from django.utils.translation import gettext_lazy as _
-from django.views.generic import DetailView, FormView, ListView
+from django.views.generic import DetailView, FormView, ListView, View
 
+from byro.bookkeeping.balances import get_trial_balance
 from byro.bookkeeping.models import Account, AccountCategory, Transaction
+from byro.office.views.members import csv_excel_de, filter_excel_de
 
 FORM_CLASS = forms.modelform_factory(Account, fields=["name", "account_category"])
 
@@ -26,6 +32,56 @@ class AccountListView(ListView):
     context_object_name = "accounts"
     model = Account
 
+    def get_context_data(self, *args, **kwargs):
+        context = super().get_context_data(*args, **kwargs)
+        context["trial_balance"] = get_trial_balance()
+        return context
+
+
+class TrialBalanceExportView(View):
+    """The balances of all accounts as CSV, optionally ``as_of`` the end of a
+    day (YYYY-MM-DD)."""
+
+    def get_as_of(self):
+        with suppress(KeyError, ValueError):
+            day = datetime.strptime(self.request.GET["as_of"], "%Y-%m-%d").date()
+            return make_aware(datetime.combine(day, time.max))
+
+    def get(self, request, *args, **kwargs):
+        as_of = self.get_as_of()
+        csv_format = request.GET.get("format", "csv")
+        converter = filter_excel_de if csv_format == "csv_de" else str
+        response = HttpResponse(content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = (
+            f'attachment; filename="trial_balance_{(as_of or now()).date()}.csv"'
+        )
+        response.write("\ufeff")
+        writer = csv.writer(
+            response, dialect=csv_excel_de if csv_format == "csv_de" else "excel"
+        )
+        writer.writerow(
+            [
+                _("Account"),
+                _("Type"),
+                _("Debit"),
+                _("Credit"),
+                _("Balance"),
+                _("Unbalanced transactions"),
+            ]
+        )
+        for balance in get_trial_balance(as_of=as_of):
+            writer.writerow(
+                [
+                    str(balance.account),
+                    balance.account.get_account_category_display(),
+                    converter(balance.debit),
+                    converter(balance.credit),
+                    converter(balance.net),
+                    balance.unbalanced,
+                ]
+            )
+        return response
+
 
 class AccountCreateView(FormView):
     template_name = "office/account/add.html"
@@ -61,9 +117,7 @@ class AccountDetailView(ListView):
     def get_queryset(self):
         qs = self.get_object().bookings_with_transaction_data
         if self.request.GET.get("filter") == "unbalanced":
-            qs = qs.exclude(
-                transaction_balances_debit=models.F("transaction_balances_credit")
-            )
+            qs = qs.filter(transaction__is_balanced=False)
         qs = qs.filter(transaction__value_datetime__lte=now()).order_by(
             "-transaction__value_datetime"
         )
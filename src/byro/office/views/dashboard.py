@@ -1,7 +1,7 @@
 from django.views.generic import TemplateView
 
 from byro.members.models import Member
-from byro.members.stats import get_member_statistics
+from byro.members.stats import get_member_statistics, get_monthly_statistics
 
 
 class DashboardView(TemplateView):
@@ -12,4 +12,5 @@ class DashboardView(TemplateView):
         context["member_count"] = Member.objects.all().count()
         context["active_count"] = Member.objects.with_active_membership().count()
         context["stats"] = get_member_statistics()
+        context["monthly_stats"] = get_monthly_statistics()[-12:]
         return context
@@ -0,0 +1,17 @@
+from django.http import JsonResponse
+from django.views.generic import DetailView
+
+from byro.common.models import Job
+
+
+class JobDetailView(DetailView):
+    template_name = "office/job/detail.html"
+    context_object_name = "job"
+    model = Job
+
+
+class JobStatusView(DetailView):
+    model = Job
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(self.get_object().get_status())
@@ -2,18 +2,18 @@ import collections
 import collections.abc
 import csv
 import hashlib
+from contextlib import suppress
 from datetime import datetime, time
 from decimal import Decimal
 from functools import partial
 from itertools import chain
 
-import dateparser
 import unicodecsv
 from chardet import UniversalDetector
 from dateutil.relativedelta import relativedelta
 from django import forms
-from django.conf import settings
 from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.db.models import Q
 from django.dispatch import receiver
@@ -30,9 +30,12 @@ from django.views.generic.list import (
 
 from byro.bookkeeping.models import Booking
 from byro.bookkeeping.special_accounts import SpecialAccounts
-from byro.common.models import Configuration, LogEntry
+from byro.common.models import Configuration, Job, LogEntry, resolve_log_objects
 from byro.mails.models import EMail
+from byro.members.export import iter_member_rows
 from byro.members.forms import CreateMemberForm
+from byro.members.importer import plan_member_import
+from byro.members.liabilities import update_all_liabilities
 from byro.members.models import Member, Membership
 from byro.members.signals import (
     leave_member,
@@ -43,14 +46,7 @@ from byro.members.signals import (
     new_member_office_mail_information,
     update_member,
 )
-from byro.members.timeline import (
-    augment_timeline,
-    get_document_timeline,
-    get_finance_timeline,
-    get_mail_timeline,
-    get_ops_timeline,
-    sorted_merge,
-)
+from byro.members.timeline import augment_timeline, get_timeline_page
 from byro.office.signals import (
     member_dashboard_tile,
     member_list_importers,
@@ -96,7 +92,7 @@ class MemberListMixin:
         if _filter == "all":
             pass
         elif _filter == "negbalance":
-            return [m for m in qs.order_by("-id").distinct() if m.balance < 0]
+            qs = qs.with_balance().filter(annotated_balance__lt=0)
         elif _filter == "inactive":
             qs = qs.filter(inactive_q)
         else:  # Default to 'active'
@@ -110,15 +106,35 @@ class MemberListView(MemberListMixin, ListView):
     model = Member
     paginate_by = 50
 
+    ORDERINGS = {
+        "balance": ("annotated_balance", "-id"),
+        "-balance": ("-annotated_balance", "-id"),
+    }
+
     def get_queryset(self):
         search = self.request.GET.get("q")
         _filter = self.request.GET.get("filter", "active")
-        return self.get_members_queryset(search, _filter)
+        qs = self.get_members_queryset(search, _filter).with_balance()
+        ordering = self.ORDERINGS.get(self.request.GET.get("sort"))
+        if ordering:
+            qs = qs.order_by(*ordering)
+        return qs
 
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
-        for member in Member.objects.all():
-            member.update_liabilites()
-        return redirect(request.path)
+        job = Job.objects.create(
+            runner="byro.office.views.members.run_update_liabilities_job",
+            user=request.user,
+        )
+        job.start()
+        messages.success(
+            request, _("The liabilities of all members are being updated.")
+        )
+        return redirect(job.get_absolute_url())
+
+
+def run_update_liabilities_job(job):
+    return update_all_liabilities(progress=job.progress)
 
 
 class MemberDisclosureView(MemberListMixin, TemplateView):
@@ -132,7 +148,7 @@ class MemberDisclosureView(MemberListMixin, TemplateView):
         return context
 
     def post(self, request, *args, **kwargs):
-        members = self.get_members_queryset()
+        members = self.get_members_queryset().with_balance()
         for member in members:
             member.record_disclosure_email.save()
         messages.success(
@@ -317,12 +333,7 @@ class MemberListExportView(
             ]
         )
         data = self.get_data(
-            form,
-            [
-                (f.field_id, f.getter)
-                for f in fields.values()
-                if f.field_id in selected_fields
-            ],
+            form, [f for f in fields.values() if f.field_id in selected_fields]
         )
 
         LogEntry.objects.create(
@@ -381,10 +392,9 @@ class MemberListExportView(
         )
         return response
 
-    def get_data(self, form, field_mapping):
+    def get_data(self, form, fields):
         qs = self.get_members_queryset(_filter=form.cleaned_data["member_filter"])
-        for m in qs.all():
-            yield {f_id: f_getter(m) for (f_id, f_getter) in field_mapping}
+        return iter_member_rows(qs, fields)
 
 
 def get_member_list_importers():
@@ -398,6 +408,11 @@ class MemberListImportForm(forms.Form):
         )
     )
     upload_file = forms.FileField()
+    dry_run = forms.BooleanField(
+        required=False,
+        label=_("Dry run"),
+        help_text=_("Only show the planned changes, do not import anything."),
+    )
 
 
 class MemberListImportView(FormView):
@@ -430,6 +445,7 @@ class MemberListImportView(FormView):
             data={
                 "importer": form.cleaned_data["importer"],
                 "sha256": sha256sum.hexdigest(),
+                "dry_run": form.cleaned_data.get("dry_run", False),
             },
         )
 
@@ -446,135 +462,54 @@ def get_encoding(form):
     return detector.result["encoding"]
 
 
-def create_membership(membership_parms, member):
-    if membership_parms:
-        for k in "start", "end":
-            #  FIXME Also, we should find a way to handle dates in a generic way
-            if membership_parms.get(k, None):
-                membership_parms[k] = dateparser.parse(
-                    membership_parms[k], languages=[settings.LANGUAGE_CODE, "en"]
-                )
-        Membership.objects.create(member=member, **membership_parms)
+def plan_csv_import(fp, encoding, dialect):
+    instream = unicodecsv.DictReader(fp, dialect=dialect, encoding=encoding)
+    plan = plan_member_import(instream, decimal_comma=dialect == csv_excel_de)
+    errors = [
+        (
+            error
+            if line is None
+            else _("Line {line}: {error}").format(line=line, error=error)
+        )
+        for line, error in plan.errors
+    ]
+    return plan, errors
 
 
-@transaction.atomic  # noqa
+@transaction.atomic
 def default_csv_form_valid(view, form, dialect="excel"):
-    mapping = None
-    fields = Member.get_fields()
     encoding = get_encoding(form)
 
-    with form.cleaned_data["upload_file"].open() as fp:
-        instream = unicodecsv.DictReader(fp, dialect=dialect, encoding=encoding)
-
-        for indict in instream:
-            if mapping is None:
-                mapping = {}
-                for k in indict.keys():
-                    if not k.strip():
-                        continue
-                    for field in fields.values():
-                        if str(field.name).strip() == k.strip():
-                            mapping[k.strip()] = field
-                            break
-                    else:
-                        messages.error(
-                            view.request,
-                            _("Couldn't map input column '{}' to field").format(
-                                k.strip()
-                            ),
-                        )
-                        return redirect(view.request.get_full_path())
-
-            do_update = False
-            have_changes = False
-            create_initial_balance = False
-            initial_balance = None
-            initial_balance_timestamp = None
-            for verb_name, field in mapping.items():
-                if field.field_id == "_internal_id":
-                    member = Member.all_objects.filter(
-                        pk=indict[verb_name.strip()]
-                    ).first()
-                    if member:
-                        do_update = True
-                        del indict[verb_name]
-
-            if not do_update:
-                member = Member.objects.create()
-
-            membership_parms = {}
-            for k, v in indict.items():
-                if k.strip() not in mapping:
-                    continue
-                field = mapping[k.strip()]
-                #  FIXME We're special casing the Membership here, but really Field.setter should handle that
-                #  (In the case of 'member.memberships.last()' for the getter it should create a new Membership
-                #  if no Membership exists.)
-                if field.field_id.startswith("membership__"):
-                    if v:
-                        membership_parms[field.field_id.split("__", 1)[1]] = v
-                else:
-                    if do_update:
-                        old_v = field.getter(member)
-                        if old_v != v and not (old_v is None and not v):
-                            field.setter(member, v)
-                            have_changes = True
-                    else:
-                        if field.field_id == "_internal_balance":
-                            if dialect == csv_excel_de:
-                                v = v.replace(".", "").replace(",", ".")
-                            initial_balance = Decimal(v)
-                            if initial_balance != 0:
-                                create_initial_balance = True
-                        elif field.field_id == "_internal_last_transaction":
-                            if v != "" and v is not None:
-                                initial_balance_timestamp = dateparser.parse(
-                                    v, languages=[settings.LANGUAGE_CODE, "en"]
-                                )
-                                create_initial_balance = True
-                        else:
-                            field.setter(member, v)
-
-            if do_update:
-                if have_changes:
-                    member.log(view, ".updated")
-                    member.save()
-            else:
-                if create_initial_balance and not initial_balance_timestamp:
-                    messages.error(
-                        view.request,
-                        _(
-                            "Either both or none columns has to be given: '{}' and '{}'"
-                        ).format(
-                            fields["_internal_balance"].name,
-                            fields["_internal_last_transaction"].name,
-                        ),
-                    )
-                    return redirect(view.request.get_full_path())
-
-                member.log(view, ".created")
-                member.save()
-
-                # FIXME Changing membership when do_update is not implemented
-                if membership_parms:
-                    create_membership(membership_parms, member)
-
-                if create_initial_balance:
-                    balance_changed = member.adjust_balance(
-                        view,
-                        "Initial Balance created by CSV Import",
-                        initial_balance,
-                        SpecialAccounts.fees_receivable,
-                        SpecialAccounts.opening_balance,
-                        initial_balance_timestamp,
-                    )
+    if form.cleaned_data.get("dry_run"):
+        with form.cleaned_data["upload_file"].open() as fp:
+            plan, errors = plan_csv_import(fp, encoding, dialect)
+        if errors:
+            for error in errors:
+                messages.error(view.request, error)
+            return redirect(view.request.get_full_path())
+        return view.render_to_response(view.get_context_data(form=form, report=plan))
+
+    job = Job.objects.create(
+        runner="byro.office.views.members.run_csv_import_job",
+        user=view.request.user,
+        upload=form.cleaned_data["upload_file"],
+        data={
+            "encoding": encoding,
+            "dialect": "csv_de" if dialect == csv_excel_de else "excel",
+        },
+    )
+    job.start()
+    return redirect(job.get_absolute_url())
 
-                    if balance_changed:
-                        member.log(
-                            view, ".finance.initial_balance", balance=member.balance
-                        )
 
-    return redirect(reverse("office:members.list"))
+def run_csv_import_job(job):
+    dialect = csv_excel_de if job.data["dialect"] == "csv_de" else "excel"
+    with job.upload.open("rb") as fp:
+        plan, errors = plan_csv_import(fp, job.data["encoding"], dialect)
+    if errors:
+        raise ValidationError(errors)
+    job.progress(0, total=len(plan.created) + len(plan.updated))
+    return plan.apply(job.log_context, progress=job.progress)
 
 
 @receiver(member_list_importers)
@@ -1206,7 +1141,13 @@ class MemberLogView(MemberView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        ctx["log_entries"] = self.get_member().log_entries()
+        ctx["log_entries"] = list(
+            self.get_member()
+            .log_entries()
+            .select_related("user", "content_type")
+            .prefetch_related("content_object")
+        )
+        resolve_log_objects(ctx["log_entries"])
         return ctx
 
 
@@ -1215,21 +1156,24 @@ class MemberMailsView(MemberView):
 
 
 class MemberTimelineView(MemberView):
+    """Shows the newest month of the timeline, older months are loaded from
+    ``MemberTimelinePageView`` while scrolling."""
+
     template_name = "office/member/timeline.html"
 
+    def get_before(self):
+        with suppress(KeyError, ValueError):
+            return datetime.strptime(self.request.GET["before"], "%Y-%m-%d").date()
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        ctx["timeline"] = self.get_timeline()
+        ctx["timeline_before"] = self.get_before()
+        entries, ctx["timeline_next"] = get_timeline_page(
+            self.get_member(), before=ctx["timeline_before"]
+        )
+        ctx["timeline"] = augment_timeline(entries) if entries else []
         return ctx
 
-    def get_timeline(self):
-        member = self.get_member()
-
-        entries = sorted_merge(
-            get_finance_timeline(member),
-            get_mail_timeline(member),
-            get_ops_timeline(member),
-            get_document_timeline(member),
-        )
 
-        return augment_timeline(entries)
+class MemberTimelinePageView(MemberTimelineView):
+    template_name = "office/member/timeline_page.html"
@@ -8,7 +8,7 @@ from django.views.generic import FormView, ListView, TemplateView
 
 from byro.bookkeeping.models import Account
 from byro.common.forms import ConfigurationForm, InitialForm, RegistrationConfigForm
-from byro.common.models import LogEntry
+from byro.common.models import LogEntry, resolve_log_objects
 from byro.common.models.configuration import ByroConfiguration, Configuration
 
 
@@ -139,3 +139,16 @@ class LogView(ListView):
     context_object_name = "log_entries"
     model = LogEntry
     paginate_by = 50
+
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .select_related("user", "content_type")
+            .prefetch_related("content_object")
+        )
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        resolve_log_objects(ctx["log_entries"])
+        return ctx
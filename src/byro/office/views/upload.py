@@ -1,10 +1,28 @@
 from django import forms
 from django.contrib import messages
+from django.db import transaction
 from django.shortcuts import redirect
 from django.utils.translation import gettext_lazy as _
 from django.views.generic import DetailView, FormView, ListView
 
 from byro.bookkeeping.models import RealTransactionSource
+from byro.common.models import Job
+
+
+def run_upload_job(job):
+    source = RealTransactionSource.objects.get(pk=job.data["source"])
+    source.process(progress=job.progress)
+    return {"transactions": source.transactions.count()}
+
+
+def start_upload_job(request, source):
+    job = Job.objects.create(
+        runner="byro.office.views.upload.run_upload_job",
+        user=request.user,
+        data={"source": source.pk},
+    )
+    job.start()
+    return job
 
 
 class UploadForm(forms.ModelForm):
@@ -24,37 +42,26 @@ class CsvUploadView(FormView):
     model = RealTransactionSource
     form_class = UploadForm
 
+    @transaction.atomic
     def form_valid(self, form):
         form.save()
-        try:
-            form.instance.process()
-            messages.success(self.request, _("The upload was processed successfully."))
-        except Exception as e:
-            messages.error(
-                self.request,
-                _("The upload was added successfully, but could not be processed: ")
-                + str(e),
-            )
-        self.form = form
+        self.job = start_upload_job(self.request, form.instance)
+        messages.success(
+            self.request, _("The upload was added and is being processed.")
+        )
         return super().form_valid(form)
 
     def get_success_url(self):
-        return self.request.path
+        return self.job.get_absolute_url()
 
 
 class UploadProcessView(DetailView):
     model = RealTransactionSource
 
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
-        obj = self.get_object()
-        try:
-            obj.process()
-            messages.success(self.request, _("The upload was processed successfully."))
-        except Exception as e:
-            messages.error(
-                self.request, _("The upload could not be processed: ") + str(e)
-            )
-        return redirect("office:finance.uploads.list")
+        job = start_upload_job(request, self.get_object())
+        return redirect(job.get_absolute_url())
 
 
 class UploadMatchView(DetailView):
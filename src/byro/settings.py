@@ -205,6 +205,12 @@ else:
     EMAIL_USE_SSL = config.getboolean("mail", "ssl")
 
 
+## TASK SETTINGS
+CELERY_BROKER_URL = config.get("celery", "broker", fallback="")
+CELERY_RESULT_BACKEND = config.get("celery", "backend", fallback="") or None
+HAS_CELERY = bool(CELERY_BROKER_URL)
+
+
 ## I18N SETTINGS
 USE_I18N = True
 USE_TZ = True
@@ -255,6 +261,7 @@ MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "byro.common.middleware.ConfigurationMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
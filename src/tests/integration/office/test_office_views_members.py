@@ -1,9 +1,15 @@
+import os
+
 import pytest
 from dateutil.relativedelta import relativedelta
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.timezone import now
 
+from byro.bookkeeping.models import Account
+from byro.common.models import Job, JobState
 from byro.members.models import Member
 
 pytestmark = pytest.mark.usefixtures("configuration")
@@ -47,6 +53,18 @@ def test_all_members_list(member, membership, inactive_member, logged_in_client)
     assert inactive_member.name in content
 
 
+@pytest.mark.django_db
+def test_negbalance_members_list(member, membership, inactive_member, logged_in_client):
+    inactive_member.update_liabilites()
+    response = logged_in_client.get(
+        reverse("office:members.list") + "?filter=negbalance&sort=balance"
+    )
+    content = response.content.decode()
+    assert response.status_code == 200, content
+    assert member.name not in content
+    assert inactive_member.name in content
+
+
 @pytest.mark.django_db
 def test_member_view(member, membership, logged_in_client):
     response = logged_in_client.get(
@@ -177,7 +195,159 @@ def test_member_download_and_edit(member, membership, logged_in_client):
     )
 
     assert new_response.status_code == 302
+    job = Job.objects.get()
+    assert new_response["Location"] == job.get_absolute_url()
+    upload = job.upload.path
+    job.run()
+    assert job.state == JobState.FINISHED, job.errors
+    assert job.result == {"created": 0, "updated": 1}
+    # The uploaded member data is deleted with the job done
+    assert not Job.objects.get().upload
+    assert not os.path.exists(upload)
 
     new_member = Member.objects.filter(pk=member.pk).first()
     assert new_member.name == "Fnord!"
     assert new_member.profile_sepa.iban == "DE11520513735120710131"
+
+
+@pytest.mark.django_db
+def test_members_list_update_liabilities_job(member, membership, logged_in_client):
+    response = logged_in_client.post(reverse("office:members.list"))
+    assert response.status_code == 302
+    job = Job.objects.get()
+    assert response["Location"] == job.get_absolute_url()
+    assert member.balance == 0
+
+    job.run()
+    assert job.state == JobState.FINISHED, job.errors
+    assert job.result["members"] == 1
+    assert job.processed == job.total == 1
+    assert member.balance == -40
+
+
+@pytest.mark.django_db
+def test_member_import_dry_run(member, logged_in_client):
+    body = f"Internal database ID,Name\r\n{member.pk},Fnord!\r\n,New\r\n".encode()
+    response = logged_in_client.post(
+        reverse("office:members.list.import"),
+        {
+            "importer": "byro.office.members.import.default_csv",
+            "upload_file": SimpleUploadedFile(
+                "members.csv", body, content_type="text/csv"
+            ),
+            "dry_run": "on",
+        },
+    )
+    content = response.content.decode()
+    assert response.status_code == 200, content
+    assert "Fnord!" in content
+    assert Member.all_objects.count() == 1
+    member.refresh_from_db()
+    assert member.name != "Fnord!"
+
+
+@pytest.mark.django_db
+def test_member_import_job_status(logged_in_client):
+    response = logged_in_client.post(
+        reverse("office:members.list.import"),
+        {
+            "importer": "byro.office.members.import.default_csv",
+            "upload_file": SimpleUploadedFile(
+                "members.csv", b"Unknown column\r\nx\r\n", content_type="text/csv"
+            ),
+        },
+    )
+    assert response.status_code == 302
+    job = Job.objects.get()
+    status = logged_in_client.get(reverse("office:jobs.status", kwargs={"pk": job.pk}))
+    assert status.json()["state"] == JobState.QUEUED
+
+    job.run()
+    status = logged_in_client.get(reverse("office:jobs.status", kwargs={"pk": job.pk}))
+    assert status.json()["state"] == JobState.FAILED
+    assert not Job.objects.get().upload
+    assert status.json()["errors"] == [
+        "Couldn't map input column 'Unknown column' to field"
+    ]
+    response = logged_in_client.get(job.get_absolute_url())
+    assert "Unknown column" in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_member_timeline(inactive_member, logged_in_client):
+    inactive_member.log("test", ".updated")
+    response = logged_in_client.get(
+        reverse("office:members.timeline", kwargs={"pk": inactive_member.pk})
+    )
+    content = response.content.decode()
+    assert response.status_code == 200, content
+    assert "Membership entry changed" in content
+    assert "Membership end" not in content
+    assert response.context["timeline_next"] == now().date().replace(day=1)
+
+    response = logged_in_client.get(
+        reverse("office:members.timeline.page", kwargs={"pk": inactive_member.pk}),
+        {"before": str(response.context["timeline_next"])},
+    )
+    content = response.content.decode()
+    assert response.status_code == 200, content
+    assert "Membership end" in content
+    assert "<html" not in content
+    assert "tl-load-more" in content
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "url_name,kwargs",
+    (("office:settings.log", False), ("office:members.log", True)),
+)
+def test_log_view_queries(member, logged_in_client, url_name, kwargs):
+    url = reverse(url_name, kwargs={"pk": member.pk} if kwargs else None)
+
+    def count_queries():
+        with CaptureQueriesContext(connection) as queries:
+            response = logged_in_client.get(url)
+        assert response.status_code == 200
+        return len(queries)
+
+    member.log("test", ".updated", member=member)
+    count_queries()  # Warm up the per-process caches
+    before = count_queries()
+    for _i in range(10):
+        member.log("test", ".updated", member=member)
+    assert count_queries() == before
+
+
+@pytest.mark.django_db
+def test_trial_balance_export(logged_in_client, member):
+    response = logged_in_client.get(reverse("office:finance.accounts.list"))
+    assert response.status_code == 200
+    assert len(response.context["trial_balance"]) == len(response.context["accounts"])
+
+    response = logged_in_client.get(
+        reverse("office:finance.accounts.trial_balance"), {"format": "csv_de"}
+    )
+    assert response.status_code == 200
+    lines = response.content.decode().lstrip("﻿").splitlines()
+    assert lines[0] == "Account;Type;Debit;Credit;Balance;Unbalanced transactions"
+    assert len(lines) == Account.objects.count() + 1
+
+
+@pytest.mark.django_db
+def test_abandoned_jobs_fail(user):
+    from byro.common.signals import periodic_task
+
+    running = Job.objects.create(runner="x", user=user, state=JobState.RUNNING)
+    queued = Job.objects.create(runner="x", user=user)
+    Job.objects.filter(pk=running.pk).update(heartbeat=now() - relativedelta(hours=2))
+
+    periodic_task.send(None)
+    running.refresh_from_db()
+    queued.refresh_from_db()
+    assert running.state == JobState.FAILED
+    assert running.errors == ["The job was abandoned."]
+    assert queued.state == JobState.QUEUED
+
+    # A failed job that is picked up later is not run any more
+    running.run()
+    assert running.state == JobState.FAILED
@@ -1,5 +1,8 @@
 import pytest
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
 from django.db.models import Q
+from django.utils.timezone import now
 from helper import TestMigrations
 
 
@@ -116,3 +119,35 @@ class TestBookkeepingMigrationsFinal(TestWithShackdataBase):
             ).count()
             == 0
         )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_booking_debit_xor_credit_migration_names_invalid_bookings():
+    before = [("bookkeeping", "0019_transaction_totals")]
+    after = [("bookkeeping", "0020_booking_debit_xor_credit")]
+    executor = MigrationExecutor(connection)
+    executor.migrate(before)
+    old_apps = executor.loader.project_state(before).apps
+    Account = old_apps.get_model("bookkeeping", "Account")
+    Transaction = old_apps.get_model("bookkeeping", "Transaction")
+    Booking = old_apps.get_model("bookkeeping", "Booking")
+    account = Account.objects.create(account_category="asset")
+    t = Transaction.objects.create(value_datetime=now())
+    both = Booking.objects.create(
+        transaction=t, amount=1, debit_account=account, credit_account=account
+    )
+    neither = Booking.objects.create(transaction=t, amount=1)
+
+    try:
+        executor = MigrationExecutor(connection)
+        with pytest.raises(
+            Exception, match=rf"{both.pk} \({t.pk}\), {neither.pk} \({t.pk}\)"
+        ):
+            executor.migrate(after)
+        Booking.objects.filter(pk=both.pk).update(credit_account=None)
+        Booking.objects.filter(pk=neither.pk).update(credit_account=account)
+        executor = MigrationExecutor(connection)
+        executor.migrate(after)
+    finally:
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
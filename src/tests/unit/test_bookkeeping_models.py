@@ -1,16 +1,25 @@
 from contextlib import suppress
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
 import pytest
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, transaction
 from django.utils.timezone import now
 
+from byro.bookkeeping.balances import get_trial_balance
 from byro.bookkeeping.models import (
     Account,
     AccountCategory,
     AccountTag,
     Booking,
+    ClosedPeriod,
     Transaction,
 )
 from byro.bookkeeping.special_accounts import SpecialAccounts
+from byro.common.models import LogEntry
+from byro.members.models import Member, MemberLedgerSummary
 
 
 @pytest.mark.django_db
@@ -56,6 +65,34 @@ def test_special_accounts():
     assert bank in Account.objects.filter(tags__name="bank").all()
 
 
+@pytest.mark.django_db
+def test_special_accounts_cache(
+    django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    from byro.bookkeeping.special_accounts import invalidate_special_accounts
+
+    try:
+        with django_capture_on_commit_callbacks(execute=True):
+            fees = SpecialAccounts.fees
+        with django_assert_num_queries(0):
+            assert SpecialAccounts.fees is fees
+        # Saving an account drops the cache
+        fees.name = "Renamed fees"
+        fees.save()
+        with django_assert_num_queries(1):
+            assert SpecialAccounts.fees.name == "Renamed fees"
+
+        other = Account.objects.create(
+            account_category=AccountCategory.INCOME, name="Other fees"
+        )
+        fees.tags.clear()
+        other.tags.add(AccountTag.objects.get(name="fees"))
+        with django_assert_num_queries(1):
+            assert SpecialAccounts.fees == other
+    finally:
+        invalidate_special_accounts()
+
+
 @pytest.mark.django_db
 def test_transaction_balances(receivable_account, income_account):
     t = Transaction.objects.create(
@@ -69,6 +106,139 @@ def test_transaction_balances(receivable_account, income_account):
     assert t.is_balanced
 
 
+@pytest.mark.django_db
+def test_transaction_stored_balances(bank_account, receivable_account):
+    t = Transaction.objects.create(value_datetime=now(), user_or_context="test")
+    t.debit(account=bank_account, amount=10, user_or_context="test")
+    assert (t.debit_total, t.credit_total, t.is_balanced) == (10, 0, False)
+    stale = Transaction.objects.get(pk=t.pk)
+    credit = Booking.objects.create(
+        transaction_id=t.pk, credit_account=receivable_account, amount=10
+    )
+    stale.memo = "Changed"
+    stale.save()
+
+    t = Transaction.objects.get(pk=t.pk)
+    assert (t.debit_total, t.credit_total, t.is_balanced) == (10, 10, True)
+    assert t.memo == "Changed"
+    assert t not in Transaction.objects.unbalanced_transactions()
+
+    credit.delete()
+    assert Transaction.objects.unbalanced_transactions().get() == t
+    Transaction.objects.filter(pk=t.pk).update(is_balanced=True, debit_total=0)
+    Transaction.objects.update_balances()
+    t = Transaction.objects.get(pk=t.pk)
+    assert (t.debit_total, t.credit_total, t.is_balanced) == (10, 0, False)
+    assert bank_account.unbalanced_transactions.get() == t
+
+
+@pytest.mark.django_db
+def test_bulk_create_balanced(
+    bank_account, receivable_account, income_account, django_assert_max_num_queries
+):
+    # Including the check for a closed period
+    with django_assert_max_num_queries(9):
+        transactions = Transaction.objects.bulk_create_balanced(
+            [
+                {
+                    "value_datetime": now(),
+                    "memo": f"Fee {i}",
+                    "bookings": [
+                        {"debit_account": bank_account, "amount": 9.95},
+                        {"credit_account": income_account, "amount": 5},
+                        {"credit_account": receivable_account, "amount": "4.95"},
+                    ],
+                }
+                for i in range(10)
+            ],
+            "test",
+        )
+    assert len(transactions) == 10
+    t = Transaction.objects.get(pk=transactions[3].pk)
+    assert t.memo == "Fee 3"
+    assert (t.debit_total, t.credit_total, t.is_balanced) == (
+        Decimal("9.95"),
+        Decimal("9.95"),
+        True,
+    )
+    assert t.bookings.count() == 3
+    assert (
+        LogEntry.objects.filter(
+            action_type="byro.bookkeeping.transaction.created",
+            object_id__in=[t.pk for t in transactions],
+        ).count()
+        == 10
+    )
+
+    t = Transaction.objects.create_balanced(
+        [
+            {"debit_account": bank_account, "amount": 1},
+            {"credit_account": income_account, "amount": 1},
+        ],
+        "test",
+        value_datetime=now(),
+    )
+    assert t.is_balanced and t.pk
+
+    for bookings in (
+        [],
+        [{"debit_account": bank_account, "amount": 1}],
+        [{"debit_account": bank_account, "credit_account": bank_account, "amount": 1}],
+        [
+            {"debit_account": bank_account, "amount": 1},
+            {"debit_account": bank_account, "amount": 1},
+            {"credit_account": income_account, "amount": 1},
+            {"credit_account": income_account, "amount": 1},
+        ],
+    ):
+        with pytest.raises(ValueError):
+            Transaction.objects.create_balanced(bookings, "test", value_datetime=now())
+
+    with pytest.raises(IntegrityError), transaction.atomic():
+        Booking.objects.bulk_create(
+            [Booking(transaction=t, amount=1, debit_account=bank_account)]
+            + [Booking(transaction=t, amount=1)]
+        )
+
+
+@pytest.mark.django_db
+def test_reverse_all(bank_account, income_account, django_assert_max_num_queries):
+    originals = Transaction.objects.bulk_create_balanced(
+        [
+            {
+                "value_datetime": now() - timedelta(days=i),
+                "bookings": [
+                    {"debit_account": bank_account, "amount": i + 1},
+                    {"credit_account": income_account, "amount": i + 1},
+                ],
+            }
+            for i in range(10)
+        ],
+        "test",
+    )
+    with django_assert_max_num_queries(10):
+        reversals = Transaction.objects.filter(
+            pk__in=[t.pk for t in originals]
+        ).reverse_all("test", memo="Canceled")
+    assert len(reversals) == 10
+    assert bank_account.balances(end=None)["net"] == 0
+    assert income_account.balances(end=None)["net"] == 0
+
+    original = originals[3]
+    reversal = Transaction.objects.get(reverses=original)
+    assert reversal.value_datetime == original.value_datetime
+    assert reversal.memo == "Canceled"
+    assert reversal.is_balanced and reversal.debit_total == 4
+    assert reversal.bookings.get(credit_account=bank_account).amount == 4
+    assert LogEntry.objects.filter(
+        action_type="byro.bookkeeping.transaction.reversed", object_id=original.pk
+    ).exists()
+    assert LogEntry.objects.filter(
+        action_type="byro.bookkeeping.transaction.created", object_id=reversal.pk
+    ).exists()
+    assert Transaction.objects.none().reverse_all("test") == []
+
+
 @pytest.mark.django_db
 def test_transaction_balances_decimal(bank_account, receivable_account):
     t = Transaction.objects.create(value_datetime=now(), user_or_context="test")
@@ -135,3 +305,241 @@ def test_account_balances(bank_account, receivable_account, income_account):
 def test_real_transaction_source_process(real_transaction_source):
     with suppress(Exception):
         real_transaction_source.process()
+
+
+@pytest.mark.django_db
+def test_real_transaction_source_process_progress(
+    real_transaction_source, bank_account, receivable_account
+):
+    from byro.bookkeeping.models.real_transaction import SourceState
+    from byro.bookkeeping.signals import process_csv_upload
+
+    def import_transactions(sender, **kwargs):
+        result = []
+        for index in range(3):
+            t = Transaction.objects.create(
+                memo="Imported {}".format(index),
+                value_datetime=now(),
+                user_or_context="test",
+            )
+            t.debit(
+                amount=10, account=bank_account, source=sender, user_or_context="test"
+            )
+            t.credit(
+                amount=10,
+                account=receivable_account,
+                source=sender,
+                user_or_context="test",
+            )
+            result.append(t)
+        return result
+
+    calls = []
+    process_csv_upload.connect(import_transactions)
+    try:
+        real_transaction_source.process(
+            chunk_size=2, progress=lambda *args: calls.append(args)
+        )
+    finally:
+        process_csv_upload.disconnect(import_transactions)
+
+    assert calls == [(2, 3), (3, 3)]
+    assert real_transaction_source.state == SourceState.PROCESSED
+
+
+@pytest.mark.django_db
+def test_trial_balance(
+    bank_account, receivable_account, income_account, django_assert_num_queries
+):
+    t1 = Transaction.objects.create(
+        memo="Member fee is due", value_datetime=now(), user_or_context="test"
+    )
+    t1.debit(amount=10, account=receivable_account, user_or_context="test")
+    t1.credit(amount=10, account=income_account, user_or_context="test")
+    t2 = Transaction.objects.create(
+        memo="Member fee payment", value_datetime=now(), user_or_context="test"
+    )
+    t2.debit(amount=7, account=bank_account, user_or_context="test")
+    t2.credit(amount=5, account=receivable_account, user_or_context="test")
+
+    # Unbalanced, with a debit and a credit on the bank account
+    t3 = Transaction.objects.create(
+        memo="Transfer", value_datetime=now(), user_or_context="test"
+    )
+    t3.debit(amount=3, account=bank_account, user_or_context="test")
+    t3.credit(amount=2, account=bank_account, user_or_context="test")
+    # Unbalanced, dated after as_of
+    t4 = Transaction.objects.create(
+        memo="Future fee payment",
+        value_datetime=now() + timedelta(days=10),
+        user_or_context="test",
+    )
+    t4.debit(amount=1, account=income_account, user_or_context="test")
+
+    # The closed period, the sums, the unbalanced transactions and the accounts
+    with django_assert_num_queries(4):
+        trial_balance = {
+            balance.account: balance for balance in get_trial_balance(as_of=None)
+        }
+    for account in (bank_account, receivable_account, income_account):
+        balances = account.balances(end=None)
+        balance = trial_balance[account]
+        assert (balance.debit, balance.credit, balance.net) == (
+            balances["debit"],
+            balances["credit"],
+            balances["net"],
+        )
+        assert balance.unbalanced == account.unbalanced_transactions.count()
+    assert trial_balance[bank_account].net == 8
+    assert trial_balance[bank_account].unbalanced == 2
+    assert trial_balance[income_account].unbalanced == 1
+
+    before = {
+        balance.account: balance
+        for balance in get_trial_balance(as_of=t1.value_datetime - timedelta(days=1))
+    }
+    assert all(balance.debit == balance.credit == 0 for balance in before.values())
+    assert before[bank_account].unbalanced == 2
+
+
+@pytest.mark.django_db
+def test_closed_period():
+    member = Member.objects.create(number="closed-period", name="Closed Period")
+    bank = Account.objects.create(account_category=AccountCategory.ASSET)
+    fees_receivable = SpecialAccounts.fees_receivable
+    _now = now()
+    old = _now - timedelta(days=800)
+
+    def book(value_datetime, debit, credit, amount):
+        t = Transaction.objects.create(
+            value_datetime=value_datetime, user_or_context="test"
+        )
+        t.debit(account=debit, amount=amount, member=member, user_or_context="test")
+        t.credit(account=credit, amount=amount, member=member, user_or_context="test")
+
+    book(old, fees_receivable, SpecialAccounts.fees, 10)
+    book(old, bank, fees_receivable, 4)
+    book(old, bank, SpecialAccounts.donations, 2)
+    before = {
+        "bank": bank.balances(),
+        "fees_receivable": fees_receivable.balances(),
+        "member": member._calc_balance(),
+        "summary": MemberLedgerSummary.compute(member, _now=_now),
+    }
+    assert before["member"] == -6
+
+    period = ClosedPeriod.close(old + timedelta(days=1), "test")
+    assert LogEntry.objects.filter(
+        action_type="byro.bookkeeping.period.closed", object_id=period.pk
+    ).exists()
+    assert period.verify() == []
+    assert bank.balances() == before["bank"]
+    assert fees_receivable.balances() == before["fees_receivable"]
+    assert member._calc_balance() == before["member"]
+    assert MemberLedgerSummary.compute(member, _now=_now) == before["summary"]
+    with pytest.raises(ValueError):
+        ClosedPeriod.close(old, "test")
+    with pytest.raises(TypeError):
+        period.member_snapshots.get().save()
+
+    book(now() - timedelta(days=1), bank, fees_receivable, 3)
+    assert member._calc_balance() == -3
+    assert Member.objects.with_balance().get(pk=member.pk).balance == -3
+    assert MemberLedgerSummary.compute(member)["fee_balance"] == -3
+    assert MemberLedgerSummary.compute(member)["donation_balance"] == 2
+    assert bank.balances()["net"] == 9
+
+    trial_balance = {balance.account: balance for balance in get_trial_balance()}
+    for account in (bank, fees_receivable):
+        balances = account.balances()
+        assert (trial_balance[account].debit, trial_balance[account].credit) == (
+            balances["debit"],
+            balances["credit"],
+        )
+
+    # No bookings can be written in a closed period
+    with pytest.raises(ValueError, match="closed"):
+        book(old, bank, fees_receivable, 1)
+    with pytest.raises(ValueError, match="closed"):
+        Transaction.objects.create_balanced(
+            [
+                {"debit_account": bank, "amount": 1},
+                {"credit_account": fees_receivable, "amount": 1, "member": member},
+            ],
+            "test",
+            value_datetime=old,
+        )
+    with pytest.raises(ValueError, match="closed"):
+        Transaction.objects.filter(value_datetime=old).reverse_all("test")
+    Transaction.objects.filter(value_datetime=old).reverse_all(
+        "test", value_datetime=_now
+    )
+    assert member._calc_balance() == 3
+
+    # Writes that bypass the checks are not seen by the balances, but by verify()
+    t = Transaction.objects.create(value_datetime=old, user_or_context="test")
+    Booking.objects.bulk_create(
+        [
+            Booking(transaction=t, debit_account=bank, amount=1, member=member),
+            Booking(
+                transaction=t, credit_account=fees_receivable, amount=1, member=member
+            ),
+        ]
+    )
+    assert member._calc_balance() == 3
+    assert member._calc_balance(asset_start=old) == 4
+    assert len(period.verify()) == 3
+    with pytest.raises(CommandError, match="3 closing balances"):
+        call_command("close_period", "--check", stderr=StringIO())
+
+
+@pytest.mark.django_db
+def test_closed_period_changes():
+    member = Member.objects.create(number="closed-changes", name="Closed Changes")
+    bank = Account.objects.create(account_category=AccountCategory.ASSET)
+    old = now() - timedelta(days=800)
+
+    def book(value_datetime):
+        t = Transaction.objects.create(
+            value_datetime=value_datetime, user_or_context="test"
+        )
+        t.debit(account=bank, amount=5, member=member, user_or_context="test")
+        t.credit(
+            account=SpecialAccounts.donations,
+            amount=5,
+            member=member,
+            user_or_context="test",
+        )
+        return t
+
+    closed = book(old)
+    period = ClosedPeriod.close(old + timedelta(days=1), "test")
+    recent = book(now() - timedelta(days=1))
+
+    # Neither out of the closed period, nor into it
+    closed.value_datetime = now()
+    with pytest.raises(ValueError, match="closed"):
+        closed.save()
+    recent.value_datetime = old
+    with pytest.raises(ValueError, match="closed"):
+        recent.save()
+    deferred = Transaction.objects.only("memo").get(pk=recent.pk)
+    deferred.value_datetime = old
+    with pytest.raises(ValueError, match="closed"):
+        deferred.save()
+
+    closed = Transaction.objects.get(pk=closed.pk)
+    closed.memo = "Only the memo"
+    closed.save()
+    with pytest.raises(ValueError, match="closed"):
+        closed.bookings.first().delete()
+    with pytest.raises(ValueError, match="closed"):
+        closed.delete()
+
+    recent = Transaction.objects.get(pk=recent.pk)
+    recent.value_datetime = now()
+    recent.save()
+    for booking in recent.bookings.all():
+        booking.delete()
+    recent.delete()
+    assert period.verify() == []
@@ -1,8 +1,15 @@
 import pytest
 from django.http.request import QueryDict
+from django.utils.timezone import now
 
-from byro.common.models.log import LogEntry
-from byro.common.templatetags.log_entry import format_log_entry, format_log_source
+from byro.bookkeeping.special_accounts import SpecialAccounts
+from byro.common.models.log import LogEntry, ObjectReference, resolve_log_objects
+from byro.common.templatetags.log_entry import (
+    ACTION_TEMPLATES,
+    format_log_entry,
+    format_log_object,
+    format_log_source,
+)
 from byro.common.templatetags.url_replace import url_replace
 
 
@@ -47,6 +54,37 @@ def test_log_entry_formatting(mail_template, user):
     )
 
 
+@pytest.mark.django_db
+def test_log_entry_action_templates(mail_template, user):
+    entry = LogEntry(
+        content_object=mail_template, data={"source": "value"}, action_type="x.y"
+    )
+    ACTION_TEMPLATES.pop("x.y", None)
+    format_log_entry(entry)
+    assert ACTION_TEMPLATES["x.y"] is False
+
+
+@pytest.mark.django_db
+def test_resolve_log_objects(mail_template, member, django_assert_num_queries):
+    member.log("test", "test.test_resolve_log_objects", template=mail_template)
+    member.log("test", "test.test_resolve_log_objects", changes={"x": [None, member]})
+    entries = list(LogEntry.objects.filter(action_type="test.test_resolve_log_objects"))
+    mail_template.delete()
+
+    with django_assert_num_queries(2):
+        resolve_log_objects(entries)
+    references = [entries[0].data["changes"]["x"][1], entries[1].data["template"]]
+    assert all(isinstance(ref, ObjectReference) for ref in references)
+    assert references[0].content_object == member
+    assert references[1].content_object is None
+
+    with django_assert_num_queries(0):
+        assert 'href="{}"'.format(member.get_absolute_url()) in format_log_object(
+            references[0]
+        )
+        assert format_log_object(references[1]).startswith("<i>")
+
+
 @pytest.mark.django_db
 def test_log_entry_source_formatting(mail_template, user):
     assert (
@@ -70,3 +108,49 @@ def test_log_entry_source_formatting(mail_template, user):
         )
         == 'value (via <span class="fa fa-user"></span> regular_user)'
     )
+
+
+@pytest.mark.django_db
+def test_format_with_currency_configuration_snapshot(
+    configuration, django_assert_num_queries
+):
+    from byro.common.models import Configuration
+    from byro.common.models.configuration import configuration_snapshot
+    from byro.common.templatetags.format_with_currency import format_with_currency
+
+    with configuration_snapshot():
+        with django_assert_num_queries(1):
+            for _ in range(10):
+                format_with_currency(5)
+        config = Configuration.objects.get()
+        config.currency_symbol = "$"
+        config.currency_postfix = False
+        config.save()
+        assert format_with_currency(5) == "$ 5"
+
+
+@pytest.mark.django_db
+def test_byro_information_counters(
+    rf, email, partial_transaction, django_assert_num_queries
+):
+    from byro.common.context_processors import byro_information
+
+    request = rf.get("/")
+    context = byro_information(request)
+    assert context["pending_mails"] == 1
+    assert context["pending_transactions"] == 1
+    assert context["log_end"] == LogEntry.objects.get_chain_end()
+
+    # The configuration, one count per counter and the log chain head
+    with django_assert_num_queries(4):
+        assert byro_information(request)["pending_mails"] == 1
+
+    email.sent = now()
+    email.save()
+    partial_transaction.credit(
+        account=SpecialAccounts.fees, amount=10, user_or_context="test"
+    )
+    context = byro_information(request)
+    assert context["pending_mails"] == 0
+    assert context["pending_transactions"] == 0
+    assert context["log_end"] == LogEntry.objects.get_chain_end()
@@ -1,7 +1,14 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from io import StringIO
+
 import pytest
-from django.db import transaction
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
 
-from byro.common.models import LogEntry
+from byro.common.logchain import verify_logchain
+from byro.common.models import LogChainHead, LogEntry, log_batch
 
 
 @pytest.mark.django_db
@@ -93,3 +100,289 @@ def test_log_user(user, member):
         LogEntry.objects.create(content_object=member, action_type="test.test_log_user")
 
     assert LogEntry.objects.filter(user=user).first().data["source"] == str(user)
+
+
+def _assert_linear_chain():
+    entries = {entry.auth_hash: entry for entry in LogEntry.objects.all()}
+    end = LogEntry.objects.get_chain_end()
+    assert end == LogEntry.objects.find_chain_end()
+    seen = set()
+    current = end
+    while current.auth_hash not in seen:
+        seen.add(current.auth_hash)
+        current = entries[current.auth_prev_id]
+    assert len(seen) == len(entries)
+
+
+@pytest.mark.django_db
+def test_log_chain_head(member, django_assert_num_queries):
+    for i in range(5):
+        entry = LogEntry.objects.create(
+            content_object=member,
+            action_type="test.test_log_chain_head",
+            data={"source": "test"},
+        )
+    assert LogChainHead.objects.get().entry == entry
+    with django_assert_num_queries(1):
+        assert LogEntry.objects.get_chain_end() == entry
+    _assert_linear_chain()
+
+
+@pytest.mark.django_db
+def test_log_chain_head_missing(member):
+    LogChainHead.objects.all().delete()
+    previous = LogEntry.objects.get_chain_end()
+    entry = LogEntry.objects.create(
+        content_object=member,
+        action_type="test.test_log_chain_head",
+        data={"source": "test"},
+    )
+    assert entry.auth_prev == previous
+    assert LogChainHead.objects.get().entry == entry
+
+
+@pytest.mark.django_db(transaction=True)
+def test_log_chain_concurrent_writers(member):
+    if connection.vendor == "sqlite":
+        pytest.skip("SQLite test databases can't be written from several threads")
+
+    def write(n):
+        try:
+            for i in range(n):
+                LogEntry.objects.create(
+                    content_object=member,
+                    action_type="test.test_log_chain_concurrent_writers",
+                    data={"source": "test"},
+                )
+        finally:
+            connection.close()
+
+    before = LogEntry.objects.count()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for result in [executor.submit(write, 25) for _ in range(8)]:
+            result.result()
+    assert LogEntry.objects.count() == before + 200
+    _assert_linear_chain()
+
+
+@pytest.mark.django_db
+def test_log_batch(member, user, django_assert_max_num_queries):
+    single = LogEntry.objects.create(
+        content_object=member,
+        action_type="test.test_log_batch",
+        data={"source": "test"},
+    )
+    with django_assert_max_num_queries(6):
+        with log_batch():
+            for i in range(50):
+                member.log("test", "test.test_log_batch", i=i)
+            member.log(None, "test.test_log_batch", user=user)
+            assert (
+                LogEntry.objects.filter(action_type="test.test_log_batch").count() == 1
+            )
+    entries = list(
+        LogEntry.objects.filter(action_type="test.test_log_batch").order_by("pk")
+    )
+    assert len(entries) == 52
+    assert entries[1].auth_prev_id == single.auth_hash
+    assert [entry.data.get("i") for entry in entries[1:-1]] == [
+        str(i) for i in range(50)
+    ]
+    assert entries[-1].data["source"] == str(user)
+    assert all(entry.verify() for entry in entries)
+    assert LogEntry.objects.get_chain_end() == entries[-1]
+    _assert_linear_chain()
+
+
+@pytest.mark.django_db
+def test_log_batch_rollback(member):
+    end = LogEntry.objects.get_chain_end()
+    with pytest.raises(ValueError):
+        with log_batch():
+            member.log("test", "test.test_log_batch_rollback")
+            member.log(None, "test.test_log_batch_rollback")
+    assert not LogEntry.objects.filter(action_type="test.test_log_batch_rollback")
+    assert LogEntry.objects.get_chain_end() == end
+
+
+@pytest.mark.django_db
+def test_log_batch_savepoint_rollback(member):
+    with log_batch():
+        member.log("test", "test.test_log_batch_savepoint", i=1)
+        with suppress(ValueError):
+            with transaction.atomic():
+                member.log("test", "test.test_log_batch_savepoint", i=2)
+                raise ValueError
+        with transaction.atomic():
+            member.log("test", "test.test_log_batch_savepoint", i=3)
+        member.log("test", "test.test_log_batch_savepoint", i=4)
+    entries = list(
+        LogEntry.objects.filter(action_type="test.test_log_batch_savepoint").order_by(
+            "pk"
+        )
+    )
+    assert [entry.data["i"] for entry in entries] == ["1", "3", "4"]
+    assert entries[1].auth_prev_id == entries[0].auth_hash
+    assert entries[2].auth_prev_id == entries[1].auth_hash
+    assert LogEntry.objects.get_chain_end() == entries[-1]
+    _assert_linear_chain()
+
+
+@pytest.mark.django_db
+def test_verify_logchain(member, tmp_path):
+    for i in range(5):
+        member.log("test", "test.test_verify_logchain", i=i)
+    checkpoint = tmp_path / "checkpoint"
+
+    result = verify_logchain(chunk_size=2)
+    assert result["error"] is None
+    assert result["entries"] == LogEntry.objects.count()
+    assert result["last"] == LogEntry.objects.get_chain_end().auth_hash
+
+    call_command("verify_logchain", "--checkpoint", str(checkpoint), stdout=StringIO())
+    assert checkpoint.read_text().strip() == result["last"]
+    member.log("test", "test.test_verify_logchain")
+    assert verify_logchain(since=result["last"])["entries"] == 1
+
+    tampered = (
+        LogEntry.objects.filter(action_type="test.test_verify_logchain")
+        .order_by("pk")
+        .first()
+    )
+    LogEntry.objects.filter(pk=tampered.pk).update(data={"source": "someone else"})
+    with pytest.raises(CommandError, match=f"entry #{tampered.pk}"):
+        call_command("verify_logchain", stdout=StringIO())
+    # Entries before the checkpoint are not verified again
+    call_command("verify_logchain", "--checkpoint", str(checkpoint), stdout=StringIO())
+
+
+@pytest.mark.django_db
+def test_verify_logchain_out_of_pk_order(member):
+    for i in range(5):
+        member.log("test", "test.test_verify_logchain_order", i=i)
+    entries = list(
+        LogEntry.objects.filter(action_type="test.test_verify_logchain_order").order_by(
+            "pk"
+        )
+    )
+    # Like the entries linked by datetime when the log chain was introduced
+    LogEntry.objects.filter(pk=entries[1].pk).update(id=entries[-1].pk + 100)
+
+    for chunk_size in (1, 2, 1000):
+        result = verify_logchain(chunk_size=chunk_size)
+        assert result["error"] is None
+        assert result["entries"] == LogEntry.objects.count()
+    assert verify_logchain(since=entries[0].auth_hash)["entries"] == 4
+
+
+@pytest.mark.django_db(transaction=True)
+def test_verify_logchain_processes(member):
+    for i in range(5):
+        member.log("test", "test.test_verify_logchain_processes", i=i)
+
+    result = verify_logchain(processes=2, chunk_size=2)
+    assert result["error"] is None
+    assert result["entries"] == LogEntry.objects.count()
+
+    tampered = LogEntry.objects.filter(
+        action_type="test.test_verify_logchain_processes"
+    ).last()
+    LogEntry.objects.filter(pk=tampered.pk).update(data={"source": "someone else"})
+    error = verify_logchain(processes=2, chunk_size=2)["error"]
+    assert error["pk"] == tampered.pk
+    assert error["reason"] == "Authentication data does not match"
+
+
+@pytest.mark.django_db
+def test_verify_logchain_fork(member):
+    for i in range(3):
+        member.log("test", "test.test_verify_logchain_fork", i=i)
+    fork = LogEntry(
+        content_object=member,
+        action_type="test.test_verify_logchain_fork",
+        data={"source": "test"},
+        auth_prev_id=LogEntry.objects.get_chain_end().auth_prev_id,
+    )
+    fork._prepare_entry()
+    LogEntry.objects.bulk_create([fork])
+
+    for chunk_size in (1, 1000):
+        error = verify_logchain(chunk_size=chunk_size)["error"]
+        assert error is not None
+        assert error["reason"] in (
+            "The log chain forks here",
+            "Not part of the log chain",
+        )
+
+
+@pytest.mark.django_db
+def test_export_logchain(member, capsys):
+    for i in range(5):
+        member.log("test", "test.test_export_logchain", i=i)
+    hashes = list(LogEntry.objects.order_by("pk").values_list("auth_hash", flat=True))
+
+    call_command("export_logchain", "--chunk-size", "2")
+    exported = json.loads(capsys.readouterr().out)
+    assert [entry["hash"] for entry in exported] == hashes[::-1]
+    assert exported[0]["entry"]["prev_hash"] == hashes[-2]
+    assert exported[0]["data"]["i"] == "4"
+
+    call_command(
+        "export_logchain",
+        "--format=ndjson",
+        "--since",
+        hashes[-3],
+        "-A",
+        "^test",
+    )
+    lines = capsys.readouterr().out.splitlines()
+    exported = [json.loads(line) for line in lines]
+    assert [entry["hash"] for entry in exported] == hashes[-2:]
+    assert "data" not in exported[0]
+
+
+@pytest.mark.django_db
+def test_export_logchain_chain_order(member, capsys):
+    for i in range(5):
+        member.log("test", "test.test_export_logchain", i=i)
+    hashes = list(LogEntry.objects.order_by("pk").values_list("auth_hash", flat=True))
+    moved = LogEntry.objects.get(auth_hash=hashes[-3])
+    LogEntry.objects.filter(pk=moved.pk).update(id=moved.pk + 100)
+
+    call_command("export_logchain", "--chunk-size", "2")
+    exported = json.loads(capsys.readouterr().out)
+    assert [entry["hash"] for entry in exported] == hashes[::-1]
+    call_command("export_logchain", "--format=ndjson", "--chunk-size", "2")
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["hash"] for line in lines] == hashes
+
+    fork = LogEntry(
+        content_object=member,
+        action_type="test.test_export_logchain",
+        data={"source": "test"},
+        auth_prev_id=hashes[-2],
+    )
+    fork._prepare_entry()
+    LogEntry.objects.bulk_create([fork])
+    with pytest.raises(CommandError, match="Log chain broken"):
+        call_command("export_logchain", "--format=ndjson")
+
+
+@pytest.mark.django_db
+def test_log_software_version(member):
+    from django.apps import apps
+
+    from byro.common import utils
+    from byro.common.utils import compute_installed_software, get_installed_software
+
+    utils._installed_software = None
+    apps.get_app_config("common").ready()
+    assert utils._installed_software is not None
+    assert get_installed_software() is get_installed_software()
+    assert list(get_installed_software()) == compute_installed_software()
+    entry = LogEntry.objects.create(
+        content_object=member, action_type="test.test_log", data={"source": "test"}
+    )
+    assert entry.auth_data["software_version"] == ", ".join(
+        compute_installed_software()
+    )
@@ -1,6 +1,14 @@
+from datetime import date, datetime
+
 import pytest
+from dateutil.relativedelta import relativedelta
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+from django.utils.timezone import now
 
-from byro.members.models import Member, get_next_member_number
+from byro.bookkeeping.models import Transaction
+from byro.members.models import FeeIntervals, Member, Membership, get_next_member_number
+from byro.members.timeline import _date_compare_key
 
 
 @pytest.mark.django_db
@@ -39,3 +47,167 @@ def test_member_record_disclosure_email(member_with_sepa_profile):
     assert member.number in email.subject
     assert member.profile_sepa.iban in email.text
     assert member.name in email.text
+
+
+@pytest.mark.django_db
+def test_member_with_balance(member, inactive_member):
+    inactive_member.update_liabilites()
+    members = {m.pk: m for m in Member.objects.with_balance()}
+
+    assert members[member.pk].annotated_balance == 0
+    assert members[inactive_member.pk].annotated_balance < 0
+    assert (
+        members[inactive_member.pk].balance
+        == Member.objects.get(pk=inactive_member.pk)._calc_balance()
+    )
+
+
+@pytest.mark.django_db
+def test_member_log_entries(
+    member, membership, inactive_member, django_assert_num_queries
+):
+    member.log("test", "test.member")
+    membership.log("test", "test.membership")
+    inactive_member.log("test", "test.member")
+    inactive_member.memberships.first().log("test", "test.membership")
+
+    ContentType.objects.clear_cache()
+    # The two content types, and the entries with the memberships subquery
+    with django_assert_num_queries(3):
+        entries = list(member.log_entries())
+    assert {entry.action_type for entry in entries} >= {
+        "test.member",
+        "test.membership",
+    }
+    assert {(entry.content_type_id, entry.object_id) for entry in entries} == {
+        (ContentType.objects.get_for_model(Member).pk, member.pk),
+        (ContentType.objects.get_for_model(Membership).pk, membership.pk),
+    }
+
+
+@pytest.mark.django_db
+def test_member_timeline_queries(django_assert_num_queries):
+    from byro.members.timeline import get_timeline
+
+    member = Member.objects.create(name="Timeline")
+    today = now().date()
+    membership = Membership.objects.create(
+        member=member,
+        start=today.replace(day=1) - relativedelta(months=3),
+        end=today.replace(day=1) - relativedelta(months=1, days=-1),
+        amount=20,
+        interval=FeeIntervals.MONTHLY,
+    )
+    member.update_liabilites()
+    membership.amount = 10
+    membership.save()
+    member.update_liabilites()
+
+    # Independent of the content types cached by earlier tests
+    ContentType.objects.clear_cache()
+    with django_assert_num_queries(15):
+        entries = list(get_timeline(member))
+    dues = [entry for entry in entries if entry["subtype"] == "membership-due"]
+    assert len(dues) == 6
+    assert len([entry for entry in dues if entry["deleted"]]) == 3
+    assert [entry["date"] for entry in entries] == sorted(
+        (entry["date"] for entry in entries),
+        key=_date_compare_key,
+        reverse=True,
+    )
+
+
+@pytest.mark.django_db
+def test_member_timeline_page(inactive_member):
+    from byro.members.timeline import get_timeline_page
+
+    inactive_member.log("test", ".updated")
+    this_month = now().date().replace(day=1)
+    membership = inactive_member.memberships.first()
+
+    entries, before = get_timeline_page(inactive_member)
+    assert [entry["subtype"] for entry in entries] == ["member-updated"]
+    assert before == this_month
+
+    entries, before = get_timeline_page(inactive_member, before=before)
+    assert [entry["subtype"] for entry in entries] == ["membership-end"]
+    assert before == membership.end.replace(day=1)
+
+    entries, before = get_timeline_page(inactive_member, before=before)
+    assert [entry["subtype"] for entry in entries] == ["membership-begin"]
+    assert before is None
+
+
+@pytest.mark.django_db
+def test_member_timeline_page_in_default_timezone(settings):
+    from byro.members.timeline import get_timeline_page
+
+    settings.TIME_ZONE = "Europe/Berlin"
+    member = Member.objects.create(name="Timeline")
+    Membership.objects.create(
+        member=member,
+        start=date(2024, 1, 1),
+        end=date(2024, 3, 31),
+        amount=10,
+        interval=FeeIntervals.MONTHLY,
+    )
+    member.update_liabilites()
+
+    # The March due is stored at midnight in Berlin, which is still February
+    # in UTC
+    entries, before = get_timeline_page(member, before=date(2024, 4, 1))
+    assert [entry["subtype"] for entry in entries] == [
+        "membership-end",
+        "membership-due",
+    ]
+    assert before == date(2024, 3, 1)
+
+
+@pytest.mark.django_db
+def test_member_timeline_compare_key_in_default_timezone(settings):
+    settings.TIME_ZONE = "America/New_York"
+    evening = timezone.make_aware(
+        datetime(2024, 3, 1, 22), timezone.get_default_timezone()
+    )
+    assert _date_compare_key(date(2024, 3, 1)) > evening
+    assert _date_compare_key(date(2024, 2, 29)) < evening
+
+
+@pytest.mark.django_db
+def test_member_timeline_first_page_is_current_month(
+    receivable_account, income_account
+):
+    from byro.members.timeline import get_timeline_page
+
+    member = Member.objects.create(name="Timeline")
+    member.log("test", ".updated")
+    planned = Transaction.objects.create(
+        memo="Planned",
+        value_datetime=now() + relativedelta(months=3),
+        user_or_context="test",
+    )
+    planned.debit(
+        amount=10, account=receivable_account, member=member, user_or_context="test"
+    )
+    planned.credit(
+        amount=10, account=income_account, member=member, user_or_context="test"
+    )
+    this_month = timezone.localdate().replace(day=1)
+    Membership.objects.create(
+        member=member,
+        start=this_month - relativedelta(months=2),
+        amount=10,
+        interval=FeeIntervals.MONTHLY,
+    )
+
+    # Starts with the current month, not with the month of the planned booking
+    entries, before = get_timeline_page(member)
+    assert [entry["subtype"] for entry in entries] == [
+        "other-transaction",
+        "member-updated",
+    ]
+    assert before == this_month
+
+    entries, before = get_timeline_page(member, before=before)
+    assert [entry["subtype"] for entry in entries] == ["membership-begin"]
+    assert before is None
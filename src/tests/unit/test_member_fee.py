@@ -1,3 +1,4 @@
+from datetime import datetime, time
 from itertools import repeat
 
 import pytest
@@ -101,6 +102,17 @@ def test_liabilities_change(member_membership):
     assert len(credits) == 2
     assert sum(i.amount for i in credits) == 40
     assert sum(i.amount for i in debits) == 40 + 60
+    # The bulk-created dues and reversals have correct stored totals
+    stored = {
+        t.pk: (t.debit_total, t.credit_total, t.is_balanced)
+        for t in Transaction.objects.filter(bookings__member=member_membership.member)
+    }
+    Transaction.objects.update_balances()
+    assert stored == {
+        t.pk: (t.debit_total, t.credit_total, t.is_balanced)
+        for t in Transaction.objects.filter(bookings__member=member_membership.member)
+    }
+    assert all(balanced for _debit, _credit, balanced in stored.values())
 
 
 @pytest.fixture
@@ -229,3 +241,124 @@ def test_liabilities_limit(member):
         assert member.statute_barred_debt() == 0
 
         assert member.statute_barred_debt(relativedelta(years=1)) == 239.0
+
+
+@pytest.mark.django_db
+def test_update_all_liabilities(member_membership, inactive_member):
+    from django.core.management import call_command
+
+    from byro.members.liabilities import update_all_liabilities
+
+    result = update_all_liabilities(chunk_size=1)
+    assert result["members"] == 2
+    assert result["created"] == 2 + 3
+    assert result["reversed"] == 0
+    assert member_membership.member.balance == -40
+    assert inactive_member.balance == -60
+
+    member_membership.amount = 10
+    member_membership.save()
+    result = update_all_liabilities()
+    assert result["created"] == 2
+    assert result["reversed"] == 2
+    assert member_membership.member.balance == -20
+    booking = member_membership.member.bookings.filter(
+        transaction__reverses__isnull=False
+    ).first()
+    assert booking.transaction.reverses.reversed_by.get() == booking.transaction
+
+    call_command("update_liabilities")
+    assert update_all_liabilities()["created"] == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_update_all_liabilities_processes(member_membership, inactive_member):
+    from byro.members.liabilities import update_all_liabilities
+    from byro.members.models import MembershipDuesSchedule
+
+    assert update_all_liabilities(processes=2, chunk_size=1)["created"] == 2 + 3
+
+    # The schedule of the changed membership is refreshed by this process,
+    # the workers only compute the diff
+    member_membership.amount = 10
+    member_membership.save()
+    assert not MembershipDuesSchedule.objects.filter(membership=member_membership)
+    result = update_all_liabilities(processes=2, chunk_size=1)
+    assert (result["created"], result["reversed"]) == (2, 2)
+    assert MembershipDuesSchedule.objects.filter(membership=member_membership)
+    assert member_membership.member.balance == -20
+    assert update_all_liabilities(processes=2, chunk_size=1)["created"] == 0
+
+
+@pytest.mark.django_db
+def test_dues_schedule(member_membership):
+    from byro.members.models import MembershipDuesSchedule
+
+    member_membership.member.update_liabilites()
+    member_membership.refresh_from_db()
+    schedule = member_membership.dues_schedule
+    assert (schedule.start, schedule.end) == member_membership.get_dues_range()
+    assert {(d.date, d.amount) for d in schedule.dues.all()} == (
+        member_membership.get_dues()[1]
+    )
+
+    member_membership.amount = 10
+    member_membership.save()
+    assert not MembershipDuesSchedule.objects.filter(
+        membership=member_membership
+    ).exists()
+
+    member_membership.member.update_liabilites()
+    assert set(
+        MembershipDuesSchedule.objects.get(membership=member_membership)
+        .dues.values_list("amount", flat=True)
+        .distinct()
+    ) == {10}
+
+    Membership.objects.filter(pk=member_membership.pk).update(amount=20)
+    assert not MembershipDuesSchedule.objects.filter(
+        membership=member_membership
+    ).exists()
+
+    member_membership.member.update_liabilites()
+    member_membership.amount = 30
+    Membership.objects.bulk_update([member_membership], ["amount"])
+    assert not MembershipDuesSchedule.objects.filter(
+        membership=member_membership
+    ).exists()
+
+
+@pytest.mark.django_db
+def test_dues_independent_of_current_timezone(member_membership):
+    from byro.members.liabilities import compute_liability_changes
+
+    member = member_membership.member
+    with timezone.override("America/Los_Angeles"):
+        member.update_liabilites()
+        changes = compute_liability_changes(Member.objects.filter(pk=member.pk))
+    assert (changes["missing"], changes["wrong"], changes["stray"]) == ([], [], [])
+
+
+@pytest.mark.django_db
+def test_liabilities_closed_period(member_membership):
+    from byro.bookkeeping.models import ClosedPeriod
+
+    member = member_membership.member
+    member.update_liabilites()
+    this_month = timezone.make_aware(
+        datetime.combine(timezone.localdate().replace(day=1), time())
+    )
+    ClosedPeriod.close(this_month - relativedelta(microseconds=1), "test")
+
+    # The due of last month is in the closed period and stays as it is
+    member_membership.amount = 30
+    member_membership.save()
+    member.update_liabilites()
+    debits = member.bookings.filter(debit_account=SpecialAccounts.fees_receivable)
+    credits = member.bookings.filter(credit_account=SpecialAccounts.fees_receivable)
+    assert sorted(b.amount for b in debits) == [20, 20, 30]
+    assert [b.amount for b in credits] == [20]
+    assert all(b.transaction.value_datetime >= this_month for b in credits)
+
+    member.update_liabilites()
+    assert member.bookings.count() == 8
@@ -1,6 +1,7 @@
 import pytest
+from django.utils import translation
 
-from byro.members.models import Field, Member
+from byro.members.models import Field, Member, _fields_cache
 
 
 def test_internal_follow_path():
@@ -61,3 +62,45 @@ def test_member_field_writing_sepa_iban(member):
 
     f["MemberSepa__iban"].setter(member, "DE491234567890")
     assert member.profile_sepa.iban == "DE491234567890"
+
+
+@pytest.mark.django_db
+def test_member_fields_cached(configuration):
+    f = Member.get_fields()
+    assert not f["member__name"].registration_form
+    # Callers get copies of the cached fields
+    f["member__name"].registration_form["position"] = 1
+    assert Member.get_fields()["member__name"] is not f["member__name"]
+    assert not Member.get_fields()["member__name"].registration_form
+
+    # The names are translated when the fields are built
+    for language in ("de", "en"):
+        with translation.override(language):
+            Member.get_fields()
+    assert {"de", "en"} <= set(_fields_cache)
+
+    configuration.registration_form = [{"name": "member__name", "position": 1}]
+    configuration.save()
+    f = Member.get_fields()
+    assert f["member__name"].registration_form == {
+        "name": "member__name",
+        "position": 1,
+    }
+
+
+@pytest.mark.django_db
+def test_member_export_rows(
+    member, membership, inactive_member, django_assert_max_num_queries
+):
+    from byro.members.export import iter_member_rows
+
+    fields = list(Member.get_fields().values())
+    expected = {
+        m.pk: {f.field_id: f.getter(m) for f in fields}
+        for m in Member.all_objects.all()
+    }
+    with django_assert_max_num_queries(5):
+        rows = list(iter_member_rows(Member.objects.order_by("pk"), fields))
+    assert len(rows) == 2
+    for row in rows:
+        assert row == expected[row["_internal_id"]]
@@ -0,0 +1,84 @@
+from decimal import Decimal
+
+import pytest
+
+from byro.bookkeeping.special_accounts import SpecialAccounts
+from byro.common.models import Configuration, LogEntry
+from byro.members.importer import plan_member_import
+from byro.members.models import Member
+
+
+def _rows(*rows):
+    """Rows like a CSV reader returns them, with the same columns in every row."""
+    fields = Member.get_fields()
+    columns = {field_id: str(fields[field_id].name) for row in rows for field_id in row}
+    return [
+        {column: row.get(field_id, "") for field_id, column in columns.items()}
+        for row in rows
+    ]
+
+
+@pytest.mark.django_db
+def test_member_import_plan_and_apply(member):
+    member.number = "42"
+    member.save()
+    rows = _rows(
+        {"member__number": "42", "member__name": "Renamed", "MemberSepa__iban": ""},
+        {
+            "member__number": "43",
+            "member__name": "New Member",
+            "MemberSepa__iban": "DE11520513735120710131",
+            "membership__start": "2020-01-01",
+            "membership__amount": "10",
+            "membership__interval": "1",
+            "_internal_balance": "-20",
+            "_internal_last_transaction": "2020-02-01",
+        },
+    )
+
+    plan = plan_member_import(rows)
+    assert not plan.errors
+    assert [row.member for row in plan.updated] == [member]
+    assert plan.updated[0].changes == [("Name", member.name, "Renamed")]
+    assert len(plan.created) == 1
+    assert Member.all_objects.count() == 1
+
+    SpecialAccounts.opening_balance  # created (and logged) on first use
+    log_count = LogEntry.objects.count()
+    assert plan.apply("test") == {"created": 1, "updated": 1}
+
+    member.refresh_from_db()
+    assert member.name == "Renamed"
+    new_member = Member.objects.get(number="43")
+    assert new_member.name == "New Member"
+    assert new_member.profile_sepa.iban == "DE11520513735120710131"
+    membership = new_member.memberships.get()
+    assert membership.amount == 10
+    # The dues of the imported membership are scheduled
+    assert {(d.date, d.amount) for d in membership.dues_schedule.dues.all()} == (
+        membership.get_dues(_from=Configuration.get_solo().accounting_start)[1]
+    )
+    assert new_member.balance == Decimal("-20")
+    # .updated, .created, the transaction and .finance.initial_balance
+    assert LogEntry.objects.count() == log_count + 4
+
+
+@pytest.mark.django_db
+def test_member_import_errors():
+    fields = Member.get_fields()
+    plan = plan_member_import([{"Unknown column": "x"}])
+    assert plan.errors == [
+        (None, "Couldn't map input column 'Unknown column' to field")
+    ]
+
+    plan = plan_member_import(
+        _rows(
+            {"member__name": "A", "_internal_balance": "5"},
+            {"_internal_id": "x"},
+            {"membership__start": "2020-01-01"},
+        )
+    )
+    assert [line for line, _error in plan.errors] == [3, 2, 4]
+    assert str(fields["_internal_last_transaction"].name) in str(plan.errors[1][1])
+    with pytest.raises(ValueError):
+        plan.apply("test")
@@ -0,0 +1,144 @@
+import pytest
+from dateutil.relativedelta import relativedelta
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils.timezone import now
+
+from byro.bookkeeping.models import Transaction
+from byro.bookkeeping.special_accounts import SpecialAccounts
+from byro.members.models import Member, MemberLedgerSummary
+
+
+def _pay(member, amount, value_datetime, account=None):
+    t = Transaction.objects.create(
+        value_datetime=value_datetime, user_or_context="test"
+    )
+    t.debit(account=SpecialAccounts.bank, amount=amount, user_or_context="test")
+    t.credit(
+        account=account or SpecialAccounts.fees_receivable,
+        amount=amount,
+        member=member,
+        user_or_context="test",
+    )
+    return t
+
+
+@pytest.mark.django_db
+def test_ledger_summary_incremental(member, membership):
+    member.update_liabilites()
+    assert member.balance == member._calc_balance() == -40
+    assert MemberLedgerSummary.objects.filter(member=member).exists()
+
+    _pay(member, 15, now() - relativedelta(days=1))
+    _pay(member, 5, now() - relativedelta(days=1), account=SpecialAccounts.donations)
+
+    summary = MemberLedgerSummary.objects.get(member=member)
+    assert summary.fee_balance == -25
+    assert summary.donation_balance == 5
+    assert member.balance == member._calc_balance()
+    assert member.donation_balance == 5
+    assert (
+        member.last_membership_fee_transaction_timestamp
+        == member._calc_last_membership_fee_transaction_timestamp()
+    )
+
+
+@pytest.mark.django_db
+def test_ledger_summary_future_and_value_date_change(member):
+    assert member.balance == 0
+    t = _pay(member, 10, now() + relativedelta(days=3))
+    assert member.balance == 0
+    assert MemberLedgerSummary.objects.get(member=member).valid_until
+
+    t.value_datetime = now() - relativedelta(days=1)
+    t.save()
+    assert MemberLedgerSummary.objects.get(member=member).fee_balance == 10
+    assert member.balance == member._calc_balance() == 10
+
+
+@pytest.mark.django_db
+def test_ledger_summary_bulk_created(member):
+    assert member.balance == 0
+    Transaction.objects.create_balanced(
+        [
+            {"debit_account": SpecialAccounts.bank, "amount": 12},
+            {
+                "credit_account": SpecialAccounts.fees_receivable,
+                "amount": 12,
+                "member": member,
+            },
+        ],
+        "test",
+        value_datetime=now() - relativedelta(days=1),
+    )
+    assert MemberLedgerSummary.objects.get(member=member).fee_balance == 12
+    assert member.balance == member._calc_balance() == 12
+
+
+@pytest.mark.django_db
+def test_ledger_summary_reverse_all():
+    # Not the member fixture, its teardown cannot delete reversed transactions
+    member = Member.objects.create(number="reverse-all", name="Reverse All")
+    Transaction.objects.create_balanced(
+        [
+            {"debit_account": SpecialAccounts.bank, "amount": 12},
+            {
+                "credit_account": SpecialAccounts.fees_receivable,
+                "amount": 12,
+                "member": member,
+            },
+        ],
+        "test",
+        value_datetime=now() - relativedelta(days=1),
+    )
+    assert member.balance == 12
+
+    Transaction.objects.filter(bookings__member=member).reverse_all("test")
+    member.refresh_from_db()
+    assert MemberLedgerSummary.objects.get(member=member).fee_balance == 0
+    assert member.balance == member._calc_balance() == 0
+
+
+@pytest.mark.django_db
+def test_ledger_summary_read_only(member, membership, django_assert_num_queries):
+    member.update_liabilites()
+    MemberLedgerSummary.objects.filter(member=member).delete()
+    with django_assert_num_queries(5):
+        # Two special accounts (not cached inside the test transaction), the
+        # summary row, the closed period and the aggregate; nothing is written
+        balance = member.balance
+    assert balance == member._calc_balance() == -40
+    assert not MemberLedgerSummary.objects.filter(member=member).exists()
+
+    MemberLedgerSummary.rebuild([member])
+    MemberLedgerSummary.objects.filter(member=member).update(
+        fee_balance=0, valid_until=now() - relativedelta(days=1)
+    )
+    assert member.balance == -40
+    assert MemberLedgerSummary.objects.get(member=member).fee_balance == 0
+
+
+@pytest.mark.django_db
+def test_rebuild_ledger_summary(member, membership):
+    member.update_liabilites()
+    assert member.balance == -40
+    call_command("rebuild_ledger_summary", "--check")
+
+    MemberLedgerSummary.objects.filter(member=member).update(fee_balance=0)
+    with pytest.raises(CommandError):
+        call_command("rebuild_ledger_summary", "--check")
+
+    call_command("rebuild_ledger_summary")
+    call_command("rebuild_ledger_summary", "--check")
+    assert member.balance == -40
+
+    # Missing and outdated rows are compared too
+    MemberLedgerSummary.objects.filter(member=member).delete()
+    with pytest.raises(CommandError):
+        call_command("rebuild_ledger_summary", "--check")
+    call_command("rebuild_ledger_summary")
+    MemberLedgerSummary.objects.filter(member=member).update(
+        fee_balance=0, valid_until=now() - relativedelta(days=1)
+    )
+    with pytest.raises(CommandError):
+        call_command("rebuild_ledger_summary", "--check")
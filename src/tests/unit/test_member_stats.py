@@ -1,4 +1,9 @@
 import pytest
+from django.utils.timezone import now
+
+from byro.bookkeeping.models import Transaction
+from byro.bookkeeping.special_accounts import SpecialAccounts
+from byro.members.models import FeeIntervals, Membership
 
 
 @pytest.mark.django_db
@@ -39,3 +44,36 @@ def test_stats_one_inactive_member(inactive_member):
     for m in member_stats[1:-1]:
         assert m[1] == 0
         assert m[2] == 0
+
+
+@pytest.mark.django_db
+def test_monthly_statistics(inactive_member, member, django_assert_num_queries):
+    from byro.members.stats import get_monthly_statistics
+
+    membership = Membership.objects.create(
+        member=member, start=now().date(), amount=20, interval=FeeIntervals.MONTHLY
+    )
+    statistics = get_monthly_statistics()
+    assert [stat.members for stat in statistics] == [1, 1, 0, 1]
+    assert sum(stat.joins for stat in statistics) == 2
+    assert sum(stat.quits for stat in statistics) == 1
+    assert statistics[-1].month == now().date().replace(day=1)
+
+    # The membership changes, the fees account and the fee income
+    with django_assert_num_queries(3):
+        assert get_monthly_statistics() == statistics
+
+    membership.end = now().date()
+    membership.save()
+    assert get_monthly_statistics()[-1].members == 0
+
+
+@pytest.mark.django_db
+def test_monthly_statistics_fee_income(inactive_member):
+    from byro.members.stats import get_monthly_statistics
+
+    Transaction.objects.create(value_datetime=now(), user_or_context="test").credit(
+        account=SpecialAccounts.fees, amount=20, user_or_context="test"
+    )
+    assert get_monthly_statistics()[-1].fee_income == 20
+    assert get_monthly_statistics()[0].fee_income == 0